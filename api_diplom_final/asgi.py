@@ -2,6 +2,9 @@
 ASGI config for api_diplom_final project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests to the partner order stream (Server-Sent Events) and long-poll requests to the
+partner order changes feed are served by async handlers, everything else is passed to the
+Django application.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
@@ -13,4 +16,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_diplom_final.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from ordermanager.streams import (  # noqa: E402 (требует django.setup())
+    STREAM_PATH, order_changes_stream, is_long_poll, order_changes_long_poll)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        return await order_changes_stream(scope, receive, send)
+    if scope['type'] == 'http' and is_long_poll(scope):
+        return await order_changes_long_poll(scope, receive, send)
+    return await django_application(scope, receive, send)
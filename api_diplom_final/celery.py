@@ -1,21 +1,26 @@
+import logging
 import os
-from api_diplom_final.settings import EMAIL_HOST_USER
-from django.core.mail.message import EmailMultiAlternatives
 from celery import Celery
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'celery_django.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_diplom_final.settings')
 app = Celery('api_diplom_final')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task, *args):
+    """
+    Функция ставит задачу task в очередь и возвращает ее идентификатор, а если брокер недоступен -
+    записывает ошибку в лог и возвращает None. Публикация не повторяется, подписка на результат
+    не оформляется (состояние задач хранится в БД), а время подключения к брокеру ограничено
+    настройкой CELERY_BROKER_TRANSPORT_OPTIONS, поэтому недоступный брокер не задерживает запрос.
+    """
 
-@app.task()
-def send_email(title, message: str, email: str):
-    email_list = list()
-    email_list.append(email)
     try:
-        message = EmailMultiAlternatives(subject=title, body=message, from_email=EMAIL_HOST_USER, to=email_list)
-        message.send()
-        return f'Title: {message.subject}, Message:{message.body}'
+        return task.apply_async(args, retry=False, ignore_result=True).id
     except Exception:
-        raise Exception
+        logger.exception('Не удалось поставить задачу %s в очередь', task.name)
+        return None
+
@@ -0,0 +1,23 @@
+from django.core.cache import cache
+
+
+def increment(key, amount=1):
+    """
+    Функция увеличивает счетчик key в общем кэше на amount. Отсутствующий счетчик создается
+    без срока хранения, поэтому его видят все процессы Django и Celery.
+    """
+
+    if not amount:
+        return
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, amount)
+
+
+def read_counters(keys):
+    """ Функция возвращает значения счетчиков keys ({название: ключ в кэше}) одним запросом к кэшу. """
+
+    values = cache.get_many(keys.values())
+    return {name: values.get(key, 0) for name, key in keys.items()}
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.message import EmailMultiAlternatives
+
+from api_diplom_final.counters import increment, read_counters
+
+# Счетчики доставки писем хранятся в общем кэше, чтобы их видели все процессы Celery.
+STATS_KEYS = {
+    'batches': 'email:stats:batches',
+    'sent': 'email:stats:sent',
+    'failed': 'email:stats:failed',
+    'retried': 'email:stats:retried',
+    'dropped': 'email:stats:dropped',
+}
+
+
+def count(event, amount=1):
+    increment(STATS_KEYS[event], amount)
+
+
+def email_stats():
+    """ Функция возвращает счетчики доставки писем. """
+
+    return read_counters(STATS_KEYS)
+
+
+def email_payload(title, message, email):
+    """ Функция возвращает описание письма для очереди исходящих писем (см. usermanager.outbox.enqueue_emails). """
+
+    return {'title': title, 'message': message, 'email': email}
+
+
+def build_message(payload, connection=None):
+    return EmailMultiAlternatives(subject=payload['title'], body=payload['message'],
+                                  from_email=settings.EMAIL_HOST_USER, to=[payload['email']],
+                                  connection=connection)
+
+
+def deliver(payloads):
+    """
+    Функция отправляет письма payloads группами по EMAIL_BATCH_SIZE, каждая группа - через одно
+    соединение с почтовым сервером. Ошибка отправки одного письма не прерывает отправку остальных,
+    если соединение не удалось открыть, неотправленной считается вся группа.
+    Возвращает список (описание письма, ошибка) для неотправленных писем.
+    """
+
+    failed = []
+    for start in range(0, len(payloads), settings.EMAIL_BATCH_SIZE):
+        batch = payloads[start:start + settings.EMAIL_BATCH_SIZE]
+        count('batches')
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as error:
+            failed.extend((payload, error) for payload in batch)
+            continue
+
+        try:
+            for payload in batch:
+                try:
+                    connection.send_messages([build_message(payload, connection)])
+                except Exception as error:
+                    failed.append((payload, error))
+        finally:
+            connection.close()
+
+    count('sent', len(payloads) - len(failed))
+    count('failed', len(failed))
+    return failed
+
+
+def retry_countdown(retries):
+    """ Функция возвращает задержку повторной отправки в секундах (экспоненциальный рост). """
+
+    return settings.EMAIL_RETRY_BACKOFF * 2 ** retries
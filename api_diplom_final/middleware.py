@@ -0,0 +1,55 @@
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """ Исключение, выбрасываемое при превышении бюджета запросов к БД в режиме QUERY_BUDGET_STRICT. """
+
+
+class QueryCounter:
+    """ Обертка выполнения SQL (connection.execute_wrapper), подсчитывающая запросы к БД. """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+    """
+    Middleware для разработки, подсчитывающее запросы к БД каждого HTTP-запроса.
+
+    Количество запросов возвращается в заголовке X-Query-Count. Если оно больше QUERY_BUDGET
+    (или атрибута query_budget представления), запрос записывается в лог с уровнем WARNING,
+    а при QUERY_BUDGET_STRICT завершается исключением QueryBudgetExceeded.
+    Подсчет работает без DEBUG. Запросы, выполняемые при отдаче потоковых ответов, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        response['X-Query-Count'] = str(counter.count)
+        budget = getattr(request, 'query_budget', settings.QUERY_BUDGET)
+        if budget is not None and counter.count > budget:
+            message = f'{request.method} {request.path}: {counter.count} queries, budget {budget}'
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None:
+            request.query_budget = budget
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+
+def relay_batch(pending, limit, handle, done_field, countdown):
+    """
+    Функция передает функции handle до limit записей транзакционной очереди pending (QuerySet модели
+    с полями next_attempt_at, attempts и error) и возвращает количество обработанных записей.
+
+    Записи выбираются с блокировкой строк и пропуском заблокированных (на PostgreSQL), поэтому
+    несколько обработчиков Celery могут разбирать очередь параллельно. handle получает список записей
+    и возвращает словарь {id записи: ошибка} для необработанных. Обработанные записи отмечаются
+    временем в поле done_field одним запросом, для необработанных увеличивается счетчик попыток
+    и назначается следующая попытка через countdown(attempts) секунд.
+    """
+
+    model = pending.model
+    with transaction.atomic():
+        rows = list(pending.select_for_update(skip_locked=True).order_by('id')[:limit])
+        errors = handle(rows) if rows else {}
+
+        now = timezone.now()
+        model.objects.filter(id__in=[row.id for row in rows if row.id not in errors]).update(
+            **{done_field: now})
+        failed = [row for row in rows if row.id in errors]
+        for row in failed:
+            row.error = repr(errors[row.id])
+            row.next_attempt_at = now + timedelta(seconds=countdown(row.attempts))
+            row.attempts += 1
+        model.objects.bulk_update(failed, ['error', 'next_attempt_at', 'attempts'])
+
+    return len(rows) - len(failed)
+
+
+def relay_all(pending, batch_size, handle, done_field, countdown):
+    """
+    Функция разбирает транзакционную очередь порциями по batch_size (см. relay_batch),
+    пока в ней есть записи, готовые к обработке. pending - функция, возвращающая QuerySet таких записей.
+    """
+
+    processed = 0
+    while True:
+        batch_processed = relay_batch(pending(), batch_size, handle, done_field, countdown)
+        processed += batch_processed
+        if not batch_processed or not pending().exists():
+            return processed
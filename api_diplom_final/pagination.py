@@ -0,0 +1,29 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Класс для постраничной выдачи списков по курсору (keyset pagination).
+
+    Страница выбирается условием по индексированному уникальному ключу сортировки (WHERE id > курсор)
+    вместо OFFSET, а общее количество записей не подсчитывается, поэтому время получения страницы
+    не зависит от ее номера. Клиент может указать размер страницы параметром page_size,
+    но не больше settings.MAX_PAGE_SIZE.
+    """
+
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.MAX_PAGE_SIZE
+
+
+class ProductCursorPagination(KeysetPagination):
+    """ Класс для постраничной выдачи каталога товаров по первичному ключу ProductIndex. """
+
+    ordering = 'product_info_id'
+
+
+class OrderCursorPagination(KeysetPagination):
+    """ Класс для постраничной выдачи заказов, начиная с последних. """
+
+    ordering = '-id'
@@ -0,0 +1,55 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+
+def orjson_dumps(data):
+    # Дата-время и неизвестные orjson типы (Decimal, ленивые строки и т.д.) передаются кодировщику DRF,
+    # поэтому их представление совпадает с JSONRenderer.
+    return orjson.dumps(data, default=JSONEncoder().default, option=ORJSON_OPTIONS)
+
+
+def ujson_dumps(data):
+    return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False).encode()
+
+
+def available_backends():
+    """ Функция возвращает доступные быстрые JSON-библиотеки в порядке предпочтения. """
+
+    return [name for name, module in (('orjson', orjson), ('ujson', ujson)) if module is not None]
+
+
+BACKENDS = {'orjson': orjson_dumps, 'ujson': ujson_dumps}
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Класс для формирования JSON-ответов через orjson или ujson (что установлено) вместо модуля json.
+
+    Результат совпадает с JSONRenderer при настройках UNICODE_JSON и COMPACT_JSON по умолчанию.
+    Если клиент запросил отступы (application/json; indent=4) или данные содержат тип,
+    который быстрая библиотека не поддерживает, ответ формируется стандартным JSONRenderer.
+    """
+
+    backend = (available_backends() or [None])[0]
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (data is None or self.backend is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            return BACKENDS[self.backend](data)
+        except (TypeError, OverflowError):
+            return super().render(data, accepted_media_type, renderer_context)
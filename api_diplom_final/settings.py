@@ -15,6 +15,7 @@ from pathlib import Path
 from typing import Dict, Any
 # They're need for making changes into drf-spectacular default configuration (SPECTACULAR_DEFAULTS).
 
+from django.core.exceptions import ImproperlyConfigured
 
 import usermanager.apps
 import shopmanager.apps
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
     'usermanager',
     'shopmanager',
     'ordermanager',
+    'eventmanager',
 ]
 
 MIDDLEWARE = [
@@ -140,29 +142,37 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Uploaded and generated files (price list exports)
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 AUTH_USER_MODEL = 'usermanager.User'
 
+# API profile:
+# В профиле production ответы формируются только в JSON, без Browsable API (HTML-страниц DRF).
+API_PROFILE = os.environ.get('API_PROFILE', 'development')
+RENDERER_CLASSES = ['api_diplom_final.renderers.FastJSONRenderer']
+if API_PROFILE != 'production':
+    RENDERER_CLASSES.append('rest_framework.renderers.BrowsableAPIRenderer')
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
 
-    'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
-
-    ),
+    'DEFAULT_RENDERER_CLASSES': RENDERER_CLASSES,
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'usermanager.authentication.CachedTokenAuthentication',
     ),
 
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.ScopedRateThrottle',
+        'api_diplom_final.throttling.AnonBucketThrottle',
+        'api_diplom_final.throttling.UserBucketThrottle',
+        'api_diplom_final.throttling.ScopedBucketThrottle',
     ],
 
     'DEFAULT_THROTTLE_RATES': {
@@ -184,6 +194,10 @@ EMAIL_HOST_PASSWORD = 'NotRealPassword123'  # пароль от почтовог
 EMAIL_PORT = '465'
 EMAIL_USE_SSL = True
 SERVER_EMAIL = EMAIL_HOST_USER
+EMAIL_BATCH_SIZE = 100  # количество писем, отправляемых через одно соединение подряд
+EMAIL_MAX_RETRIES = 5
+EMAIL_RETRY_BACKOFF = 30  # задержка первой повторной отправки в секундах, далее удваивается
+EMAIL_OUTBOX_BATCH_SIZE = 500  # количество писем, выбираемых из очереди исходящих писем за один раз
 
 # Celery configuration:
 CELERY_BROKER_URL = "redis://127.0.0.1:6379/0"
@@ -191,6 +205,75 @@ CELERY_RESULT_BACKEND = "redis://127.0.0.1:6379/0"
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# Не более одной повторной попытки подключения при публикации задачи (см. api_diplom_final.celery.enqueue).
+CELERY_BROKER_TRANSPORT_OPTIONS = {'max_retries': 1, 'interval_start': 0, 'interval_step': 0.2, 'interval_max': 0.2}
+CELERY_BEAT_SCHEDULE = {
+    # Передача обработчикам доменных событий и отправка писем, задачи для которых не удалось поставить
+    # в очередь, а также повторные попытки.
+    'relay-outboxes': {'task': 'eventmanager.tasks.relay_outboxes', 'schedule': 10},
+}
+EVENT_RELAY_BATCH_SIZE = 500  # количество событий, передаваемых обработчикам за один раз
+EVENT_MAX_RETRIES = 5
+EVENT_RETRY_BACKOFF = 10  # задержка первой повторной обработки события в секундах, далее удваивается
+
+# Cache configuration:
+# При заданном CACHE_REDIS_URL кэш хранится в Redis (можно использовать сервер брокера Celery
+# с отдельным номером БД, например redis://127.0.0.1:6379/1), иначе - в памяти процесса (тесты, разработка).
+# Кэш процесса не видит удаления из других процессов (выход пользователя, сброс версий каталога),
+# поэтому в профиле production CACHE_REDIS_URL обязателен.
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+if API_PROFILE == 'production' and not CACHE_REDIS_URL:
+    raise ImproperlyConfigured('В профиле production необходимо указать CACHE_REDIS_URL')
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Время хранения кэшированных ответов каталога, категорий и магазинов (в секундах).
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 600))
+# Количество найденных товаров, по которым считаются фасеты каталога (параметр facets), не более.
+FACET_SCAN_LIMIT = int(os.environ.get('FACET_SCAN_LIMIT', 1000))
+
+# Token authentication cache configuration:
+TOKEN_CACHE_TIMEOUT = 300  # время хранения пользователя токена в общем кэше, секунд
+TOKEN_CACHE_LOCAL_TTL = 5  # время хранения в кэше процесса, секунд
+TOKEN_CACHE_SIZE = 10000  # количество токенов в кэше процесса
+
+# Throttling configuration:
+# Корзины ограничения частоты запросов хранятся в Redis (общие для всех процессов),
+# без THROTTLE_REDIS_URL - в кэше Django.
+THROTTLE_REDIS_URL = os.environ.get('THROTTLE_REDIS_URL', CACHE_REDIS_URL)
+THROTTLE_REDIS_TIMEOUT = 0.1  # таймаут обращения к Redis, секунд; при ошибке используется кэш Django
+
+# Pagination configuration:
+# Максимальный размер страницы, который клиент может запросить параметром page_size.
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 100))
+
+# Order change feed configuration:
+# Интервал опроса БД (в секундах) при ожидании изменений заказов (long-poll и Server-Sent Events,
+# обслуживаются асинхронно при запуске через ASGI) и максимальное время ожидания одного long-poll запроса.
+ORDER_FEED_POLL_INTERVAL = float(os.environ.get('ORDER_FEED_POLL_INTERVAL', 1))
+ORDER_FEED_MAX_WAIT = float(os.environ.get('ORDER_FEED_MAX_WAIT', 25))
+# Заказы попадают в ленту изменений не раньше, чем через ORDER_FEED_GRACE секунд после изменения.
+# Значение должно превышать длительность самой долгой транзакции, изменяющей заказы.
+ORDER_FEED_GRACE = float(os.environ.get('ORDER_FEED_GRACE', 5))
+
+# Query budget configuration:
+# В профиле development QueryBudgetMiddleware считает запросы к БД каждого HTTP-запроса
+# и пишет в лог запросы, превысившие QUERY_BUDGET (при QUERY_BUDGET_STRICT - завершает их ошибкой).
+# Представление может задать собственный бюджет атрибутом query_budget.
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 30))
+QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', '').lower() in ('1', 'true', 'yes')
+if API_PROFILE != 'production':
+    MIDDLEWARE.insert(0, 'api_diplom_final.middleware.QueryBudgetMiddleware')
 
 # Spectacular configuration:
 SPECTACULAR_DEFAULTS: Dict[str, Any] = {'SCHEMA_PATH_PREFIX': None, }
@@ -0,0 +1,129 @@
+"""
+Общие вспомогательные средства тестов и бенчмарков.
+
+Модуль импортируется до настройки Django (бенчмарки вызывают django.setup() позже),
+поэтому модели и приложения проекта в нем не импортируются на уровне модуля.
+"""
+import random
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+CATEGORIES = [{'id': 224, 'name': 'Смартфоны'}, {'id': 15, 'name': 'Аксессуары'}]
+
+
+def make_price_list(goods_count, shop_name='TestShop', categories_count=2, parameters_count=2, seed=None):
+    """
+    Функция формирует прайс-лист в формате YAML-файла поставщика, который принимает PartnerUpdate.
+
+    Первые две категории - "Смартфоны" и "Аксессуары", первые два параметра товара - "Цвет" и
+    "Диагональ (дюйм)", остальные категории и параметры нумеруются. Без seed значения детерминированы
+    (цена 1000 + номер товара, остаток 10), с seed цены, остатки и значения параметров выбираются случайно.
+    """
+
+    rnd = random.Random(seed)
+    categories = (CATEGORIES + [{'id': 1000 + index, 'name': f'Категория {index}'}
+                                for index in range(categories_count)])[:categories_count]
+    extra_parameters = [f'Параметр {index}' for index in range(max(parameters_count - 2, 0))]
+
+    goods = []
+    for index in range(goods_count):
+        price = 1000 + index if seed is None else rnd.randint(100, 100000)
+        parameters = {'Цвет': 'черный', 'Диагональ (дюйм)': 6.5}
+        for name in extra_parameters:
+            parameters[name] = str(index % 20 + 1 if seed is None else rnd.randint(1, 20))
+        goods.append({
+            'id': index + 1,
+            'category': categories[index % categories_count]['id'],
+            'model': f'test/model/{index}',
+            'name': f'Товар {index}',
+            'price': price,
+            'price_rrc': price + (200 if seed is None else rnd.randint(0, 1000)),
+            'quantity': 10 if seed is None else rnd.randint(0, 50),
+            'parameters': dict(list(parameters.items())[:parameters_count]),
+        })
+
+    return {'shop': shop_name, 'categories': categories, 'goods': goods}
+
+
+class QueryCountMixin:
+    """
+    Примесь для проверки того, что количество запросов к БД эндпоинтов не растет вместе с объемом данных.
+
+    Класс теста определяет grow(size), добавляющий данные, и requests(size), возвращающий словарь
+    {название: функция, выполняющая запрос}. После каждого наполнения из sizes запросы выполняются
+    с пустым кэшем, количество запросов к БД каждого эндпоинта должно совпадать и не превышать QUERY_BUDGET.
+    """
+
+    sizes = (2, 20)
+
+    def setUp(self):
+        # Пользователи токенов остаются в кэше процесса на все время теста, несмотря на очистку общего кэша.
+        patcher = patch('usermanager.authentication.local_tokens.ttl', 3600)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return super().setUp()
+
+    def count_queries(self, send):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = send()
+        assert response.status_code < 400, response.content
+        data = response.json()
+        assert not isinstance(data, dict) or data.get('Status') is not False, data
+        return len(context.captured_queries)
+
+    def test_query_counts_do_not_grow(self):
+        """
+        Проверка того, что количество запросов к БД каждого эндпоинта не зависит от объема данных.
+        """
+
+        counts = {}
+        for size in self.sizes:
+            self.grow(size)
+            for name, send in self.requests(size).items():
+                counts.setdefault(name, []).append(self.count_queries(send))
+
+        growing = {name: values for name, values in counts.items() if len(set(values)) > 1}
+        assert not growing, growing
+        over_budget = {name: values[0] for name, values in counts.items() if values[0] > settings.QUERY_BUDGET}
+        assert not over_budget, over_budget
+
+
+class ShopUserMixin:
+    """
+    Примесь для тестов APITestCase от имени пользователя-магазина.
+
+    Создает пользователя-магазина self.user и авторизует клиент его токеном, а доменные события
+    передает обработчикам сразу после фиксации транзакции вместо постановки задачи в очередь Celery.
+    Если задан goods_count, загружает прайс-лист self.price_list из goods_count товаров,
+    обрабатывает события импорта и очищает кэш.
+    """
+
+    goods_count = 0
+
+    def setUp(self):
+        from eventmanager.tasks import relay_events
+        from shopmanager.importer import PriceListImporter
+        from usermanager.models import User
+
+        super().setUp()
+        patcher = patch('eventmanager.outbox.schedule_relay', relay_events)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(email='shop@gmail.com', type='shop', is_active=True)
+        self.login(self.user)
+        if self.goods_count:
+            self.price_list = make_price_list(self.goods_count)
+            PriceListImporter(self.user.id).run(self.price_list)
+            relay_events()
+            cache.clear()
+
+    def login(self, user):
+        from rest_framework.authtoken.models import Token
+
+        token = Token.objects.get_or_create(user_id=user.id)[0].key
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
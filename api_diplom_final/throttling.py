@@ -0,0 +1,140 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import SimpleRateThrottle, AnonRateThrottle, UserRateThrottle, ScopedRateThrottle
+
+# Скрипт атомарно пополняет и списывает маркер из корзины ключа. Состояние корзины - два поля хэша
+# (количество маркеров и время последнего обращения), ключ удаляется, когда корзина наполнилась бы целиком.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+
+def refill(state, capacity, rate, now):
+    """
+    Функция пополняет корзину state = (маркеры, время) и списывает маркер.
+    Возвращает новое состояние, признак разрешения запроса и время ожидания следующего маркера.
+    """
+
+    tokens, ts = state if state else (capacity, now)
+    tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), True, 0.0
+    return (tokens, now), False, (1 - tokens) / rate
+
+
+class CacheBucketStore:
+    """
+    Хранилище корзин в кэше Django (резервный вариант без Redis). Проверка и списание выполняются
+    под блокировкой процесса, поэтому атомарны в пределах процесса; с кэшем в памяти (locmem)
+    ограничения действуют для каждого процесса отдельно.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        with self.lock:
+            state, allowed, wait = refill(cache.get(key), capacity, rate, time.time())
+            cache.set(key, state, int((capacity - state[0]) / rate) + 1)
+        return allowed, wait
+
+
+class RedisBucketStore:
+    """
+    Хранилище корзин в Redis. Проверка и списание выполняются одним Lua-скриптом, поэтому ограничения
+    общие для всех процессов и серверов. При недоступности Redis используется резервное хранилище.
+    """
+
+    def __init__(self, url):
+        from redis import Redis
+
+        self.client = Redis.from_url(url, socket_timeout=settings.THROTTLE_REDIS_TIMEOUT)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.fallback = CacheBucketStore()
+
+    def consume(self, key, capacity, rate):
+        from redis import RedisError
+
+        try:
+            allowed, wait = self.script(keys=[key], args=[capacity, rate, time.time()])
+        except RedisError:
+            return self.fallback.consume(key, capacity, rate)
+        return bool(allowed), float(wait)
+
+
+_store = None
+
+
+def get_bucket_store():
+    """ Функция возвращает хранилище корзин: Redis при THROTTLE_REDIS_URL, иначе кэш Django. """
+
+    global _store
+    if _store is None:
+        _store = RedisBucketStore(settings.THROTTLE_REDIS_URL) if settings.THROTTLE_REDIS_URL else CacheBucketStore()
+    return _store
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Базовый класс ограничения частоты запросов по алгоритму token bucket.
+
+    Для каждого ключа хранится корзина из двух чисел (количество маркеров и время последнего запроса)
+    вместо истории запросов SimpleRateThrottle. Корзина вмещает N маркеров из ставки 'N/период'
+    и равномерно пополняется за период, каждый запрос списывает один маркер.
+    Ставки задаются по throttle_scope в DEFAULT_THROTTLE_RATES.
+    """
+
+    cache_format = 'throttle:bucket:%(scope)s:%(ident)s'
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        allowed, self.wait_seconds = get_bucket_store().consume(
+            self.key, self.num_requests, self.num_requests / self.duration)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonBucketThrottle(AnonRateThrottle, TokenBucketThrottle):
+    """ Класс ограничения частоты запросов анонимных пользователей (ставка 'anon'). """
+
+    cache_format = TokenBucketThrottle.cache_format
+
+
+class UserBucketThrottle(UserRateThrottle, TokenBucketThrottle):
+    """ Класс ограничения частоты запросов пользователей (ставка 'user'). """
+
+    cache_format = TokenBucketThrottle.cache_format
+
+
+class ScopedBucketThrottle(ScopedRateThrottle, TokenBucketThrottle):
+    """ Класс ограничения частоты запросов к представлениям по их throttle_scope. """
+
+    cache_format = 'throttle:bucket:view:%(scope)s:%(ident)s'
@@ -0,0 +1,13 @@
+"""
+Бенчмарки API сервиса.
+
+Каждый модуль пакета запускается отдельно из корня проекта, например:
+
+    python -m benchmarks.import_price_list --sizes 100 1000 10000
+
+Нагрузочный бенчмарк всего API с сохранением результатов и сравнением с предыдущим запуском:
+
+    python -m benchmarks.load_api --buyers 50 --requests 500 --output run.json --baseline previous.json
+
+Замеры выполняются на временной тестовой базе данных, рабочая db.sqlite3 не изменяется.
+"""
@@ -0,0 +1,6 @@
+from functools import partial
+
+from api_diplom_final.testing import make_price_list as make_test_price_list
+
+# Синтетический прайс-лист бенчмарков: генератор тестов со случайными ценами, остатками и параметрами.
+make_price_list = partial(make_test_price_list, shop_name='Бенчмарк', categories_count=10, parameters_count=5, seed=0)
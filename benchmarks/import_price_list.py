@@ -0,0 +1,51 @@
+"""
+Бенчмарк импорта прайс-листа через PriceListImporter.
+
+Показывает, что количество запросов к БД определяется количеством порций (batch_size),
+а не количеством товаров в прайс-листе. На SQLite bulk_create дополнительно делит вставку
+на части из-за ограничения на 999 параметров в запросе, поэтому число запросов на порцию
+там больше, чем на PostgreSQL, но так же не зависит от размера прайс-листа.
+
+С флагом --incremental после полной загрузки замеряется повторная загрузка того же
+прайс-листа через IncrementalPriceListImporter, в котором изменена доля цен --changed.
+"""
+import argparse
+import math
+
+from benchmarks.utils import setup_django, test_database, measure
+from benchmarks.data import make_price_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--incremental', action='store_true')
+    parser.add_argument('--changed', type=float, default=0.05)
+    args = parser.parse_args()
+
+    setup_django()
+    from shopmanager.importer import PriceListImporter, IncrementalPriceListImporter
+    from usermanager.models import User
+
+    with test_database():
+        batch_size = args.batch_size or PriceListImporter.batch_size
+        print(f'{"goods":>10} {"batches":>10} {"queries":>10} {"q/batch":>10} {"seconds":>10} {"goods/s":>10}')
+        for size in args.sizes:
+            user = User.objects.create(email=f'bench-{size}@example.com', type='shop', is_active=True)
+            data = make_price_list(size, shop_name=f'Бенчмарк {size}')
+            importer_class = PriceListImporter
+            if args.incremental:
+                PriceListImporter(user.id, batch_size=batch_size).run(data)
+                for item in data['goods'][:int(size * args.changed)]:
+                    item['price'] += 1
+                importer_class = IncrementalPriceListImporter
+            with measure() as result:
+                importer_class(user.id, batch_size=batch_size).run(data)
+            batches = max(math.ceil(size / batch_size), 1)
+            print(f'{size:>10} {batches:>10} {result["queries"]:>10} {result["queries"] / batches:>10.1f} '
+                  f'{result["seconds"]:>10.3f} {size / result["seconds"]:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
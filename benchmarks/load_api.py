@@ -0,0 +1,325 @@
+"""
+Нагрузочный бенчмарк API через настоящие маршруты api_diplom_final/urls.py.
+
+Создает синтетических поставщиков с прайс-листами в формате PartnerUpdate, покупателей с контактами,
+корзинами и заказами (корзины и заказы оформляются через API), после чего выполняет запросы
+к эндпоинтам покупателя, каталога и поставщика тестовым клиентом Django в том же процессе
+(без сети, т.е. замеряется время обработки запроса сервером, включая middleware, аутентификацию,
+ограничение частоты запросов и формирование JSON).
+
+Для каждого эндпоинта выводятся p50/p95/p99 времени ответа, количество запросов в секунду,
+количество запросов к БД на запрос и ошибки (ответы со статусом 400 и выше или со Status: false). Результат можно
+сохранить в JSON (--output) и сравнить с предыдущим запуском (--baseline).
+
+Задачи Celery по умолчанию не отправляются брокеру (постановка в очередь заменяется заглушкой),
+с --broker используется настроенный брокер. Ставки ограничения частоты запросов заменяются
+неограниченными, чтобы проверки выполнялись, но не отклоняли запросы.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from itertools import cycle
+from unittest.mock import patch
+from uuid import uuid4
+
+from benchmarks.data import make_price_list
+from benchmarks.utils import setup_django, test_database, percentile
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(args, client):
+    """
+    Функция создает поставщиков с прайс-листами, покупателей с контактами и токенами,
+    оформляет через API по args.orders заказов на каждого покупателя и оставляет непустую корзину.
+    Возвращает словарь с токенами и идентификаторами, которые используются при построении запросов.
+    """
+
+    from django.urls import reverse
+    from rest_framework.authtoken.models import Token
+
+    from shopmanager.importer import PriceListImporter
+    from shopmanager.models import ProductInfo, ProductIndex
+    from usermanager.models import User, Contact
+
+    shops = []
+    for number in range(args.shops):
+        user = User.objects.create(email=f'shop{number}@example.com', type='shop', is_active=True)
+        PriceListImporter(user.id, batch_size=2000).run(
+            make_price_list(args.goods, shop_name=f'Магазин {number}', seed=number))
+        shops.append(user)
+    # Остатков достаточно для всех оформлений заказов во время замеров.
+    ProductInfo.objects.update(quantity=10 ** 6)
+    ProductIndex.objects.update(quantity=10 ** 6)
+    product_info_ids = list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+
+    User.objects.bulk_create([User(email=f'buyer{number}@example.com', type='buyer', is_active=True)
+                              for number in range(args.buyers)])
+    buyers = list(User.objects.filter(type='buyer').order_by('id'))
+    Contact.objects.bulk_create([Contact(user=buyer, city='Москва', street='Ленина', house=str(number),
+                                         phone=f'+7900{number:07d}') for number, buyer in enumerate(buyers)])
+    Token.objects.bulk_create([Token(key=Token.generate_key(), user=user) for user in shops + buyers])
+    tokens = dict(Token.objects.values_list('user_id', 'key'))
+    contacts = dict(Contact.objects.values_list('user_id', 'id'))
+
+    products = cycle(product_info_ids)
+    for buyer in buyers:
+        auth = {'HTTP_AUTHORIZATION': f'Token {tokens[buyer.id]}'}
+        for number in range(args.orders + 1):
+            items = [{'product_info': next(products), 'quantity': 1} for _ in range(args.basket_items)]
+            client.post(reverse('ordermanager:basket'), {'items': json.dumps(items)}, **auth)
+            if number < args.orders:
+                basket_id = client.get(reverse('ordermanager:basket'), **auth).json()[0]['id']
+                client.post(reverse('ordermanager:order'), {'id': str(basket_id),
+                                                            'contact': str(contacts[buyer.id])}, **auth)
+
+    return {'shops': [(shop.id, tokens[shop.id]) for shop in shops],
+            'buyers': [(buyer.id, tokens[buyer.id], contacts[buyer.id]) for buyer in buyers],
+            'product_info_ids': product_info_ids}
+
+
+def endpoints(data, args):
+    """
+    Функция возвращает сценарии запросов: список (название, метод, функция построения запроса).
+    Функция построения получает номер итерации и возвращает (путь, данные, заголовки); подготовка
+    данных (в том числе обращения к БД) выполняется вне замера.
+    """
+
+    from django.urls import reverse
+
+    from ordermanager.models import Order, OrderItem
+    from shopmanager.models import Shop
+
+    products = data['product_info_ids']
+    shop_ids = dict(Shop.objects.values_list('user_id', 'id'))
+
+    def buyer(number):
+        user_id, token, contact_id = data['buyers'][number % len(data['buyers'])]
+        return user_id, {'HTTP_AUTHORIZATION': f'Token {token}'}, contact_id
+
+    def shop(number):
+        user_id, token = data['shops'][number % len(data['shops'])]
+        return user_id, {'HTTP_AUTHORIZATION': f'Token {token}'}
+
+    def as_buyer(url, params=None):
+        return lambda number: (url, params, buyer(number)[1])
+
+    def as_shop(url, params=None):
+        return lambda number: (url, params, shop(number)[1])
+
+    def product(number):
+        return reverse('shopmanager:products-detail', args=[products[number * 7919 % len(products)]])
+
+    def basket_add(number):
+        item = {'product_info': products[number * 104729 % len(products)], 'quantity': 1}
+        return reverse('ordermanager:basket'), {'items': json.dumps([item])}, buyer(number)[1]
+
+    def basket_update(number):
+        user_id, auth, _ = buyer(number)
+        item_id = OrderItem.objects.filter(order__user_id=user_id, order__state='basket').values_list(
+            'id', flat=True).first()
+        return reverse('ordermanager:basket'), {'items': json.dumps([{'id': item_id, 'quantity': 2}])}, auth
+
+    def basket_batch(number):
+        operations = [{'op': 'upsert', 'product_info': products[(number + index) * 31 % len(products)],
+                       'quantity': 1} for index in range(args.basket_items)]
+        return reverse('ordermanager:basket-batch'), {'operations': json.dumps(operations)}, buyer(number)[1]
+
+    def checkout(number):
+        user_id, auth, contact_id = buyer(number)
+        basket_id = Order.objects.filter(user_id=user_id, state='basket').values_list('id', flat=True).first()
+        return reverse('ordermanager:order'), {'id': str(basket_id), 'contact': str(contact_id)}, auth
+
+    def confirm_order(number):
+        user_id, auth = shop(number)
+        order_id = Order.objects.filter(
+            state='new', ordered_items__product_info__shop_id=shop_ids[user_id]).values_list('id', flat=True).first()
+        return reverse('ordermanager:partner-order-state'), {'orders': str(order_id), 'state': 'confirmed'}, auth
+
+    def partner_update(number):
+        return reverse('shopmanager:partner-update'), {'user_register_url': 'http://example.com/shop.yaml',
+                                                       'incremental': 'true'}, shop(number)[1]
+
+    catalog = reverse('shopmanager:products-list')
+    return [
+        ('catalog', 'GET', as_buyer(catalog, {'page_size': args.page_size})),
+        ('catalog search', 'GET', as_buyer(catalog, {'q': 'Товар 1', 'facet': 'Параметр 0>=5',
+                                                      'price_max': 50000, 'page_size': args.page_size})),
+        ('product', 'GET', lambda number: (product(number), None, buyer(number)[1])),
+        ('categories', 'GET', as_buyer(reverse('shopmanager:categories'))),
+        ('shops', 'GET', as_buyer(reverse('shopmanager:shops'))),
+        ('user details', 'GET', as_buyer(reverse('usermanager:user-details'))),
+        ('contacts', 'GET', as_buyer(reverse('usermanager:user-contact'))),
+        ('basket', 'GET', as_buyer(reverse('ordermanager:basket'))),
+        ('basket add', 'POST', basket_add),
+        ('basket update', 'PUT', basket_update),
+        ('basket batch', 'POST', basket_batch),
+        ('orders', 'GET', as_buyer(reverse('ordermanager:order'), {'page_size': args.page_size})),
+        ('checkout', 'POST', checkout),
+        ('partner orders', 'GET', as_shop(reverse('ordermanager:partner-orders'), {'page_size': args.page_size})),
+        ('partner order changes', 'GET', as_shop(reverse('ordermanager:partner-order-changes'),
+                                                 {'limit': args.page_size})),
+        ('partner order state', 'POST', confirm_order),
+        ('partner state', 'GET', as_shop(reverse('shopmanager:partner-state'))),
+        ('partner update', 'POST', partner_update),
+    ]
+
+
+def is_error(response):
+    """ Функция проверяет, является ли ответ ошибкой: статус 400 и выше или JSON со Status: false. """
+
+    if response.status_code >= 400:
+        return True
+    if response.get('Content-Type', '').startswith('application/json'):
+        data = response.json()
+        return isinstance(data, dict) and data.get('Status') is False
+    return False
+
+
+def summarize(method, path, timings, queries, errors):
+    total = sum(timings)
+    return {'method': method, 'path': path, 'requests': len(timings), 'errors': errors,
+            'p50_ms': percentile(timings, 50) * 1000, 'p95_ms': percentile(timings, 95) * 1000,
+            'p99_ms': percentile(timings, 99) * 1000, 'mean_ms': total / len(timings) * 1000,
+            'rps': len(timings) / total if total else None, 'queries_per_request': queries / len(timings)}
+
+
+def run(client, scenarios, args):
+    """
+    Функция выполняет сценарии по кругу (итерация - по одному запросу каждого эндпоинта),
+    первые args.warmup итераций не учитываются. Возвращает результаты по эндпоинтам.
+    """
+
+    from django.core.cache import cache
+    from django.db import connection
+
+    from api_diplom_final.middleware import QueryCounter
+
+    samples = {name: {'timings': [], 'queries': 0, 'errors': 0, 'path': None} for name, _, _ in scenarios}
+    for iteration in range(args.warmup + args.requests):
+        for name, method, build in scenarios:
+            path, payload, headers = build(iteration)
+            if args.cold_cache:
+                cache.clear()
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                response = getattr(client, method.lower())(path, payload, **headers)
+                elapsed = time.perf_counter() - start
+            if iteration < args.warmup:
+                continue
+            sample = samples[name]
+            sample['path'] = sample['path'] or path
+            sample['timings'].append(elapsed)
+            sample['queries'] += counter.count
+            sample['errors'] += is_error(response)
+
+    return {name: summarize(method, samples[name]['path'], samples[name]['timings'], samples[name]['queries'],
+                            samples[name]['errors'])
+            for name, method, _ in scenarios}
+
+
+def print_report(results, baseline=None):
+    header = (f'{"endpoint":>22} {"method":>6} {"requests":>8} {"errors":>6} {"p50, ms":>8} {"p95, ms":>8} '
+              f'{"p99, ms":>8} {"rps":>8} {"queries":>8}')
+    print(header + (f' {"p95 vs base":>12} {"rps vs base":>12}' if baseline else ''))
+    for name, result in results.items():
+        line = (f'{name:>22} {result["method"]:>6} {result["requests"]:>8} {result["errors"]:>6} '
+                f'{result["p50_ms"]:>8.2f} {result["p95_ms"]:>8.2f} {result["p99_ms"]:>8.2f} '
+                f'{result["rps"] or 0:>8.1f} {result["queries_per_request"]:>8.2f}')
+        previous = (baseline or {}).get(name)
+        if previous:
+            line += (f' {change(result["p95_ms"], previous["p95_ms"]):>12}'
+                     f' {change(result["rps"], previous["rps"]):>12}')
+        print(line)
+
+
+def change(value, previous):
+    if not value or not previous:
+        return '-'
+    return f'{(value - previous) / previous * 100:+.1f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shops', type=int, default=3, help='количество поставщиков')
+    parser.add_argument('--goods', type=int, default=500, help='товаров в прайс-листе поставщика')
+    parser.add_argument('--buyers', type=int, default=20, help='количество покупателей')
+    parser.add_argument('--orders', type=int, default=5, help='оформленных заказов на покупателя')
+    parser.add_argument('--basket-items', type=int, default=3, help='позиций в корзине и заказе')
+    parser.add_argument('--requests', type=int, default=200, help='замеряемых запросов к каждому эндпоинту')
+    parser.add_argument('--warmup', type=int, default=10, help='неучитываемых запросов к каждому эндпоинту')
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--endpoints', nargs='+', help='названия замеряемых эндпоинтов (по умолчанию все); '
+                                                       'checkout оформляет корзину, заполненную basket add')
+    parser.add_argument('--cold-cache', action='store_true', help='очищать кэш перед каждым запросом')
+    parser.add_argument('--broker', action='store_true', help='отправлять задачи Celery настроенному брокеру')
+    parser.add_argument('--output', help='файл для сохранения результатов в JSON')
+    parser.add_argument('--baseline', help='JSON-файл предыдущего запуска для сравнения')
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from celery.app.task import Task
+    from celery.result import AsyncResult
+    from django.conf import settings
+    from rest_framework.test import APIClient
+    from rest_framework.throttling import SimpleRateThrottle
+
+    rates = {scope: f'{10 ** 9}/day' for scope in settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']}
+    patches = [patch.object(SimpleRateThrottle, 'THROTTLE_RATES', rates)]
+    if not args.broker:
+        patches.append(patch.object(Task, 'apply_async', lambda task, *options, **kwargs: AsyncResult(str(uuid4()))))
+
+    started_at = datetime.now(timezone.utc).isoformat()
+    for patcher in patches:
+        patcher.start()
+    try:
+        with test_database():
+            client = APIClient()
+            started = time.perf_counter()
+            data = seed(args, client)
+            seed_seconds = time.perf_counter() - started
+
+            scenarios = endpoints(data, args)
+            if args.endpoints:
+                unknown = set(args.endpoints) - {name for name, _, _ in scenarios}
+                if unknown:
+                    parser.error(f'неизвестные эндпоинты: {", ".join(sorted(unknown))}')
+                scenarios = [scenario for scenario in scenarios if scenario[0] in args.endpoints]
+            results = run(client, scenarios, args)
+    finally:
+        for patcher in patches:
+            patcher.stop()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['endpoints']
+    print(f'seed: {seed_seconds:.1f} s')
+    print_report(results, baseline)
+
+    if args.output:
+        report = {
+            'meta': {'started_at': started_at, 'revision': git_revision(),
+                     'python': platform.python_version(), 'django': django.get_version(),
+                     'api_profile': settings.API_PROFILE, 'database': settings.DATABASES['default']['ENGINE'],
+                     'cache': settings.CACHES['default']['BACKEND'], 'seed_seconds': seed_seconds,
+                     'args': vars(args)},
+            'endpoints': results,
+        }
+        with open(args.output, 'w') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
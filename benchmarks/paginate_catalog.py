@@ -0,0 +1,81 @@
+"""
+Бенчмарк постраничной выдачи каталога товаров и списка заказов.
+
+Сравнивает PageNumberPagination (OFFSET и COUNT(*) на каждый запрос) с выдачей по курсору
+(KeysetPagination, условие по первичному ключу) на разной глубине страниц.
+Время получения страницы по курсору не должно зависеть от ее номера.
+"""
+import argparse
+import statistics
+import time
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.data import make_price_list
+from benchmarks.utils import setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000, 4000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.pagination import PageNumberPagination, Cursor
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from api_diplom_final.pagination import ProductCursorPagination, OrderCursorPagination
+    from ordermanager.models import Order
+    from shopmanager.importer import PriceListImporter
+    from shopmanager.models import ProductIndex
+    from usermanager.models import User
+
+    factory = APIRequestFactory()
+
+    def fetch(paginator, queryset, params):
+        request = Request(factory.get('/', params))
+        start = time.perf_counter()
+        list(paginator.paginate_queryset(queryset, request))
+        return (time.perf_counter() - start) * 1000
+
+    def cursor_params(paginator_class, position):
+        if position is None:
+            return {'page_size': args.page_size}
+        paginator = paginator_class()
+        paginator.base_url = 'http://testserver/'
+        paginator.page_size = args.page_size
+        url = paginator.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+        return {'cursor': parse_qs(urlparse(url).query)['cursor'][0], 'page_size': args.page_size}
+
+    def run(title, queryset, paginator_class, positions):
+        print(title)
+        print(f'{"page":>8} {"offset p50, ms":>15} {"cursor p50, ms":>15}')
+        for page in args.pages:
+            if page * args.page_size > args.size:
+                continue
+            offset_paginator = PageNumberPagination()
+            offset_paginator.page_size = args.page_size
+            offset = [fetch(offset_paginator, queryset, {'page': page}) for _ in range(args.repeat)]
+            params = cursor_params(paginator_class, positions[(page - 1) * args.page_size - 1] if page > 1 else None)
+            cursor = [fetch(paginator_class(), queryset, params) for _ in range(args.repeat)]
+            print(f'{page:>8} {statistics.median(offset):>15.2f} {statistics.median(cursor):>15.2f}')
+
+    with test_database():
+        user = User.objects.create(email='bench@example.com', type='shop', is_active=True)
+        PriceListImporter(user.id, batch_size=2000).run(make_price_list(args.size))
+
+        products = ProductIndex.objects.filter(shop_state=True).order_by('product_info_id')
+        run('Каталог товаров', products, ProductCursorPagination,
+            list(products.values_list('product_info_id', flat=True)))
+
+        Order.objects.bulk_create([Order(user=user, state='new') for _ in range(args.size)], batch_size=2000)
+        orders = Order.objects.filter(user_id=user.id).exclude(state='basket').order_by('-id')
+        run('Заказы пользователя', orders, OrderCursorPagination,
+            list(orders.values_list('id', flat=True)))
+
+
+if __name__ == '__main__':
+    main()
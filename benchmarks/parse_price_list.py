@@ -0,0 +1,66 @@
+"""
+Бенчмарк потокового чтения прайс-листа.
+
+Сравнивает время и пиковое потребление памяти (tracemalloc) при чтении YAML-файла
+через shopmanager.feeds.read_feed и при загрузке документа целиком через yaml.load.
+При потоковом чтении пик памяти не зависит от количества товаров.
+"""
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+import yaml
+
+from benchmarks.data import make_price_list
+from benchmarks.utils import setup_django
+
+
+def write_price_list(file, size):
+    data = make_price_list(size)
+    goods = data.pop('goods')
+    yaml.dump(data, file, allow_unicode=True, encoding='utf-8')
+    yaml.dump({'goods': goods}, file, allow_unicode=True, encoding='utf-8')
+    file.flush()
+
+
+def measure_peak(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    setup_django()
+    from shopmanager.feeds import read_feed, EventLoader
+    from shopmanager.importer import chunked
+
+    def stream(path):
+        with open(path, 'rb') as file:
+            for _ in chunked(read_feed(file)['goods'], 500):
+                pass
+
+    def full(path):
+        with open(path, 'rb') as file:
+            yaml.load(file, Loader=yaml.Loader)
+
+    print(f'YAML event loader: {EventLoader.__name__}')
+    print(f'{"goods":>10} {"stream, s":>10} {"stream, MB":>11} {"load, s":>10} {"load, MB":>10}')
+    for size in args.sizes:
+        with tempfile.NamedTemporaryFile(suffix='.yaml') as file:
+            write_price_list(file, size)
+            stream_seconds, stream_peak = measure_peak(lambda: stream(file.name))
+            full_seconds, full_peak = measure_peak(lambda: full(file.name))
+        print(f'{size:>10} {stream_seconds:>10.3f} {stream_peak:>11.1f} {full_seconds:>10.3f} {full_peak:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Бенчмарк чтения заказов и каталога через сериализаторы и через проекции values().
+
+Для страниц из 10, 100 и 1000 заказов по 5 позиций замеряет время и количество запросов
+OrderSerializer с предзагрузкой связанных объектов и ordermanager.readers.order_rows,
+а для тех же размеров страницы каталога - ProductIndexSerializer и shopmanager.readers.catalog_rows.
+"""
+import argparse
+import statistics
+
+from benchmarks.data import make_price_list
+from benchmarks.utils import setup_django, test_database, measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--items', type=int, default=5, help='позиций в заказе')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from ordermanager.models import Order, OrderItem
+    from ordermanager.readers import ORDER_FIELDS, order_rows
+    from ordermanager.serializers import OrderSerializer
+    from shopmanager.importer import PriceListImporter
+    from shopmanager.models import ProductInfo, ProductIndex
+    from shopmanager.readers import CATALOG_FIELDS, catalog_rows
+    from shopmanager.serializers import ProductIndexSerializer
+    from usermanager.models import User, Contact
+
+    with test_database():
+        shop = User.objects.create(email='bench-shop@example.com', type='shop', is_active=True)
+        PriceListImporter(shop.id, batch_size=2000).run(make_price_list(max(max(args.sizes), args.items)))
+        product_infos = list(ProductInfo.objects.order_by('id'))
+
+        buyer = User.objects.create(email='bench-buyer@example.com', type='buyer', is_active=True)
+        contact = Contact.objects.create(user=buyer, city='Москва', street='Ленина', phone='123')
+        Order.objects.bulk_create([Order(user=buyer, state='new', contact=contact) for _ in range(max(args.sizes))])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_info=product_info, quantity=1, price=product_info.price)
+            for index, order in enumerate(Order.objects.filter(user_id=buyer.id))
+            for product_info in product_infos[index:index + args.items]], batch_size=2000)
+
+        orders = Order.objects.filter(user_id=buyer.id).order_by('-id')
+        catalog = ProductIndex.objects.order_by('product_info_id')
+        readers = {
+            'orders': {
+                'OrderSerializer': lambda size: OrderSerializer(orders.prefetch_related(
+                    'ordered_items__product_info__product__category',
+                    'ordered_items__product_info__product_parameters__parameter').select_related(
+                    'contact')[:size], many=True).data,
+                'order_rows': lambda size: order_rows(list(orders.values(*ORDER_FIELDS)[:size])),
+            },
+            'catalog': {
+                'ProductIndexSerializer': lambda size: ProductIndexSerializer(catalog[:size], many=True).data,
+                'catalog_rows': lambda size: catalog_rows(catalog.values(*CATALOG_FIELDS)[:size]),
+            },
+        }
+
+        print(f'{"page":>8} {"reader":>24} {"size":>6} {"median, ms":>11} {"queries":>8} {"speedup":>8}')
+        for page, sources in readers.items():
+            for size in args.sizes:
+                baseline = None
+                for name, read in sources.items():
+                    timings = []
+                    for _ in range(args.repeat):
+                        with measure() as result:
+                            read(size)
+                        timings.append(result['seconds'] * 1000)
+                    median = statistics.median(timings)
+                    baseline = baseline or median
+                    print(f'{page:>8} {name:>24} {size:>6} {median:>11.2f} {result["queries"]:>8} '
+                          f'{baseline / median:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Бенчмарк сериализации и формирования JSON-ответа каталога.
+
+Для 1, 100 и 10000 товаров замеряет время вложенной сериализации (ProductInfoSerializer
+с ProductSerializer и ProductParameterSerializer, а также ProductIndexSerializer каталога)
+и время формирования JSON стандартным JSONRenderer и FastJSONRenderer с каждой доступной библиотекой.
+"""
+import argparse
+import statistics
+import time
+from unittest.mock import patch
+
+from benchmarks.data import make_price_list
+from benchmarks.utils import setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+
+    from api_diplom_final.renderers import FastJSONRenderer, available_backends
+    from shopmanager.importer import PriceListImporter
+    from shopmanager.models import ProductInfo, ProductIndex
+    from shopmanager.serializers import ProductInfoSerializer, ProductIndexSerializer
+    from usermanager.models import User
+
+    renderers = [('JSONRenderer', JSONRenderer, None)] + [
+        (f'FastJSONRenderer ({backend})', FastJSONRenderer, backend) for backend in available_backends()]
+
+    with test_database():
+        user = User.objects.create(email='bench@example.com', type='shop', is_active=True)
+        PriceListImporter(user.id, batch_size=2000).run(make_price_list(max(args.sizes)))
+
+        sources = {
+            'ProductInfoSerializer': lambda size: ProductInfoSerializer(
+                ProductInfo.objects.select_related('product__category').prefetch_related(
+                    'product_parameters__parameter').order_by('id')[:size], many=True).data,
+            'ProductIndexSerializer': lambda size: ProductIndexSerializer(
+                ProductIndex.objects.order_by('product_info_id')[:size], many=True).data,
+        }
+
+        print(f'{"serializer":>24} {"size":>6} {"serialize, ms":>14} {"renderer":>28} {"render, ms":>11} {"bytes":>10}')
+        for name, serialize in sources.items():
+            for size in args.sizes:
+                data, timings = None, []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    data = serialize(size)
+                    timings.append((time.perf_counter() - start) * 1000)
+                serialize_ms = statistics.median(timings)
+
+                for renderer_name, renderer_class, backend in renderers:
+                    timings = []
+                    with patch.object(renderer_class, 'backend', backend, create=True):
+                        for _ in range(args.repeat):
+                            start = time.perf_counter()
+                            body = renderer_class().render({'results': data})
+                            timings.append((time.perf_counter() - start) * 1000)
+                    print(f'{name:>24} {size:>6} {serialize_ms:>14.2f} {renderer_name:>28} '
+                          f'{statistics.median(timings):>11.2f} {len(body):>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Бенчмарк полнотекстового и фасетного поиска по каталогу.
+
+Заполняет временную БД синтетическим каталогом через PriceListImporter (каталог ProductIndex,
+фасетный индекс и полнотекстовый индекс обновляются так же, как при обычном импорте),
+после чего замеряет p50/p95 задержки запросов страницы каталога (подсчет количества и выборка страницы),
+отдельно - подсчета фасетов (отдельные запросы по фасетному индексу и диапазону цен),
+и p95 их суммы, соответствующей ответу каталога с параметром facets=1.
+
+Результаты на SQLite (--repeat 20, FACET_SCAN_LIMIT=1000), p95 в мс: страница / страница с фасетами:
+
+    scenario             50 000       200 000
+    text                 45 / 65      134 / 166
+    prefix               19 / 35       88 / 130
+    facet                26 / 48      102 / 160
+    facet_range         121 / 226     467 / 845
+    text_facet_price     32 / 78      103 / 210
+
+Фасеты считаются только по запросу (facets=1) и по первым FACET_SCAN_LIMIT найденным товарам,
+поэтому их подсчет стоит примерно столько же, сколько поиск этих товаров. Фильтры по фасетам
+перебирают все подходящие строки фасетного индекса, поэтому время поиска (особенно с числовыми
+диапазонами) растет примерно линейно с количеством найденных товаров. Целевое значение
+p95 < 50 мс на каталоге из 1 000 000 позиций не достигается на SQLite и не замерялось на PostgreSQL.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.data import make_price_list
+from benchmarks.utils import setup_django, test_database
+
+BRANDS = ['Apple', 'Samsung', 'Xiaomi', 'Huawei', 'Nokia', 'Sony', 'Honor', 'Realme', 'Motorola', 'Asus']
+KINDS = ['Смартфон', 'Планшет', 'Ноутбук', 'Наушники', 'Часы', 'Телевизор']
+COLORS = ['черный', 'белый', 'синий', 'красный', 'золотой']
+
+SCENARIOS = {
+    'text': {'text': 'смартфон samsung'},
+    'prefix': {'text': 'план'},
+    'facet': {'facets': [('Цвет', '=', 'черный')]},
+    'facet_range': {'facets': [('Цвет', '=', 'белый'), ('Диагональ', '>=', '6')]},
+    'text_facet_price': {'text': 'ноутбук', 'facets': [('Цвет', '=', 'синий')], 'price_min': 10000,
+                         'price_max': 50000},
+}
+
+
+def make_catalog(size, seed=0):
+    rnd = random.Random(seed)
+    data = make_price_list(size, shop_name='Бенчмарк поиска', parameters_count=3, seed=seed)
+    for index, item in enumerate(data['goods']):
+        brand, kind = rnd.choice(BRANDS), rnd.choice(KINDS)
+        item['name'] = f'{kind} {brand} {rnd.randint(1, 99)} {index}'
+        item['model'] = f'{brand.lower()}/{kind.lower()}/{index}'
+        item['parameters'] = {'Цвет': rnd.choice(COLORS),
+                              'Диагональ': str(round(rnd.uniform(4, 16), 1)),
+                              'Память': str(rnd.choice([64, 128, 256, 512]))}
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--page-size', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from shopmanager.importer import PriceListImporter
+    from shopmanager.models import ProductIndex
+    from shopmanager.search import search_products, facet_counts
+    from usermanager.models import User
+
+    with test_database():
+        user = User.objects.create(email='bench@example.com', type='shop', is_active=True)
+        start = time.perf_counter()
+        PriceListImporter(user.id, batch_size=2000).run(make_catalog(args.size))
+        print(f'Каталог из {args.size} позиций загружен за {time.perf_counter() - start:.1f} с')
+
+        print(f'{"scenario":>18} {"found":>8} {"p50, ms":>9} {"p95, ms":>9} {"facets p95, ms":>15} '
+              f'{"total p95, ms":>14}')
+        for name, params in SCENARIOS.items():
+            timings, facet_timings, totals = [], [], []
+            found = 0
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                queryset = search_products(ProductIndex.objects.filter(shop_state=True).order_by('product_info_id'),
+                                           **params)
+                found = queryset.count()
+                list(queryset[:args.page_size])
+                timings.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                facet_counts(queryset)
+                facet_timings.append((time.perf_counter() - start) * 1000)
+                totals.append(timings[-1] + facet_timings[-1])
+
+            print(f'{name:>18} {found:>8} {statistics.median(timings):>9.1f} {percentile(timings, 95):>9.1f} '
+                  f'{percentile(facet_timings, 95):>15.1f} {percentile(totals, 95):>14.1f}')
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Микробенчмарк накладных расходов проверки ограничения частоты запросов.
+
+Сравнивает ScopedRateThrottle из DRF (история временных меток в кэше, которая читается и сохраняется
+целиком при каждой проверке) с ScopedBucketThrottle (корзина из двух чисел) в кэше Django
+и, при указании --redis-url, в Redis. Для истории замеры выполняются при разной ее длине.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.utils import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--checks', type=int, default=5000)
+    parser.add_argument('--history', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--redis-url', default=None)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import cache
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.throttling import ScopedRateThrottle
+
+    from api_diplom_final import throttling
+
+    request = Request(APIRequestFactory().get('/', REMOTE_ADDR='10.0.0.1'))
+
+    class View:
+        throttle_scope = 'bench'
+
+    rates = {'bench': f'{10 ** 9}/day'}
+
+    def run(throttle_class, prepare=None):
+        timings = []
+        for _ in range(args.checks):
+            if prepare:
+                prepare()
+            throttle = throttle_class()
+            start = time.perf_counter()
+            throttle.allow_request(request, View)
+            timings.append((time.perf_counter() - start) * 1_000_000)
+        return timings
+
+    class HistoryThrottle(ScopedRateThrottle):
+        THROTTLE_RATES = rates
+
+    class BucketThrottle(throttling.ScopedBucketThrottle):
+        THROTTLE_RATES = rates
+
+    print(f'{"throttle":>28} {"p50, us":>9} {"p95, us":>9}')
+    for size in args.history:
+        cache.clear()
+        key = HistoryThrottle().cache_format % {'scope': 'bench', 'ident': '10.0.0.1'}
+        now = time.time()
+        history = [now - index * 0.001 for index in range(size)]
+
+        def restore_history():
+            cache.set(key, history, 86400)
+
+        report(f'DRF history ({size})', run(HistoryThrottle, restore_history))
+
+    stores = [('bucket, Django cache', throttling.CacheBucketStore())]
+    if args.redis_url:
+        stores.append(('bucket, Redis', throttling.RedisBucketStore(args.redis_url)))
+    for name, store in stores:
+        throttling._store = store
+        cache.clear()
+        report(name, run(BucketThrottle))
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    print(f'{name:>28} {statistics.median(timings):>9.1f} {timings[int(len(timings) * 0.95)]:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Бенчмарк аутентификации по токену.
+
+Сравнивает TokenAuthentication (запрос Token JOIN User на каждый запрос) с CachedTokenAuthentication
+на холодных (первый запрос токена), теплых из общего кэша и теплых из кэша процесса запросах.
+Для каждого сценария выводятся p50/p95 времени аутентификации и количество запросов к БД.
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.utils import setup_django, test_database, measure, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import cache
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.authtoken.models import Token
+    from rest_framework.test import APIRequestFactory
+
+    from usermanager.authentication import CachedTokenAuthentication, local_tokens
+    from usermanager.models import User
+
+    factory = APIRequestFactory()
+
+    with test_database():
+        User.objects.bulk_create([User(email=f'user{number}@example.com', is_active=True)
+                                  for number in range(args.users)])
+        Token.objects.bulk_create([Token(key=Token.generate_key(), user=user) for user in User.objects.all()])
+        requests = [factory.get('/', HTTP_AUTHORIZATION=f'Token {key}')
+                    for key in Token.objects.values_list('key', flat=True)]
+
+        def run(authentication, before_each=None):
+            timings, queries = [], 0
+            for _ in range(args.repeat):
+                if before_each:
+                    before_each()
+                with measure() as result:
+                    for request in requests:
+                        start = time.perf_counter()
+                        authentication.authenticate(request)
+                        timings.append((time.perf_counter() - start) * 1000)
+                queries += result['queries']
+            return timings, queries / (args.repeat * len(requests))
+
+        def cold():
+            cache.clear()
+            local_tokens.clear()
+
+        cached = CachedTokenAuthentication()
+        scenarios = [('TokenAuthentication', TokenAuthentication(), None),
+                     ('cached, cold', cached, cold),
+                     ('cached, shared tier', cached, local_tokens.clear),
+                     ('cached, local tier', cached, None)]
+
+        print(f'{"scenario":>22} {"p50, ms":>9} {"p95, ms":>9} {"queries/request":>16}')
+        for name, authentication, before_each in scenarios:
+            timings, queries = run(authentication, before_each)
+            print(f'{name:>22} {statistics.median(timings):>9.3f} {percentile(timings, 95):>9.3f} {queries:>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
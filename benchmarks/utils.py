@@ -0,0 +1,55 @@
+import os
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup_django():
+    """ Функция настраивает Django для запуска бенчмарка вне manage.py. """
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_diplom_final.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """ Контекстный менеджер создает временную тестовую базу данных и удаляет её после замеров. """
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextmanager
+def measure():
+    """
+    Контекстный менеджер замеряет время выполнения блока и количество запросов к БД.
+    Результат доступен в словаре с ключами 'seconds' и 'queries' после выхода из блока.
+    """
+
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    result = {}
+    context = CaptureQueriesContext(connection)
+    start = time.perf_counter()
+    with context:
+        yield result
+    result['seconds'] = time.perf_counter() - start
+    result['queries'] = len(context.captured_queries)
+
+
+def percentile(values, percent):
+    """ Функция возвращает перцентиль percent значений values (ближайший ранг). """
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
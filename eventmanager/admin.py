@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from eventmanager.models import Event
+
+
+@admin.register(Event)
+class EventAdmin(admin.ModelAdmin):
+    """ Класс админки очереди доменных событий. """
+
+    list_display = ('id', 'type', 'created_at', 'processed_at', 'attempts')
+    list_filter = ('type', 'processed_at')
+    readonly_fields = ('type', 'payload', 'created_at', 'next_attempt_at', 'processed_at', 'attempts', 'error')
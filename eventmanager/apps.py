@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class EventmanagerConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'eventmanager'
+
+    def ready(self):
+        # Обработчики событий регистрируются в модулях handlers.py приложений.
+        autodiscover_modules('handlers')
@@ -0,0 +1,24 @@
+from django.db import models
+
+
+class Event(models.Model):
+    """
+    Доменное событие (транзакционная очередь). События сохраняются в одной транзакции с изменениями,
+    которые их вызвали, и передаются обработчикам задачей relay_events.
+    """
+
+    type = models.CharField(max_length=50, verbose_name='Тип события')
+    payload = models.JSONField(verbose_name='Данные', default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    next_attempt_at = models.DateTimeField(auto_now_add=True, verbose_name='Следующая попытка')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Обработано')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+
+    class Meta:
+        verbose_name = 'Событие'
+        verbose_name_plural = 'Очередь событий'
+        indexes = [models.Index(fields=['processed_at', 'next_attempt_at'], name='event_pending')]
+
+    def __str__(self):
+        return f'{self.type} #{self.id}'
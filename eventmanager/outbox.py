@@ -0,0 +1,19 @@
+from django.db import transaction
+
+from api_diplom_final.celery import enqueue
+from eventmanager.models import Event
+from eventmanager.tasks import relay_events
+
+
+def publish(event_type, **payload):
+    """
+    Функция сохраняет доменное событие event_type в текущей транзакции. После ее фиксации запускается
+    задача relay_events; если задачу не удалось поставить в очередь, событие обработает периодический запуск.
+    """
+
+    Event.objects.create(type=event_type, payload=payload)
+    transaction.on_commit(schedule_relay)
+
+
+def schedule_relay():
+    enqueue(relay_events)
@@ -0,0 +1,21 @@
+from collections import defaultdict
+
+# Типы доменных событий и данные, которые они содержат.
+ORDER_STATE_CHANGED = 'order.state_changed'  # {'order_ids': [...], 'state': статус}
+PRICE_LIST_IMPORTED = 'price_list.imported'  # {'shop_ids', 'category_ids', 'shops', 'categories'}
+SHOP_STATE_CHANGED = 'shop.state_changed'  # {'shop_ids', 'category_ids', 'state'}
+
+HANDLERS = defaultdict(list)
+
+
+def handler(event_type):
+    """
+    Декоратор регистрирует обработчик событий event_type. Обработчик получает список данных
+    (payload) всех событий этого типа из обрабатываемой группы, что позволяет объединять побочные эффекты.
+    """
+
+    def register(function):
+        HANDLERS[event_type].append(function)
+        return function
+
+    return register
@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+from celery import shared_task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from api_diplom_final.outbox import relay_batch, relay_all
+from eventmanager.models import Event
+from eventmanager.registry import HANDLERS
+from usermanager.tasks import drain_email_outbox
+
+
+def pending_events():
+    return Event.objects.filter(processed_at__isnull=True, attempts__lt=settings.EVENT_MAX_RETRIES + 1,
+                                next_attempt_at__lte=timezone.now())
+
+
+def handle_events(events):
+    """
+    Функция группирует события по типу и вызывает каждый обработчик один раз для всей группы
+    в отдельной точке сохранения. Если обработчик завершился ошибкой, необработанными считаются
+    все события его типа. Возвращает словарь {id события: ошибка}.
+    """
+
+    groups = defaultdict(list)
+    for event in events:
+        groups[event.type].append(event)
+
+    errors = {}
+    for event_type, group in groups.items():
+        try:
+            with transaction.atomic():
+                for function in HANDLERS[event_type]:
+                    function([event.payload for event in group])
+        except Exception as error:
+            errors.update((event.id, error) for event in group)
+    return errors
+
+
+def retry_countdown(attempts):
+    """ Функция возвращает задержку повторной обработки события в секундах (экспоненциальный рост). """
+
+    return settings.EVENT_RETRY_BACKOFF * 2 ** attempts
+
+
+def relay(limit):
+    """
+    Функция передает обработчикам до limit событий из очереди и возвращает количество обработанных.
+    События, обработчик которых завершился ошибкой, откладываются с экспоненциальной задержкой
+    (не более EVENT_MAX_RETRIES повторов).
+    """
+
+    return relay_batch(pending_events(), limit, handle_events, 'processed_at', retry_countdown)
+
+
+@shared_task(ignore_result=True)
+def relay_events():
+    """ Задача передает обработчикам события из очереди группами по EVENT_RELAY_BATCH_SIZE. """
+
+    return relay_all(pending_events, settings.EVENT_RELAY_BATCH_SIZE, handle_events, 'processed_at',
+                     retry_countdown)
+
+
+@shared_task(ignore_result=True)
+def relay_outboxes():
+    """
+    Периодическая задача разбирает транзакционные очереди, задачи для которых не удалось поставить
+    в очередь, и выполняет отложенные повторы: сначала доменные события, затем исходящие письма,
+    включая письма, поставленные в очередь обработчиками событий.
+    """
+
+    return relay_events() + drain_email_outbox()
@@ -0,0 +1,98 @@
+from unittest.mock import patch, Mock
+
+from django.db import transaction
+from kombu.exceptions import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from eventmanager.models import Event
+from eventmanager.outbox import publish
+from eventmanager.registry import HANDLERS, ORDER_STATE_CHANGED, PRICE_LIST_IMPORTED
+from eventmanager.tasks import relay, relay_events
+
+
+class EventRelayTests(TestCase):
+    """
+    Класс для тестирования очереди доменных событий и передачи их обработчикам.
+    """
+
+    def setUp(self):
+        patcher = patch('eventmanager.outbox.relay_events')
+        self.relay_events = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.orders_handler, self.imports_handler = Mock(), Mock()
+        patcher = patch.dict(HANDLERS, {ORDER_STATE_CHANGED: [self.orders_handler],
+                                        PRICE_LIST_IMPORTED: [self.imports_handler]}, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return super().setUp()
+
+    def test_publish_is_transactional(self):
+        """
+        Проверка того, что событие сохраняется вместе с транзакцией, а задача передачи
+        обработчикам запускается только после ее фиксации.
+        """
+
+        try:
+            with transaction.atomic():
+                publish(ORDER_STATE_CHANGED, order_ids=[1], state='sent')
+                raise ValueError
+        except ValueError:
+            pass
+        assert not Event.objects.exists()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            publish(ORDER_STATE_CHANGED, order_ids=[1], state='sent')
+            self.relay_events.apply_async.assert_not_called()
+        self.relay_events.apply_async.assert_called_once_with((), retry=False, ignore_result=True)
+        assert Event.objects.get().payload == {'order_ids': [1], 'state': 'sent'}
+
+    def test_publish_survives_broker_outage(self):
+        """
+        Проверка того, что недоступность брокера не прерывает запрос: ошибка записывается в лог,
+        а событие остается в очереди для периодического запуска relay_events.
+        """
+
+        self.relay_events.apply_async.side_effect = OperationalError('broker is down')
+        with self.assertLogs('api_diplom_final.celery', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            publish(ORDER_STATE_CHANGED, order_ids=[1], state='sent')
+
+        assert Event.objects.filter(processed_at__isnull=True).count() == 1
+
+    def test_relay_groups_events_by_type(self):
+        """ Проверка того, что обработчик вызывается один раз для всех событий своего типа. """
+
+        for order_id in range(3):
+            publish(ORDER_STATE_CHANGED, order_ids=[order_id], state='sent')
+        publish(PRICE_LIST_IMPORTED, shop_ids=[1], category_ids=[], shops=False, categories=False)
+
+        assert relay_events() == 4
+        self.orders_handler.assert_called_once_with([{'order_ids': [order_id], 'state': 'sent'}
+                                                     for order_id in range(3)])
+        self.imports_handler.assert_called_once()
+        assert not Event.objects.filter(processed_at__isnull=True).exists()
+        assert relay_events() == 0
+
+    @override_settings(EVENT_MAX_RETRIES=1, EVENT_RETRY_BACKOFF=60)
+    def test_failed_handler_is_retried_with_backoff(self):
+        """
+        Проверка того, что ошибка обработчика откладывает только события его типа,
+        а после исчерпания попыток события остаются в очереди с последней ошибкой.
+        """
+
+        self.orders_handler.side_effect = RuntimeError('mail server is down')
+        publish(ORDER_STATE_CHANGED, order_ids=[1], state='sent')
+        publish(PRICE_LIST_IMPORTED, shop_ids=[1], category_ids=[], shops=False, categories=False)
+
+        assert relay(10) == 1
+        failed = Event.objects.get(type=ORDER_STATE_CHANGED)
+        assert failed.processed_at is None and failed.attempts == 1
+        assert 'mail server is down' in failed.error
+        assert (failed.next_attempt_at - timezone.now()).total_seconds() > 50
+        assert relay(10) == 0
+
+        for attempts in (2, 2):
+            Event.objects.filter(id=failed.id).update(next_attempt_at=timezone.now())
+            relay(10)
+            assert Event.objects.get(id=failed.id).attempts == attempts
+        assert self.orders_handler.call_count == 2
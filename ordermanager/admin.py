@@ -1,3 +1,55 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-# Register your models here.
+from ordermanager.models import Order, OrderItem
+from ordermanager.states import transition_orders, TransitionError
+
+
+def transition_action(target, description):
+    """ Функция создает действие админки, переводящее выбранные заказы в статус target. """
+
+    def action(modeladmin, request, queryset):
+        try:
+            result = transition_orders(list(queryset.values_list('id', flat=True)), target)
+        except TransitionError as error:
+            modeladmin.message_user(request, str(error), level=messages.ERROR)
+            return
+        if result['updated']:
+            modeladmin.message_user(request, f'Статус изменен у заказов: {len(result["updated"])}')
+        if result['errors']:
+            modeladmin.message_user(request, f'Статус не изменен у заказов: {len(result["errors"])}',
+                                    level=messages.WARNING)
+
+    action.__name__ = f'mark_{target}'
+    action.short_description = description
+    return action
+
+
+class OrderItemInline(admin.TabularInline):
+    """
+    Класс позиций заказа в админке только для просмотра: изменение позиций в обход корзины
+    не пересчитывает сумму заказа и не резервирует или возвращает остатки товаров.
+    """
+
+    model = OrderItem
+    fields = ('product_info', 'quantity', 'price', 'updated_at')
+    readonly_fields = fields
+    can_delete = False
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    """ Класс админки заказов со сменой статуса и уведомлением покупателей. """
+
+    list_display = ('id', 'user', 'dt', 'state', 'total_sum')
+    list_filter = ('state',)
+    readonly_fields = ('state', 'total_sum', 'updated_at')
+    inlines = (OrderItemInline,)
+    actions = [transition_action('confirmed', 'Подтвердить заказы'),
+               transition_action('assembled', 'Отметить заказы собранными'),
+               transition_action('sent', 'Отметить заказы отправленными'),
+               transition_action('delivered', 'Отметить заказы доставленными'),
+               transition_action('canceled', 'Отменить заказы')]
@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.utils import timezone
+
+from ordermanager.models import Order, OrderItem
+from shopmanager.models import ProductInfo
+
+BASKET_OPERATIONS = ('upsert', 'delete')
+MAX_BASKET_OPERATIONS = 1000
+
+
+class BasketOperationError(ValueError):
+    """ Исключение для некорректных пакетов операций с корзиной. """
+
+
+def clean_operation(operation):
+    """
+    Функция проверяет операцию с корзиной {'op': 'upsert' | 'delete', 'product_info': id, 'quantity': n}
+    и возвращает кортеж (op, product_info_id, quantity). При ошибке выбрасывает ValueError.
+    """
+
+    if not isinstance(operation, dict):
+        raise ValueError('Операция должна быть объектом')
+    op = operation.get('op')
+    if op not in BASKET_OPERATIONS:
+        raise ValueError(f'Неизвестная операция: {op}')
+    product_info_id = operation.get('product_info')
+    if type(product_info_id) != int:
+        raise ValueError('Не указан product_info')
+    quantity = operation.get('quantity')
+    if op == 'upsert' and (type(quantity) != int or quantity <= 0):
+        raise ValueError('Количество должно быть положительным целым числом')
+    return op, product_info_id, quantity
+
+
+def apply_basket_operations(user_id, operations):
+    """
+    Функция применяет к корзине пользователя пакет операций и возвращает результаты по каждой строке
+    в исходном порядке: {'line', 'product_info', 'status': created | updated | deleted | not_found | error}.
+
+    Все товары пакета проверяются одним запросом, существующие позиции корзины загружаются одним запросом,
+    после чего изменения записываются через bulk_create, bulk_update и один DELETE в одной транзакции,
+    поэтому количество запросов не зависит от количества строк (на SQLite bulk_create и bulk_update
+    дополнительно делятся на части из-за ограничения на количество параметров в запросе).
+    """
+
+    if not isinstance(operations, list):
+        raise BasketOperationError('Операции должны быть переданы списком')
+    if len(operations) > MAX_BASKET_OPERATIONS:
+        raise BasketOperationError(f'Не более {MAX_BASKET_OPERATIONS} операций за один запрос')
+
+    results = []
+    cleaned = {}
+    for line, operation in enumerate(operations):
+        result = {'line': line, 'product_info': operation.get('product_info') if isinstance(operation, dict) else None}
+        results.append(result)
+        try:
+            op, product_info_id, quantity = clean_operation(operation)
+        except ValueError as error:
+            result.update(status='error', error=str(error))
+            continue
+        if product_info_id in cleaned:
+            result.update(status='error', error='Товар указан в пакете повторно')
+            continue
+        cleaned[product_info_id] = (line, op, quantity)
+
+    with transaction.atomic():
+        basket, _ = Order.objects.get_or_create(user_id=user_id, state='basket')
+        prices = dict(ProductInfo.objects.filter(
+            id__in=[product_info_id for product_info_id, (_, op, _) in cleaned.items() if op == 'upsert']).values_list(
+            'id', 'price'))
+        existing = {item.product_info_id: item for item in OrderItem.objects.filter(
+            order_id=basket.id, product_info_id__in=cleaned).only('id', 'product_info_id', 'quantity', 'price')}
+
+        now = timezone.now()
+        created, updated, deleted = [], [], []
+        for product_info_id, (line, op, quantity) in cleaned.items():
+            result = results[line]
+            item = existing.get(product_info_id)
+            if op == 'delete':
+                if item:
+                    deleted.append(item.id)
+                    result.update(status='deleted', id=item.id)
+                else:
+                    result.update(status='not_found')
+            elif product_info_id not in prices:
+                result.update(status='not_found', error='Товар не найден')
+            elif item:
+                item.quantity = quantity
+                item.updated_at = now
+                updated.append(item)
+                result.update(status='updated', id=item.id)
+            else:
+                created.append(OrderItem(order_id=basket.id, product_info_id=product_info_id, quantity=quantity,
+                                         price=prices[product_info_id]))
+                result.update(status='created')
+
+        if created:
+            OrderItem.objects.bulk_create(created)
+            if not all(item.pk for item in created):
+                ids = dict(OrderItem.objects.filter(
+                    order_id=basket.id, product_info_id__in=[item.product_info_id for item in created]).values_list(
+                    'product_info_id', 'id'))
+                for item in created:
+                    item.pk = ids[item.product_info_id]
+            for item in created:
+                results[cleaned[item.product_info_id][0]]['id'] = item.pk
+        if updated:
+            OrderItem.objects.bulk_update(updated, ['quantity', 'updated_at'])
+        if deleted:
+            OrderItem.objects.filter(id__in=deleted).delete()
+        if created or updated or deleted:
+            Order.objects.filter(id=basket.id).update_totals()
+
+    return results
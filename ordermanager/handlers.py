@@ -0,0 +1,15 @@
+from collections import defaultdict
+
+from eventmanager.registry import handler, ORDER_STATE_CHANGED
+from ordermanager.states import notify_state_change
+
+
+@handler(ORDER_STATE_CHANGED)
+def notify_customers(payloads):
+    """ Обработчик сохраняет уведомления покупателей в очередь исходящих писем, по одной пачке на статус. """
+
+    order_ids = defaultdict(list)
+    for payload in payloads:
+        order_ids[payload['state']].extend(payload['order_ids'])
+    for state, ids in order_ids.items():
+        notify_state_change(ids, state)
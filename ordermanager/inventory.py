@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import F, Sum, Case, When, Value, IntegerField
+
+from ordermanager.models import OrderItem
+from shopmanager.models import ProductInfo, ProductIndex
+
+
+class InsufficientStock(Exception):
+    """ Исключение для заказов, товаров которых недостаточно на складе. """
+
+    def __init__(self, product_info_ids):
+        self.product_info_ids = product_info_ids
+        super().__init__(f'Недостаточно товара на складе: {", ".join(map(str, product_info_ids))}')
+
+
+def order_lines(order_id):
+    """ Функция возвращает позиции заказа [(product_info_id, quantity)] в порядке идентификаторов товаров. """
+
+    return list(OrderItem.objects.filter(order_id=order_id).order_by('product_info_id').values_list(
+        'product_info_id', 'quantity'))
+
+
+def stock_delta(quantities, field='id'):
+    """ Функция возвращает выражение CASE, выбирающее количество из словаря quantities {id товара: n}. """
+
+    return Case(*[When(**{field: product_info_id}, then=Value(quantity))
+                  for product_info_id, quantity in quantities.items()], output_field=IntegerField())
+
+
+def lock_products(product_info_ids):
+    """
+    Функция блокирует строки товаров (SELECT ... FOR UPDATE) в порядке идентификаторов,
+    поэтому параллельные списания и возвраты не приводят к взаимным блокировкам.
+    Возвращает словарь остатков {id товара: количество}.
+    """
+
+    return dict(ProductInfo.objects.select_for_update().filter(id__in=product_info_ids).order_by('id').values_list(
+        'id', 'quantity'))
+
+
+def reserve_order(order_id):
+    """
+    Функция резервирует товары заказа, уменьшая остатки условным запросом
+    UPDATE ... SET quantity = quantity - CASE ... WHERE id IN (...) AND quantity >= CASE ...
+
+    Строки товаров блокируются в порядке идентификаторов, после чего все позиции списываются одним
+    запросом с проверкой остатка по каждой строке, поэтому количество запросов не зависит от размера заказа,
+    а параллельные оформления не могут списать больше остатка.
+    Если хотя бы одного товара не хватает, все списания отменяются и выбрасывается InsufficientStock.
+    Функция должна вызываться внутри транзакции, в которой меняется статус заказа.
+    Остаток в каталоге ProductIndex обновляется в той же транзакции; кэшированные ответы каталога
+    не сбрасываются и показывают остаток с задержкой до CATALOG_CACHE_TIMEOUT.
+    """
+
+    with transaction.atomic():
+        lines = dict(order_lines(order_id))
+        stock = lock_products(lines)
+        missing = [product_info_id for product_info_id, quantity in lines.items()
+                   if stock.get(product_info_id, 0) < quantity]
+        if not missing and lines:
+            delta = stock_delta(lines)
+            if ProductInfo.objects.filter(id__in=lines, quantity__gte=delta).update(
+                    quantity=F('quantity') - delta) < len(lines):
+                # Без блокировки строк (SQLite) остаток мог измениться после чтения.
+                missing = list(lines)
+        if missing:
+            raise InsufficientStock(missing)
+        if lines:
+            ProductIndex.objects.filter(product_info_id__in=lines).update(
+                quantity=F('quantity') - stock_delta(lines, 'product_info_id'))
+
+
+def release_orders(order_ids):
+    """
+    Функция возвращает на склад товары отмененных заказов. Количество по каждому товару
+    суммируется одним сгруппированным запросом, остатки всех товаров увеличиваются одним запросом
+    после блокировки строк в порядке идентификаторов.
+    """
+
+    quantities = dict(OrderItem.objects.filter(order_id__in=order_ids).values('product_info_id').annotate(
+        total=Sum('quantity')).order_by('product_info_id').values_list('product_info_id', 'total'))
+    if quantities:
+        lock_products(quantities)
+        ProductInfo.objects.filter(id__in=quantities).update(quantity=F('quantity') + stock_delta(quantities))
+        ProductIndex.objects.filter(product_info_id__in=quantities).update(
+            quantity=F('quantity') + stock_delta(quantities, 'product_info_id'))
@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import F, Sum, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from usermanager.models import User, Contact
 from shopmanager.models import ProductInfo
@@ -15,6 +18,26 @@ STATE_CHOICES = (
 )
 
 
+class OrderQuerySet(models.QuerySet):
+
+    def update_totals(self):
+        """
+        Метод пересчитывает сохраненные суммы заказов одним запросом UPDATE с подзапросом
+        по позициям заказа, используя зафиксированные в позициях цены (без соединений с каталогом).
+        """
+
+        totals = OrderItem.objects.filter(order_id=OuterRef('id')).order_by().values('order_id').annotate(
+            total=Sum(F('quantity') * F('price'))).values('total')
+        return self.update(total_sum=Coalesce(Subquery(totals), Value(0)), updated_at=timezone.now())
+
+    def snapshot_prices(self):
+        """ Метод фиксирует в позициях заказов текущие цены товаров и пересчитывает суммы заказов. """
+
+        prices = ProductInfo.objects.filter(id=OuterRef('product_info_id')).values('price')
+        OrderItem.objects.filter(order__in=self).update(price=Subquery(prices), updated_at=timezone.now())
+        return self.update_totals()
+
+
 class Order(models.Model):
     user = models.ForeignKey(User, verbose_name='Пользователь',
                              related_name='orders', blank=True,
@@ -24,11 +47,21 @@ class Order(models.Model):
     contact = models.ForeignKey(Contact, verbose_name='Контакт',
                                 blank=True, null=True,
                                 on_delete=models.CASCADE)
+    total_sum = models.PositiveIntegerField(verbose_name='Сумма заказа', default=0)
+    # Время последнего изменения заказа или его позиций. Изменения через QuerySet.update()
+    # должны обновлять поле явно (update_totals делает это при любом изменении позиций).
+    updated_at = models.DateTimeField(verbose_name='Изменен', auto_now=True)
+
+    objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = "Список заказ"
         ordering = ('-dt',)
+        indexes = [
+            models.Index(fields=['state', 'dt'], name='order_state_dt'),
+            models.Index(fields=['updated_at', 'id'], name='order_updated'),
+        ]
 
     def __str__(self):
         return str(self.dt)
@@ -42,6 +75,8 @@ class OrderItem(models.Model):
                                      blank=True,
                                      on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена на момент заказа', default=0)
+    updated_at = models.DateTimeField(verbose_name='Изменена', auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Заказанная позиция'
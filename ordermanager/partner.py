@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q, Sum, F, Prefetch, Exists, OuterRef
+from django.utils import timezone
+
+from ordermanager.models import Order, OrderItem
+from ordermanager.serializers import PartnerOrderSerializer
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def supplier_items(user_id):
+    """ Функция возвращает queryset позиций заказов, относящихся к магазину пользователя-поставщика. """
+
+    return OrderItem.objects.filter(product_info__shop__user_id=user_id)
+
+
+def with_supplier_items(orders, user_id):
+    """
+    Функция дополняет queryset заказов отфильтрованной предзагрузкой позиций поставщика (атрибут shop_items).
+    """
+
+    return orders.select_related('contact').prefetch_related(Prefetch(
+        'ordered_items',
+        queryset=supplier_items(user_id).select_related('product_info__product__category').prefetch_related(
+            'product_info__product_parameters__parameter').order_by('id'),
+        to_attr='shop_items'))
+
+
+def supplier_subtotals(order_ids, user_id):
+    """
+    Функция рассчитывает сумму позиций поставщика для заказов order_ids одним сгруппированным запросом
+    и возвращает словарь {id заказа: сумма}.
+    """
+
+    return dict(supplier_items(user_id).filter(order_id__in=order_ids).values(
+        'order_id').annotate(subtotal=Sum(F('quantity') * F('price'))).values_list('order_id', 'subtotal').order_by())
+
+
+def attach_subtotals(orders, user_id):
+    """ Функция сохраняет сумму позиций поставщика в атрибуте shop_total заказов. """
+
+    subtotals = supplier_subtotals([order.id for order in orders], user_id)
+    for order in orders:
+        order.shop_total = subtotals.get(order.id, 0)
+    return orders
+
+
+def encode_cursor(order):
+    """ Функция формирует курсор ленты изменений из времени изменения и идентификатора заказа. """
+
+    return f'{(order.updated_at - EPOCH) // timedelta(microseconds=1)}-{order.id}'
+
+
+def decode_cursor(cursor):
+    """ Функция разбирает курсор ленты изменений. При ошибке выбрасывает ValueError. """
+
+    timestamp, order_id = cursor.split('-')
+    return EPOCH + timedelta(microseconds=int(timestamp)), int(order_id)
+
+
+def order_changes(user_id, cursor=None, limit=100):
+    """
+    Функция возвращает заказы поставщика, созданные или измененные после курсора, в порядке изменения.
+
+    Заказы выбираются по индексу (updated_at, id) с проверкой наличия позиций поставщика через EXISTS,
+    поэтому стоимость запроса определяется количеством изменений, а не историей заказов.
+    Время изменения назначается при выполнении запроса, а не при фиксации транзакции, поэтому заказы,
+    измененные менее ORDER_FEED_GRACE секунд назад, не возвращаются: иначе курсор мог бы пройти
+    время изменения заказа, транзакция которого еще не зафиксирована, и этот заказ был бы пропущен.
+    Возвращает кортеж (данные заказов, курсор для следующего запроса, есть ли еще изменения).
+    """
+
+    orders = Order.objects.exclude(state='basket').filter(
+        Exists(supplier_items(user_id).filter(order_id=OuterRef('id'))),
+        updated_at__lte=timezone.now() - timedelta(seconds=settings.ORDER_FEED_GRACE))
+    if cursor:
+        updated_at, order_id = decode_cursor(cursor)
+        orders = orders.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=order_id))
+
+    orders = list(with_supplier_items(orders, user_id).order_by('updated_at', 'id')[:limit + 1])
+    has_more = len(orders) > limit
+    orders = attach_subtotals(orders[:limit], user_id)
+    next_cursor = encode_cursor(orders[-1]) if orders else cursor
+    return PartnerOrderSerializer(orders, many=True).data, next_cursor, has_more
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.utils import timezone
+
+from ordermanager.models import OrderItem
+from shopmanager.readers import product_info_rows
+from usermanager.models import Contact
+
+# Поля Order, из которых собирается запись заказа.
+ORDER_FIELDS = ('id', 'state', 'dt', 'total_sum', 'contact_id')
+CONTACT_FIELDS = ('id', 'city', 'street', 'house', 'structure', 'building', 'apartment', 'phone')
+
+
+def format_datetime(value):
+    """ Функция форматирует дату-время так же, как DateTimeField DRF с настройками по умолчанию. """
+
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def order_rows(orders, items=None, totals=None):
+    """
+    Функция формирует заказы в формате OrderSerializer из словарей Order.objects.values(*ORDER_FIELDS)
+    без создания экземпляров моделей и полей DRF.
+
+    Позиции, товары с параметрами и контакты загружаются запросами values_list для всех заказов сразу
+    и раскладываются по заказам словарями. Необязательный queryset items ограничивает позиции
+    (например, позициями поставщика), словарь totals {id заказа: сумма} заменяет total_sum.
+    """
+
+    order_ids = [order['id'] for order in orders]
+    lines = list((items if items is not None else OrderItem.objects.all()).filter(
+        order_id__in=order_ids).order_by('id').values_list('order_id', 'id', 'product_info_id', 'quantity', 'price'))
+    products = product_info_rows({line[2] for line in lines})
+
+    ordered_items = {}
+    for order_id, pk, product_info_id, quantity, price in lines:
+        ordered_items.setdefault(order_id, []).append({'id': pk, 'product_info': products[product_info_id],
+                                                       'quantity': quantity, 'price': price})
+
+    contact_ids = {order['contact_id'] for order in orders if order['contact_id'] is not None}
+    contacts = {contact['id']: contact for contact in Contact.objects.filter(id__in=contact_ids).values(
+        *CONTACT_FIELDS)} if contact_ids else {}
+
+    return [{'id': order['id'], 'ordered_items': ordered_items.get(order['id'], []), 'state': order['state'],
+             'dt': format_datetime(order['dt']),
+             'total_sum': totals.get(order['id'], 0) if totals is not None else order['total_sum'],
+             'contact': contacts.get(order['contact_id'])}
+            for order in orders]
@@ -8,8 +8,8 @@ from usermanager.serializers import ContactSerializer
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
-        fields = ('id', 'product_info', 'quantity', 'order',)
-        read_only_fields = ('id',)
+        fields = ('id', 'product_info', 'quantity', 'price', 'order',)
+        read_only_fields = ('id', 'price',)
         extra_kwargs = {
             'order': {'write_only': True}
         }
@@ -22,7 +22,20 @@ class OrderItemCreateSerializer(OrderItemSerializer):
 class OrderSerializer(serializers.ModelSerializer):
     ordered_items = OrderItemCreateSerializer(read_only=True, many=True)
 
-    total_sum = serializers.IntegerField()
+    total_sum = serializers.IntegerField(read_only=True)
+    contact = ContactSerializer(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'ordered_items', 'state', 'dt', 'total_sum', 'contact',)
+        read_only_fields = ('id',)
+
+
+class PartnerOrderSerializer(serializers.ModelSerializer):
+    """ Сериализатор заказа для поставщика: только позиции поставщика и сумма по ним. """
+
+    ordered_items = OrderItemCreateSerializer(source='shop_items', read_only=True, many=True)
+    total_sum = serializers.IntegerField(source='shop_total', read_only=True)
     contact = ContactSerializer(read_only=True)
 
     class Meta:
@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.utils import timezone
+
+from api_diplom_final.mail import email_payload
+from eventmanager.outbox import publish
+from eventmanager.registry import ORDER_STATE_CHANGED
+from ordermanager.inventory import release_orders, reserve_order
+from ordermanager.models import Order, STATE_CHOICES
+from usermanager.outbox import enqueue_emails
+
+# Допустимые переходы между статусами заказа (STATE_CHOICES).
+# Переход из корзины в 'new' выполняется только функцией checkout_order вместе с резервированием товаров
+# и фиксацией цен, поэтому в таблице переходов его нет.
+TRANSITIONS = {
+    'basket': (),
+    'new': ('confirmed', 'canceled'),
+    'confirmed': ('assembled', 'canceled'),
+    'assembled': ('sent', 'canceled'),
+    'sent': ('delivered',),
+    'delivered': (),
+    'canceled': (),
+}
+
+# Статусы, в которых товары заказа зарезервированы на складе.
+RESERVED_STATES = ('new', 'confirmed', 'assembled')
+
+MAX_TRANSITION_ORDERS = 5000
+
+STATE_MESSAGES = {
+    'new': 'Заказ сформирован.',
+}
+
+
+class TransitionError(ValueError):
+    """ Исключение для недопустимых переходов между статусами заказа. """
+
+
+def source_states(target):
+    """ Функция возвращает статусы, из которых допустим переход в статус target. """
+
+    if target not in TRANSITIONS:
+        raise TransitionError(f'Неизвестный статус заказа: {target}')
+    return tuple(state for state, targets in TRANSITIONS.items() if target in targets)
+
+
+def transition_orders(order_ids, target, orders=None):
+    """
+    Функция переводит заказы order_ids в статус target и возвращает словарь
+    {'updated': [id, ...], 'errors': {id: причина}}.
+
+    Текущие статусы всех заказов проверяются одним запросом (на PostgreSQL - с блокировкой строк),
+    допустимые переходы записываются одним запросом UPDATE с условием по исходным статусам.
+    Если UPDATE изменил не все проверенные заказы (статус изменился параллельно), транзакция откатывается
+    с TransitionError. При отмене заказа резерв его товаров возвращается на склад. В той же транзакции сохраняется
+    событие ORDER_STATE_CHANGED, обработчик которого уведомляет покупателей.
+    Необязательный queryset orders ограничивает заказы, доступные для изменения (например, заказы поставщика).
+    """
+
+    sources = source_states(target)
+    order_ids = list(dict.fromkeys(order_ids))
+    if len(order_ids) > MAX_TRANSITION_ORDERS:
+        raise TransitionError(f'Не более {MAX_TRANSITION_ORDERS} заказов за один запрос')
+
+    orders = Order.objects.all() if orders is None else orders
+    with transaction.atomic():
+        states = dict(orders.select_for_update().filter(id__in=order_ids).order_by('id').values_list('id', 'state'))
+        updated, errors = [], {}
+        for order_id in order_ids:
+            state = states.get(order_id)
+            if state is None:
+                errors[order_id] = 'Заказ не найден'
+            elif state not in sources:
+                errors[order_id] = f'Переход из статуса {state} в статус {target} недопустим'
+            else:
+                updated.append(order_id)
+
+        if updated:
+            if Order.objects.filter(id__in=updated, state__in=sources).update(
+                    state=target, updated_at=timezone.now()) != len(updated):
+                raise TransitionError('Статус заказов изменился во время обработки, повторите запрос')
+            if target == 'canceled':
+                release_orders([order_id for order_id in updated if states[order_id] in RESERVED_STATES])
+            publish(ORDER_STATE_CHANGED, order_ids=updated, state=target)
+
+    return {'updated': updated, 'errors': errors}
+
+
+def checkout_order(order_id, user_id, contact_id):
+    """
+    Функция оформляет корзину order_id пользователя user_id: переводит ее в статус 'new' с контактом contact_id,
+    резервирует товары, фиксирует цены позиций и сохраняет событие ORDER_STATE_CHANGED в одной транзакции.
+    Возвращает False, если корзина не найдена. При нехватке товара выбрасывает InsufficientStock.
+    """
+
+    with transaction.atomic():
+        if not Order.objects.filter(user_id=user_id, id=order_id, state='basket').update(
+                contact_id=contact_id, state='new', updated_at=timezone.now()):
+            return False
+        reserve_order(order_id)
+        Order.objects.filter(id=order_id).snapshot_prices()
+        publish(ORDER_STATE_CHANGED, order_ids=[order_id], state='new')
+    return True
+
+
+def state_message(order_id, state):
+    return STATE_MESSAGES.get(state, f'Статус заказа №{order_id} изменен: {dict(STATE_CHOICES)[state]}.')
+
+
+def notify_state_change(order_ids, state):
+    """
+    Функция сохраняет в очередь исходящих писем уведомления покупателей об изменении статуса заказов.
+    Адреса покупателей загружаются одним запросом, письма сохраняются одним запросом.
+    """
+
+    title = 'Уведомление о смене статуса заказа'
+    enqueue_emails([email_payload(title, state_message(order_id, state), email)
+                    for order_id, email in Order.objects.filter(id__in=order_ids).order_by('id').values_list(
+                        'id', 'user__email')])
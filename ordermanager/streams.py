@@ -0,0 +1,137 @@
+import asyncio
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from ujson import dumps as dump_json
+
+from ordermanager.partner import order_changes, decode_cursor
+from usermanager.authentication import CachedTokenAuthentication
+
+STREAM_PATH = '/partner/orders/stream'
+CHANGES_PATH = '/partner/orders/changes'
+HEARTBEAT_INTERVAL = 15
+
+
+def authenticate_shop(token_key):
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(token_key)
+    except AuthenticationFailed:
+        return None
+    return user if user.type == 'shop' else None
+
+
+# Запросы к БД выполняются в пуле потоков (thread_sensitive=False), поэтому открытые потоки и long-poll
+# запросы разных поставщиков не выстраиваются в очередь к единственному потоку синхронного кода Django.
+authenticate = sync_to_async(authenticate_shop, thread_sensitive=False)
+fetch_changes = sync_to_async(order_changes, thread_sensitive=False)
+
+
+def parse_request(scope):
+    """ Функция возвращает заголовки (в нижнем регистре) и параметры строки запроса ASGI-запроса. """
+
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    params = {name: values[0] for name, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+    return headers, params
+
+
+def is_long_poll(scope):
+    """ Функция проверяет, что запрос к ленте изменений заказов ожидает изменения (параметр wait). """
+
+    return scope['path'] == CHANGES_PATH and scope['method'] == 'GET' and 'wait' in parse_request(scope)[1]
+
+
+async def send_json(send, status, data):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')]})
+    await send({'type': 'http.response.body', 'body': dump_json(data, ensure_ascii=False).encode()})
+
+
+async def order_changes_stream(scope, receive, send):
+    """
+    ASGI-приложение для доставки ленты изменений заказов поставщика через Server-Sent Events.
+
+    Токен передается в заголовке Authorization ("Token <ключ>") или в параметре token,
+    так как EventSource в браузере не позволяет задавать заголовки. Курсор берется из заголовка
+    Last-Event-ID (при переподключении) или параметра since. Изменения отправляются событиями orders
+    с курсором в поле id, при отсутствии изменений раз в HEARTBEAT_INTERVAL секунд отправляется комментарий.
+    База данных опрашивается с интервалом ORDER_FEED_POLL_INTERVAL, ожидание не блокирует цикл событий.
+    """
+
+    headers, params = parse_request(scope)
+    authorization = headers.get('authorization', '')
+    token_key = authorization[len('Token '):] if authorization.startswith('Token ') else params.get('token')
+    user = await authenticate(token_key) if token_key else None
+    if user is None:
+        return await send_json(send, 403, {'Status': False, 'Error': 'Log in required'})
+
+    cursor = headers.get('last-event-id') or params.get('since')
+    try:
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError:
+        return await send_json(send, 400, {'Status': False, 'Errors': 'Некорректный курсор'})
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache')]})
+    try:
+        idle = 0
+        while not disconnected.is_set():
+            results, cursor, has_more = await fetch_changes(user.id, cursor, settings.MAX_PAGE_SIZE)
+            if results:
+                idle = 0
+                data = dump_json(results, ensure_ascii=False)
+                await send({'type': 'http.response.body', 'more_body': True,
+                            'body': f'id: {cursor}\nevent: orders\ndata: {data}\n\n'.encode()})
+                if has_more:
+                    continue
+            else:
+                idle += settings.ORDER_FEED_POLL_INTERVAL
+                if idle >= HEARTBEAT_INTERVAL:
+                    idle = 0
+                    await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+            try:
+                await asyncio.wait_for(disconnected.wait(), timeout=settings.ORDER_FEED_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        watcher.cancel()
+
+
+async def order_changes_long_poll(scope, receive, send):
+    """
+    ASGI-приложение для long-poll запросов к ленте изменений заказов поставщика (запросы с параметром wait).
+
+    Параметры и ответ совпадают с PartnerOrderChanges. Если изменений после курсора нет, БД опрашивается
+    с интервалом ORDER_FEED_POLL_INTERVAL не дольше wait секунд (не больше ORDER_FEED_MAX_WAIT);
+    ожидание не блокирует цикл событий и не занимает поток.
+    """
+
+    headers, params = parse_request(scope)
+    authorization = headers.get('authorization', '')
+    user = await authenticate(authorization[len('Token '):]) if authorization.startswith('Token ') else None
+    if user is None:
+        return await send_json(send, 403, {'Status': False, 'Error': 'Log in required'})
+
+    loop = asyncio.get_running_loop()
+    try:
+        limit = max(min(int(params.get('limit', settings.MAX_PAGE_SIZE)), settings.MAX_PAGE_SIZE), 1)
+        deadline = loop.time() + min(float(params.get('wait', 0)), settings.ORDER_FEED_MAX_WAIT)
+        results, cursor, has_more = await fetch_changes(user.id, params.get('since'), limit)
+        while not results and loop.time() < deadline:
+            await asyncio.sleep(min(settings.ORDER_FEED_POLL_INTERVAL, max(deadline - loop.time(), 0)))
+            results, cursor, has_more = await fetch_changes(user.id, cursor, limit)
+    except ValueError:
+        return await send_json(send, 400, {'Status': False,
+                                           'Errors': 'Некорректные параметры since, limit или wait'})
+
+    await send_json(send, 200, {'Status': True, 'Results': results, 'Cursor': cursor, 'HasMore': has_more})
@@ -0,0 +1,770 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.contrib import admin
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APIClient
+from rest_framework.authtoken.models import Token
+from ujson import dumps as dump_json, loads as load_json
+
+from api_diplom_final.asgi import application
+from api_diplom_final.testing import make_price_list, QueryCountMixin
+from eventmanager.tasks import relay_events
+
+from ordermanager.admin import OrderItemInline
+from ordermanager.models import Order, OrderItem
+from ordermanager.partner import with_supplier_items, attach_subtotals, order_changes
+from ordermanager.serializers import OrderSerializer, PartnerOrderSerializer
+from ordermanager.states import transition_orders
+from ordermanager.streams import STREAM_PATH, CHANGES_PATH
+from shopmanager.importer import PriceListImporter, IncrementalPriceListImporter
+from shopmanager.models import ProductInfo, ProductIndex
+from usermanager.models import User, Contact, OutgoingEmail
+
+
+class OrderManagerAPITests(APITestCase):
+    """
+    Класс для тестирования работы контроллеров из приложения ordermanager.
+    """
+
+    basket_url = reverse('ordermanager:basket')
+    order_url = reverse('ordermanager:order')
+    partner_orders_url = reverse('ordermanager:partner-orders')
+    basket_batch_url = reverse('ordermanager:basket-batch')
+    order_changes_url = reverse('ordermanager:partner-order-changes')
+    order_state_url = reverse('ordermanager:partner-order-state')
+
+    def setUp(self):
+        cache.clear()
+        patcher = patch('usermanager.outbox.drain_email_outbox')
+        self.drain_email_outbox = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('eventmanager.outbox.schedule_relay', relay_events)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.shop_user = User.objects.create(email='shop@gmail.com', type='shop', is_active=True)
+        self.price_list = make_price_list(4)
+        PriceListImporter(self.shop_user.id).run(self.price_list)
+        self.product_infos = list(ProductInfo.objects.order_by('id'))
+
+        self.user = User.objects.create(email='buyer@gmail.com', type='buyer', is_active=True)
+        self.contact = Contact.objects.create(user=self.user, city='Москва', street='Ленина', phone='123')
+        self.login(self.user)
+        return super().setUp()
+
+    def login(self, user):
+        token = Token.objects.get_or_create(user_id=user.id)[0].key
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def add_to_basket(self, *items):
+        items = [{'product_info': product_info.id, 'quantity': quantity} for product_info, quantity in items]
+        return self.client.post(self.basket_url, {'items': dump_json(items)}).json()
+
+    def basket(self):
+        return Order.objects.get(user_id=self.user.id, state='basket')
+
+    def test_basket_total_follows_mutations(self):
+        """
+        Проверка того, что сохраненная сумма корзины обновляется при добавлении, изменении и удалении позиций.
+        """
+
+        first, second = self.product_infos[:2]
+        self.add_to_basket((first, 2), (second, 1))
+        assert self.basket().total_sum == first.price * 2 + second.price
+
+        item = OrderItem.objects.get(order=self.basket(), product_info=first)
+        self.client.put(self.basket_url, {'items': dump_json([{'id': item.id, 'quantity': 5}])})
+        assert self.basket().total_sum == first.price * 5 + second.price
+
+        self.client.delete(self.basket_url, {'items': str(item.id)})
+        assert self.basket().total_sum == second.price
+
+        response = self.client.get(self.basket_url).json()
+        assert response[0]['total_sum'] == second.price
+        assert response[0]['ordered_items'][0]['price'] == second.price
+
+    def test_checkout_snapshots_prices(self):
+        """
+        Проверка того, что при оформлении заказа цены позиций фиксируются
+        и сумма заказа не меняется после обновления прайс-листа поставщиком.
+        """
+
+        first = self.product_infos[0]
+        self.add_to_basket((first, 3))
+        basket = self.basket()
+
+        response = self.client.post(self.order_url, {'id': str(basket.id), 'contact': str(self.contact.id)})
+        assert response.json()['Status'] is True
+
+        self.price_list['goods'][0]['price'] = first.price * 10
+        IncrementalPriceListImporter(self.shop_user.id).run(self.price_list)
+
+        order = self.client.get(self.order_url).json()['results'][0]
+        assert order['total_sum'] == first.price * 3
+        assert order['ordered_items'][0]['price'] == first.price
+
+    def test_reimport_without_ordered_product_recomputes_totals(self):
+        """
+        Проверка того, что при удалении поставщиком товара из прайс-листа сумма и время изменения
+        заказов, из которых каскадно удалены позиции, пересчитываются при полной и инкрементальной загрузке.
+        """
+
+        first, second, third = self.product_infos[:3]
+        self.add_to_basket((first, 1), (second, 2), (third, 1))
+        basket = self.basket()
+        response = self.client.post(self.order_url, {'id': str(basket.id), 'contact': str(self.contact.id)})
+        assert response.json()['Status'] is True
+        order = Order.objects.get(id=basket.id)
+        assert order.total_sum == first.price + second.price * 2 + third.price
+
+        self.price_list['goods'].pop(0)
+        IncrementalPriceListImporter(self.shop_user.id).run(self.price_list)
+        changed = Order.objects.get(id=order.id)
+        assert changed.total_sum == second.price * 2 + third.price
+        assert changed.updated_at > order.updated_at
+
+        self.price_list['goods'].pop(0)
+        PriceListImporter(self.shop_user.id).run(self.price_list)
+        assert Order.objects.get(id=order.id).total_sum == 0
+        assert not OrderItem.objects.filter(order_id=order.id).exists()
+
+    def test_order_list_reads_stored_totals(self):
+        """
+        Проверка того, что список заказов покупателя читает сохраненные суммы без агрегирующих запросов,
+        а в списке заказов поставщика нет DISTINCT по соединению с позициями.
+        """
+
+        self.add_to_basket((self.product_infos[0], 1), (self.product_infos[1], 2))
+        self.client.post(self.order_url, {'id': str(self.basket().id), 'contact': str(self.contact.id)})
+
+        with CaptureQueriesContext(connection) as context:
+            orders = self.client.get(self.order_url).json()['results']
+        self.login(self.shop_user)
+        with CaptureQueriesContext(connection) as partner_context:
+            partner_orders = self.client.get(self.partner_orders_url).json()['results']
+
+        total = self.product_infos[0].price + self.product_infos[1].price * 2
+        assert orders[0]['total_sum'] == total
+        assert partner_orders[0]['total_sum'] == total
+        assert not any('SUM(' in query['sql'] or 'DISTINCT' in query['sql'] for query in context.captured_queries)
+        assert not any('DISTINCT' in query['sql'] for query in partner_context.captured_queries)
+
+    def test_basket_batch_operations(self):
+        """
+        Проверка пакетного изменения корзины: создание, обновление и удаление позиций
+        с результатом по каждой строке пакета.
+        """
+
+        first, second, third = self.product_infos[:3]
+        self.add_to_basket((first, 1), (second, 1))
+
+        response = self.client.post(self.basket_batch_url, {'operations': [
+            {'op': 'upsert', 'product_info': first.id, 'quantity': 4},
+            {'op': 'delete', 'product_info': second.id},
+            {'op': 'upsert', 'product_info': third.id, 'quantity': 2},
+            {'op': 'upsert', 'product_info': 100500, 'quantity': 1},
+            {'op': 'upsert', 'product_info': third.id, 'quantity': 3},
+            {'op': 'move', 'product_info': first.id},
+        ]}, format='json').json()
+
+        assert response['Status'] is True
+        assert [result['status'] for result in response['Results']] == [
+            'updated', 'deleted', 'created', 'not_found', 'error', 'error']
+        items = dict(OrderItem.objects.filter(order=self.basket()).values_list('product_info_id', 'quantity'))
+        assert items == {first.id: 4, third.id: 2}
+        assert response['Results'][2]['id'] == OrderItem.objects.get(product_info=third).id
+        assert self.basket().total_sum == first.price * 4 + third.price * 2
+
+    def test_basket_batch_concurrent_insert(self):
+        """
+        Проверка того, что позиция, добавленная в корзину параллельным запросом между чтением корзины
+        и вставкой, приводит к ответу 409, а пакет не применяется частично.
+        """
+
+        first, second = self.product_infos[:2]
+        self.add_to_basket((first, 1))
+        bulk_create = OrderItem.objects.bulk_create
+
+        def concurrent_bulk_create(items, *args, **kwargs):
+            OrderItem.objects.create(order_id=items[0].order_id, product_info=second, quantity=1, price=second.price)
+            return bulk_create(items, *args, **kwargs)
+
+        with patch.object(OrderItem.objects, 'bulk_create', side_effect=concurrent_bulk_create):
+            response = self.client.post(self.basket_batch_url, {'operations': [
+                {'op': 'upsert', 'product_info': first.id, 'quantity': 5},
+                {'op': 'upsert', 'product_info': second.id, 'quantity': 2},
+            ]}, format='json')
+
+        assert response.status_code == 409 and response.json()['Status'] is False
+        items = dict(OrderItem.objects.filter(order=self.basket()).values_list('product_info_id', 'quantity'))
+        assert items == {first.id: 1}
+
+    def test_basket_batch_query_count(self):
+        """
+        Проверка того, что количество запросов пакетного изменения корзины не зависит от количества строк.
+        """
+
+        other = User.objects.create(email='other@gmail.com', type='shop', is_active=True)
+        PriceListImporter(other.id).run(make_price_list(100, shop_name='OtherShop'))
+        product_info_ids = list(ProductInfo.objects.filter(shop__user_id=other.id).values_list('id', flat=True))
+
+        def count_queries(ids):
+            operations = [{'op': 'upsert', 'product_info': product_info_id, 'quantity': 1} for product_info_id in ids]
+            operations[0]['quantity'] = 2
+            self.client.post(self.basket_batch_url, {'operations': operations[1:]}, format='json')
+            operations[-1] = {'op': 'delete', 'product_info': ids[-1]}
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.post(self.basket_batch_url, {'operations': operations}, format='json')
+            assert response.json()['Status'] is True
+            OrderItem.objects.all().delete()
+            return len(context.captured_queries)
+
+        assert count_queries(product_info_ids[:5]) == count_queries(product_info_ids[:50])
+
+    def test_partner_orders_projection(self):
+        """
+        Проверка того, что поставщик получает только свои позиции заказа и сумму по ним,
+        а список фильтруется по статусу и дате.
+        """
+
+        other = User.objects.create(email='other@gmail.com', type='shop', is_active=True)
+        PriceListImporter(other.id).run(make_price_list(2, shop_name='OtherShop'))
+        foreign = ProductInfo.objects.filter(shop__user_id=other.id).first()
+        own = self.product_infos[0]
+
+        self.add_to_basket((own, 2), (foreign, 1))
+        self.client.post(self.order_url, {'id': str(self.basket().id), 'contact': str(self.contact.id)})
+        self.login(self.shop_user)
+
+        orders = self.client.get(self.partner_orders_url).json()['results']
+        assert len(orders) == 1
+        assert [item['product_info']['id'] for item in orders[0]['ordered_items']] == [own.id]
+        assert orders[0]['total_sum'] == own.price * 2
+
+        today = timezone.now().date()
+        assert len(self.client.get(self.partner_orders_url, {'state': 'new,confirmed'}).json()['results']) == 1
+        assert self.client.get(self.partner_orders_url, {'state': 'delivered'}).json()['results'] == []
+        assert len(self.client.get(self.partner_orders_url, {'date_from': str(today),
+                                                             'date_to': str(today)}).json()['results']) == 1
+        assert self.client.get(self.partner_orders_url,
+                               {'date_from': str(today + timedelta(days=1))}).json()['results'] == []
+        assert self.client.get(self.partner_orders_url, {'date_to': 'вчера'}).status_code == 400
+
+    def test_order_reads_match_serializers(self):
+        """
+        Проверка того, что списки заказов, корзина и заказы поставщика, собранные из values(),
+        совпадают с ответами OrderSerializer и PartnerOrderSerializer.
+        """
+
+        other = User.objects.create(email='other@gmail.com', type='shop', is_active=True)
+        PriceListImporter(other.id).run(make_price_list(2, shop_name='OtherShop'))
+        foreign = ProductInfo.objects.filter(shop__user_id=other.id).first()
+        self.add_to_basket((self.product_infos[0], 2), (foreign, 1))
+        self.client.post(self.order_url, {'id': str(self.basket().id), 'contact': str(self.contact.id)})
+        self.add_to_basket((self.product_infos[1], 3))
+        Order.objects.create(user=self.user, state='new')
+
+        def render(data):
+            return load_json(JSONRenderer().render(data))
+
+        orders = Order.objects.filter(user_id=self.user.id).order_by('-id')
+        assert self.client.get(self.order_url).json()['results'] == render(
+            OrderSerializer(orders.exclude(state='basket'), many=True).data)
+        assert self.client.get(self.basket_url).json() == render(
+            OrderSerializer(orders.filter(state='basket'), many=True).data)
+
+        self.login(self.shop_user)
+        partner_orders = attach_subtotals(list(with_supplier_items(
+            orders.filter(ordered_items__product_info__shop__user_id=self.shop_user.id).exclude(state='basket'),
+            self.shop_user.id)), self.shop_user.id)
+        assert self.client.get(self.partner_orders_url).json()['results'] == render(
+            PartnerOrderSerializer(partner_orders, many=True).data)
+
+    def test_partner_orders_query_count(self):
+        """
+        Проверка того, что количество запросов списка заказов поставщика не зависит от количества заказов.
+        """
+
+        self.login(self.shop_user)
+        self.client.get(self.partner_orders_url)
+
+        def count_queries(orders_count):
+            for _ in range(orders_count):
+                order = Order.objects.create(user=self.user, state='new', contact=self.contact)
+                OrderItem.objects.bulk_create([OrderItem(order=order, product_info=product_info, quantity=1,
+                                                         price=product_info.price)
+                                               for product_info in self.product_infos])
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(self.partner_orders_url, {'page_size': 20})
+            return len(context.captured_queries)
+
+        assert count_queries(1) == count_queries(10)
+
+    def place_order(self, *items):
+        self.login(self.user)
+        self.add_to_basket(*items)
+        basket = self.basket()
+        self.client.post(self.order_url, {'id': str(basket.id), 'contact': str(self.contact.id)})
+        self.login(self.shop_user)
+        return basket.id
+
+    @override_settings(ORDER_FEED_GRACE=0)
+    def test_partner_order_changes_feed(self):
+        """
+        Проверка ленты изменений заказов: повторный запрос с курсором возвращает только
+        созданные или измененные после него заказы.
+        """
+
+        first = self.place_order((self.product_infos[0], 1))
+        response = self.client.get(self.order_changes_url).json()
+        assert [order['id'] for order in response['Results']] == [first]
+        cursor = response['Cursor']
+
+        assert self.client.get(self.order_changes_url, {'since': cursor}).json()['Results'] == []
+
+        second = self.place_order((self.product_infos[1], 1))
+        Order.objects.filter(id=first).update(state='confirmed', updated_at=timezone.now())
+        response = self.client.get(self.order_changes_url, {'since': cursor, 'limit': 1}).json()
+        assert [order['id'] for order in response['Results']] == [second]
+        assert response['HasMore'] is True
+
+        response = self.client.get(self.order_changes_url, {'since': response['Cursor']}).json()
+        assert [(order['id'], order['state']) for order in response['Results']] == [(first, 'confirmed')]
+        assert self.client.get(self.order_changes_url, {'since': 'abc'}).status_code == 400
+
+    @override_settings(ORDER_FEED_GRACE=60)
+    def test_partner_order_changes_grace(self):
+        """
+        Проверка того, что лента не возвращает заказы, измененные менее ORDER_FEED_GRACE секунд назад,
+        и курсор не проходит их время изменения: заказ, транзакция которого зафиксирована позже
+        изменения следующего заказа, не пропускается.
+        """
+
+        now = timezone.now()
+        first = self.place_order((self.product_infos[0], 1))
+        second = self.place_order((self.product_infos[1], 1))
+        Order.objects.filter(id=first).update(updated_at=now - timedelta(seconds=120))
+        Order.objects.filter(id=second).update(updated_at=now - timedelta(seconds=30))
+
+        response = self.client.get(self.order_changes_url).json()
+        assert [order['id'] for order in response['Results']] == [first]
+        cursor = response['Cursor']
+
+        late = self.place_order((self.product_infos[2], 1))
+        Order.objects.filter(id=late).update(updated_at=now - timedelta(seconds=40))
+        with patch('ordermanager.partner.timezone.now', return_value=now + timedelta(seconds=61)):
+            response = self.client.get(self.order_changes_url, {'since': cursor}).json()
+        assert [order['id'] for order in response['Results']] == [late, second]
+
+    @override_settings(ORDER_FEED_GRACE=0)
+    def test_partner_order_changes_wait_is_not_blocking(self):
+        """
+        Проверка того, что синхронное представление не ожидает изменений по параметру wait
+        (ожидание выполняет асинхронный обработчик при запуске через ASGI), но проверяет его значение.
+        """
+
+        self.place_order((self.product_infos[0], 1))
+        cursor = self.client.get(self.order_changes_url).json()['Cursor']
+
+        started = time.monotonic()
+        response = self.client.get(self.order_changes_url, {'since': cursor, 'wait': 10}).json()
+        assert time.monotonic() - started < 1
+        assert (response['Results'], response['Cursor']) == ([], cursor)
+        assert self.client.get(self.order_changes_url, {'wait': 'abc'}).status_code == 400
+
+    def test_admin_order_items_are_read_only(self):
+        """
+        Проверка того, что позиции заказа в админке нельзя изменить, добавить или удалить.
+        """
+
+        order = Order.objects.get(id=self.place_order((self.product_infos[0], 2)))
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser(email='admin@gmail.com', password='Password123')
+        inline = OrderItemInline(Order, admin.site)
+
+        assert not inline.has_add_permission(request, order)
+        assert not inline.can_delete
+        formset = inline.get_formset(request, order)
+        assert not {'product_info', 'quantity', 'price'} & set(formset.form.base_fields)
+
+    def test_checkout_reserves_stock(self):
+        """
+        Проверка того, что оформление заказа списывает остатки, при нехватке товара заказ не оформляется,
+        а отмена заказа возвращает товары на склад ровно один раз.
+        """
+
+        first, second = self.product_infos[:2]
+        self.add_to_basket((first, 4), (second, 11))
+        basket = self.basket()
+
+        response = self.client.post(self.order_url, {'id': str(basket.id), 'contact': str(self.contact.id)})
+        assert response.status_code == 409
+        assert response.json()['ProductInfo'] == [second.id]
+        assert Order.objects.get(id=basket.id).state == 'basket'
+        assert ProductInfo.objects.get(id=first.id).quantity == first.quantity
+
+        OrderItem.objects.filter(order=basket, product_info=second).update(quantity=10)
+        response = self.client.post(self.order_url, {'id': str(basket.id), 'contact': str(self.contact.id)})
+        assert response.json()['Status'] is True
+        assert ProductInfo.objects.get(id=first.id).quantity == first.quantity - 4
+        assert ProductInfo.objects.get(id=second.id).quantity == 0
+        assert ProductIndex.objects.get(product_info_id=second.id).quantity == 0
+
+        assert self.client.delete(self.order_url, {'id': basket.id}).json()['Status'] is True
+        assert self.client.delete(self.order_url, {'id': basket.id}).json()['Status'] is False
+        assert ProductInfo.objects.get(id=first.id).quantity == first.quantity
+        assert ProductInfo.objects.get(id=second.id).quantity == second.quantity
+
+    def test_partner_bulk_state_transition(self):
+        """
+        Проверка массовой смены статуса заказов поставщиком: допустимые переходы выполняются,
+        для остальных заказов возвращается причина, покупатели уведомляются одной задачей.
+        """
+
+        first, second = self.place_order((self.product_infos[0], 1)), self.place_order((self.product_infos[1], 1))
+        Order.objects.filter(id=second).update(state='delivered')
+        foreign = Order.objects.create(user=self.user, state='new')
+        relay_events()
+        OutgoingEmail.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.order_state_url, {'orders': f'{first},{second},{foreign.id}',
+                                                               'state': 'confirmed'}).json()
+        assert response['Status'] is True
+        assert response['Updated'] == [first]
+        assert set(response['Errors']) == {str(second), str(foreign.id)}
+        assert Order.objects.get(id=first).state == 'confirmed'
+        assert Order.objects.get(id=foreign.id).state == 'new'
+        assert list(OutgoingEmail.objects.values_list('email', 'message')) == [
+            (self.user.email, f'Статус заказа №{first} изменен: Подтвержден.')]
+
+        response = self.client.post(self.order_state_url, {'orders': str(first), 'state': 'unknown'})
+        assert response.status_code == 400
+
+        self.login(self.user)
+        response = self.client.post(self.order_state_url, {'orders': str(first), 'state': 'sent'})
+        assert response.status_code == 403
+
+    def test_partner_cannot_change_basket_or_shared_orders(self):
+        """
+        Проверка того, что поставщик не может перевести корзину покупателя в статус 'new'
+        и не может отменить заказ с товарами другого поставщика (и вернуть на склад чужой резерв).
+        """
+
+        other = User.objects.create(email='other@gmail.com', type='shop', is_active=True)
+        PriceListImporter(other.id).run(make_price_list(2, shop_name='OtherShop'))
+        foreign = ProductInfo.objects.filter(shop__user_id=other.id).first()
+        own = self.product_infos[0]
+
+        shared = self.place_order((own, 1), (foreign, 1))
+        self.login(self.user)
+        self.add_to_basket((own, 1))
+        basket = self.basket()
+        self.login(self.shop_user)
+
+        response = self.client.post(self.order_state_url, {'orders': str(basket.id), 'state': 'new'}).json()
+        assert response['Updated'] == []
+        assert Order.objects.get(id=basket.id).state == 'basket'
+
+        response = self.client.post(self.order_state_url, {'orders': str(shared), 'state': 'canceled'}).json()
+        assert response['Updated'] == []
+        assert Order.objects.get(id=shared).state == 'new'
+        assert ProductInfo.objects.get(id=foreign.id).quantity == foreign.quantity - 1
+        assert ProductInfo.objects.get(id=own.id).quantity == own.quantity - 1
+
+    def test_bulk_transition_query_count(self):
+        """
+        Проверка того, что число запросов при массовой смене статуса не зависит от количества заказов,
+        а отмена возвращает на склад товары всех заказов.
+        """
+
+        product_info = self.product_infos[0]
+
+        def make_orders(count):
+            Order.objects.bulk_create([Order(user=self.user, state='new') for _ in range(count)])
+            orders = list(Order.objects.filter(user=self.user, state='new').order_by('-id')[:count])
+            OrderItem.objects.bulk_create([OrderItem(order=order, product_info=product_info, quantity=1,
+                                                     price=product_info.price) for order in orders])
+            return [order.id for order in orders]
+
+        query_counts = []
+        for count in (2, 20):
+            order_ids = make_orders(count)
+            with CaptureQueriesContext(connection) as queries:
+                result = transition_orders(order_ids, 'canceled')
+            assert sorted(result['updated']) == sorted(order_ids)
+            query_counts.append(len(queries))
+            Order.objects.filter(id__in=order_ids).delete()
+
+        assert query_counts[0] == query_counts[1]
+        assert ProductInfo.objects.get(id=product_info.id).quantity == product_info.quantity + 22
+
+
+
+class OrderQueryCountTests(QueryCountMixin, APITestCase):
+    """
+    Класс для проверки того, что количество запросов к эндпоинтам ordermanager
+    не зависит от количества заказов и позиций корзины.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch('usermanager.outbox.drain_email_outbox')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('eventmanager.outbox.schedule_relay', relay_events)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.shop_user = User.objects.create(email='shop@gmail.com', type='shop', is_active=True)
+        PriceListImporter(self.shop_user.id).run(make_price_list(max(self.sizes) + 2))
+        self.product_infos = list(ProductInfo.objects.order_by('id'))
+
+        self.user = User.objects.create(email='buyer@gmail.com', type='buyer', is_active=True)
+        self.contact = Contact.objects.create(user=self.user, city='Москва', street='Ленина', phone='123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.partner = APIClient()
+        self.partner.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.shop_user).key}')
+        self.client.get(reverse('ordermanager:basket'))
+        self.partner.get(reverse('ordermanager:partner-orders'))
+
+    def grow(self, size):
+        Order.objects.bulk_create([Order(user=self.user, state='new', contact=self.contact) for _ in range(size)])
+        basket = Order.objects.create(user=self.user, state='basket')
+        for order in Order.objects.filter(user=self.user, total_sum=0).exclude(id=basket.id):
+            OrderItem.objects.bulk_create([OrderItem(order=order, product_info=product_info, quantity=1,
+                                                     price=product_info.price)
+                                           for product_info in self.product_infos[:3]])
+        OrderItem.objects.bulk_create([OrderItem(order=basket, product_info=product_info, quantity=1,
+                                                 price=product_info.price)
+                                       for product_info in self.product_infos[:size]])
+        Order.objects.filter(user=self.user).update_totals()
+
+    def requests(self, size):
+        basket = Order.objects.get(user=self.user, state='basket')
+        items = list(basket.ordered_items.order_by('id').values_list('id', flat=True))
+        order = Order.objects.filter(user=self.user, state='new').first()
+        added, batched = self.product_infos[-2:]
+        return {
+            'basket': lambda: self.client.get(reverse('ordermanager:basket')),
+            'orders': lambda: self.client.get(reverse('ordermanager:order'), {'page_size': 100}),
+            'basket add': lambda: self.client.post(reverse('ordermanager:basket'), {
+                'items': dump_json([{'product_info': added.id, 'quantity': 1}])}),
+            'basket update': lambda: self.client.put(reverse('ordermanager:basket'), {
+                'items': dump_json([{'id': items[0], 'quantity': 2}])}),
+            'basket delete': lambda: self.client.delete(reverse('ordermanager:basket'), {'items': str(items[1])}),
+            'basket batch': lambda: self.client.post(reverse('ordermanager:basket-batch'), {'operations': [
+                {'op': 'upsert', 'product_info': batched.id, 'quantity': 1}]}, format='json'),
+            'checkout': lambda: self.client.post(reverse('ordermanager:order'), {
+                'id': str(basket.id), 'contact': str(self.contact.id)}),
+            'order cancel': lambda: self.client.delete(reverse('ordermanager:order'), {'id': basket.id}),
+            'partner orders': lambda: self.partner.get(reverse('ordermanager:partner-orders'), {'page_size': 100}),
+            'partner order changes': lambda: self.partner.get(reverse('ordermanager:partner-order-changes')),
+            'partner order state': lambda: self.partner.post(reverse('ordermanager:partner-order-state'), {
+                'orders': str(order.id), 'state': 'confirmed'}),
+        }
+
+class FileDatabaseMixin:
+    """
+    Примесь для тестов, обращающихся к БД из нескольких потоков.
+
+    Тестовая БД SQLite по умолчанию находится в памяти и не поддерживает конкурентную запись
+    из нескольких соединений, поэтому на время тестов класса соединение переключается на файл.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.file_backed = connection.vendor == 'sqlite' and connection.is_in_memory_db()
+        if cls.file_backed:
+            cls.directory = tempfile.TemporaryDirectory()
+            cls.memory_name, cls.memory_connection = connection.settings_dict['NAME'], connection.connection
+            connection.connection = None
+            connection.settings_dict['NAME'] = os.path.join(cls.directory.name, 'test.sqlite3')
+            call_command('migrate', run_syncdb=True, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.file_backed:
+            connection.close()
+            connection.settings_dict['NAME'], connection.connection = cls.memory_name, cls.memory_connection
+            cls.directory.cleanup()
+        super().tearDownClass()
+
+
+@override_settings(ORDER_FEED_GRACE=0)
+class OrderChangesStreamTests(FileDatabaseMixin, TransactionTestCase):
+    """
+    Класс для тестирования асинхронной доставки изменений заказов поставщику (Server-Sent Events и long-poll).
+    Запросы к БД выполняются в пуле потоков, поэтому данные тестов должны быть зафиксированы.
+    """
+
+    def setUp(self):
+        patcher = patch('eventmanager.outbox.schedule_relay')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.shop_user = User.objects.create(email='shop@gmail.com', type='shop', is_active=True)
+        self.token = Token.objects.create(user=self.shop_user).key
+        PriceListImporter(self.shop_user.id).run(make_price_list(2))
+        self.product_info = ProductInfo.objects.order_by('id').first()
+        self.user = User.objects.create(email='buyer@gmail.com', type='buyer', is_active=True)
+        self.order_id = self.place_order()
+        return super().setUp()
+
+    def place_order(self):
+        order = Order.objects.create(user=self.user, state='new')
+        OrderItem.objects.create(order=order, product_info=self.product_info, quantity=1,
+                                 price=self.product_info.price)
+        return order.id
+
+    def long_poll(self, **params):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        async def request():
+            scope = {'type': 'http', 'method': 'GET', 'path': CHANGES_PATH, 'query_string': urlencode(params).encode(),
+                     'headers': [(b'authorization', f'Token {self.token}'.encode())]}
+            await application(scope, receive, send)
+            return messages[0]['status'], load_json(messages[1]['body'])
+
+        return request()
+
+    def test_partner_order_changes_stream(self):
+        """
+        Проверка доставки изменений заказов через Server-Sent Events в ASGI-приложении.
+        """
+
+        messages = []
+        received = asyncio.Event()
+
+        async def receive():
+            await received.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if b'event: orders' in message.get('body', b''):
+                received.set()
+
+        scope = {'type': 'http', 'path': STREAM_PATH, 'headers': [], 'query_string': f'token={self.token}'.encode()}
+        async_to_sync(application)(scope, receive, send)
+
+        assert messages[0]['status'] == 200
+        event = messages[1]['body'].decode()
+        assert event.startswith('id: ') and 'event: orders' in event
+        assert load_json(event.split('data: ', 1)[1])[0]['id'] == self.order_id
+
+        scope['query_string'] = b'token=wrong'
+        async_to_sync(application)(scope, receive, send)
+        assert messages[-2]['status'] == 403
+
+    @override_settings(ORDER_FEED_POLL_INTERVAL=0.02)
+    def test_partner_order_changes_long_poll(self):
+        """
+        Проверка long-poll запросов в ASGI-приложении: параллельные ожидания не выполняются друг за другом,
+        а изменение, сделанное во время ожидания, возвращается до истечения wait.
+        """
+
+        _, cursor, _ = order_changes(self.shop_user.id)
+
+        async def poll_twice():
+            return await asyncio.gather(self.long_poll(since=cursor, wait=0.3), self.long_poll(since=cursor, wait=0.3))
+
+        started = time.monotonic()
+        responses = async_to_sync(poll_twice)()
+        assert time.monotonic() - started < 0.55
+        assert [(status, data['Results'], data['Cursor']) for status, data in responses] == [(200, [], cursor)] * 2
+
+        async def poll_with_change():
+            poll = asyncio.ensure_future(self.long_poll(since=cursor, wait=5))
+            await asyncio.sleep(0.1)
+            order_id = await sync_to_async(self.place_order, thread_sensitive=False)()
+            return order_id, await poll
+
+        started = time.monotonic()
+        order_id, (status, data) = async_to_sync(poll_with_change)()
+        assert time.monotonic() - started < 2
+        assert [order['id'] for order in data['Results']] == [order_id]
+
+        status, data = async_to_sync(self.long_poll)(since='abc', wait=1)
+        assert status == 400 and data['Status'] is False
+
+
+class InventoryConcurrencyTests(FileDatabaseMixin, TransactionTestCase):
+    """
+    Класс для нагрузочной проверки резервирования товаров при параллельном оформлении заказов.
+    """
+
+    buyers = 24
+    stock = 50
+    quantity = 3
+
+    def test_concurrent_checkout_never_oversells(self):
+        """
+        Проверка того, что при одновременном оформлении заказов разными покупателями
+        остаток товара не становится отрицательным и списывается ровно по оформленным заказам.
+        """
+
+        for target in ('usermanager.outbox.drain_email_outbox', 'eventmanager.outbox.relay_events'):
+            patcher = patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        shop_user = User.objects.create(email='shop@gmail.com', type='shop', is_active=True)
+        data = make_price_list(1)
+        data['goods'][0]['quantity'] = self.stock
+        PriceListImporter(shop_user.id).run(data)
+        product_info = ProductInfo.objects.get()
+
+        checkouts = []
+        for number in range(self.buyers):
+            user = User.objects.create(email=f'buyer{number}@gmail.com', type='buyer', is_active=True)
+            contact = Contact.objects.create(user=user, city='Москва', street='Ленина', phone='123')
+            basket = Order.objects.create(user=user, state='basket')
+            OrderItem.objects.create(order=basket, product_info=product_info, quantity=self.quantity,
+                                     price=product_info.price)
+            checkouts.append((Token.objects.create(user=user).key, basket.id, contact.id))
+
+        barrier = threading.Barrier(self.buyers)
+        statuses = []
+
+        def checkout(token, order_id, contact_id):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+            try:
+                barrier.wait()
+                response = client.post(reverse('ordermanager:order'), {'id': str(order_id),
+                                                                       'contact': str(contact_id)})
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=arguments) for arguments in checkouts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        placed = Order.objects.filter(state='new').count()
+        assert sorted(set(statuses)) == [200, 409]
+        assert placed == self.stock // self.quantity
+        assert ProductInfo.objects.get().quantity == self.stock - placed * self.quantity
+        assert ProductIndex.objects.get().quantity == ProductInfo.objects.get().quantity
@@ -1,12 +1,15 @@
 from django.urls import path
 
-from ordermanager.views import OrderView, PartnerOrders, BasketView
+from ordermanager.views import OrderView, PartnerOrders, PartnerOrderChanges, PartnerOrderState, BasketView, BasketBatchView
 
 
 app_name = 'ordermanager'
 
 urlpatterns = [
     path('partner/orders', PartnerOrders.as_view(), name='partner-orders'),
+    path('partner/orders/state', PartnerOrderState.as_view(), name='partner-order-state'),
+    path('partner/orders/changes', PartnerOrderChanges.as_view(), name='partner-order-changes'),
     path('order', OrderView.as_view(), name='order'),
     path('basket', BasketView.as_view(), name='basket'),
+    path('basket/batch', BasketBatchView.as_view(), name='basket-batch'),
 ]
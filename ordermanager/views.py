@@ -1,14 +1,43 @@
+from datetime import datetime, time
+
+from django.conf import settings
 from django.db import IntegrityError
-from django.db.models import Q, Sum, F
+from django.db.models import Q, Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.http import JsonResponse
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from ujson import loads as load_json
 
+from api_diplom_final.pagination import OrderCursorPagination
+from ordermanager.basket import apply_basket_operations
+from ordermanager.inventory import InsufficientStock
 from ordermanager.models import Order, OrderItem
-from ordermanager.serializers import OrderSerializer, OrderItemSerializer
-from usermanager.models import User
-from api_diplom_final.celery import send_email
+from ordermanager.partner import supplier_items, supplier_subtotals, order_changes
+from ordermanager.readers import ORDER_FIELDS, order_rows
+from ordermanager.serializers import OrderItemSerializer
+from ordermanager.states import transition_orders, checkout_order, TransitionError
+
+
+def parse_moment(value, end=False):
+    """
+    Функция разбирает дату или дату-время в формате ISO 8601 и возвращает дату-время с часовым поясом.
+    Дата без времени означает начало дня, а при end=True - конец дня. При ошибке возвращает None.
+    """
+
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            moment = datetime.combine(day, time.max if end else time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
 
 
 class OrderView(APIView):
@@ -19,24 +48,23 @@ class OrderView(APIView):
     def get(self, request, *args, **kwargs):
         """"
         Метод проверяет авторизацию,
-        после чего выдает информацию о заказе.
+        после чего выдает информацию о заказах постранично (параметры cursor и page_size).
         """
 
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
-        order = Order.objects.filter(
-            user_id=request.user.id).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
+        order = Order.objects.filter(user_id=request.user.id).exclude(state='basket').values(*ORDER_FIELDS)
 
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(order, request, view=self)
+        return paginator.get_paginated_response(order_rows(page))
 
     def post(self, request, *args, **kwargs):
         """"
         Метод проверяет авторизацию,
         после чего размещает информацию о заказе.
+        При оформлении товары корзины резервируются на складе; если какого-либо товара
+        не хватает, заказ не оформляется и возвращается список недостающих товаров.
         """
 
         if not request.user.is_authenticated:
@@ -47,28 +75,49 @@ class OrderView(APIView):
         if {'id', 'contact'}.issubset(request.data):
             if request.data['id'].isdigit():
                 try:
-                    is_updated = Order.objects.filter(
-                        user_id=request.user.id, id=request.data['id']).update(
-                        contact_id=request.data['contact'],
-                        state='new')
+                    is_updated = checkout_order(int(request.data['id']), request.user.id, request.data['contact'])
                 except IntegrityError as error:
                     print(error)
                     return JsonResponse({'Status': False,
                                          'Errors': 'Неправильно указаны аргументы'})
+                except InsufficientStock as error:
+                    return JsonResponse({'Status': False,
+                                         'Errors': str(error),
+                                         'ProductInfo': error.product_info_ids}, status=409)
                 else:
                     if is_updated:
-                        # Отправка письма при изменении статуса заказа.
-                        user = User.objects.get(id=request.user.id)
-                        title = 'Уведомление о смене статуса заказа'
-                        message = 'Заказ сформирован.'
-                        email = user.email
-                        send_email.apply_async((title, message, email), countdown=5 * 60)
-
                         return JsonResponse({'Status': True})
 
         return JsonResponse({'Status': False,
                              'Errors': 'Не указаны все необходимые аргументы'})
 
+    def delete(self, request, *args, **kwargs):
+        """
+        Метод проверяет авторизацию, после чего отменяет заказ пользователя
+        и возвращает зарезервированные товары на склад.
+        """
+
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False,
+                                 'Error': 'Log in required'},
+                                status=403)
+
+        order_id = request.data.get('id')
+        if order_id and str(order_id).isdigit():
+            try:
+                result = transition_orders([int(order_id)], 'canceled',
+                                           orders=Order.objects.filter(user_id=request.user.id))
+            except TransitionError as error:
+                return JsonResponse({'Status': False,
+                                     'Errors': str(error)}, status=409)
+            if result['updated']:
+                return JsonResponse({'Status': True})
+            return JsonResponse({'Status': False,
+                                 'Errors': 'Заказ не найден или не может быть отменен'})
+
+        return JsonResponse({'Status': False,
+                             'Errors': 'Не указаны все необходимые аргументы'})
+
 
 class PartnerOrders(APIView):
     """ Класс для получения заказов поставщиками. """
@@ -78,7 +127,10 @@ class PartnerOrders(APIView):
     def get(self, request, *args, **kwargs):
         """
         Метод проверяет авторизацию и тип пользователя (для работы требуется тип 'shop'),
-        после чего получает информацию о заказе.
+        после чего получает информацию о заказах постранично (параметры cursor и page_size).
+        Заказы содержат только позиции поставщика, а total_sum - сумму по этим позициям.
+        Параметры: state (один или несколько статусов через запятую),
+        date_from и date_to (даты или дата-время в формате ISO 8601, date_to включительно для дат).
         """
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False,
@@ -91,13 +143,111 @@ class PartnerOrders(APIView):
                                 status=403)
 
         order = Order.objects.filter(
-            ordered_items__product_info__shop__user_id=request.user.id).exclude(state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').select_related('contact').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
+            id__in=supplier_items(request.user.id).values('order_id')).exclude(state='basket')
+
+        states = request.query_params.get('state')
+        if states:
+            order = order.filter(state__in=states.split(','))
+        for param, lookup in (('date_from', 'dt__gte'), ('date_to', 'dt__lte')):
+            value = request.query_params.get(param)
+            if value:
+                moment = parse_moment(value, end=param == 'date_to')
+                if moment is None:
+                    return JsonResponse({'Status': False,
+                                         'Errors': f'Некорректная дата в параметре {param}'}, status=400)
+                order = order.filter(**{lookup: moment})
+
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(order.values(*ORDER_FIELDS), request, view=self)
+        return paginator.get_paginated_response(order_rows(
+            page, items=supplier_items(request.user.id),
+            totals=supplier_subtotals([row['id'] for row in page], request.user.id)))
+
+
+class PartnerOrderState(APIView):
+    """ Класс для массового изменения статуса заказов поставщиками. """
+
+    throttle_scope = 'user'
+
+    def post(self, request, *args, **kwargs):
+        """
+        Метод проверяет авторизацию и тип пользователя (для работы требуется тип 'shop'),
+        после чего переводит заказы orders (список или идентификаторы через запятую) в статус state.
+        Изменять можно только заказы, все позиции которых относятся к поставщику: статус заказа
+        с товарами нескольких поставщиков (и возврат их резерва при отмене) поставщик изменить не может.
+        Возвращает идентификаторы измененных заказов и причины отказа для остальных.
+        """
+
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False,
+                                 'Error': 'Log in required'},
+                                status=403)
+
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False,
+                                 'Error': 'Только для магазинов'},
+                                status=403)
+
+        order_ids, state = request.data.get('orders'), request.data.get('state')
+        if not order_ids or not state:
+            return JsonResponse({'Status': False,
+                                 'Errors': 'Не указаны все необходимые аргументы'})
+
+        if isinstance(order_ids, str):
+            order_ids = order_ids.split(',')
+        if not all(str(order_id).strip().isdigit() for order_id in order_ids):
+            return JsonResponse({'Status': False,
+                                 'Errors': 'Некорректные идентификаторы заказов'}, status=400)
+
+        foreign_items = OrderItem.objects.exclude(product_info__shop__user_id=request.user.id)
+        orders = Order.objects.filter(Exists(supplier_items(request.user.id).filter(order_id=OuterRef('id')))).exclude(
+            Exists(foreign_items.filter(order_id=OuterRef('id'))))
+        try:
+            result = transition_orders([int(order_id) for order_id in order_ids], state, orders=orders)
+        except TransitionError as error:
+            return JsonResponse({'Status': False,
+                                 'Errors': str(error)}, status=400)
+
+        return JsonResponse({'Status': True,
+                             'Updated': result['updated'],
+                             'Errors': result['errors']})
+
+
+class PartnerOrderChanges(APIView):
+    """ Класс для получения поставщиками ленты изменений заказов. """
+
+    throttle_scope = 'user'
+
+    def get(self, request, *args, **kwargs):
+        """
+        Метод проверяет авторизацию и тип пользователя (для работы требуется тип 'shop'),
+        после чего возвращает заказы, созданные или измененные после курсора since
+        (курсор возвращается в поле Cursor предыдущего ответа, без него лента читается с начала).
+        Параметр limit - не больше MAX_PAGE_SIZE. Запросы с параметром wait (long-poll: ожидание изменений
+        в секундах, не больше ORDER_FEED_MAX_WAIT) обслуживает асинхронный обработчик
+        ordermanager.streams.order_changes_long_poll при запуске через ASGI (api_diplom_final.asgi),
+        так как ожидание в синхронном представлении занимало бы поток. Под WSGI ответ возвращается сразу.
+        """
 
-        serializer = OrderSerializer(order, many=True)
-        return Response(serializer.data)
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False,
+                                 'Error': 'Log in required'},
+                                status=403)
+
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False,
+                                 'Error': 'Только для магазинов'},
+                                status=403)
+
+        try:
+            limit = max(min(int(request.query_params.get('limit', settings.MAX_PAGE_SIZE)), settings.MAX_PAGE_SIZE), 1)
+            float(request.query_params.get('wait', 0))  # ожидание выполняется только под ASGI
+            results, cursor, has_more = order_changes(request.user.id, request.query_params.get('since'), limit)
+        except ValueError:
+            return JsonResponse({'Status': False,
+                                 'Errors': 'Некорректные параметры since, limit или wait'}, status=400)
+
+        return Response({'Status': True, 'Results': results, 'Cursor': cursor, 'HasMore': has_more})
 
 
 class BasketView(APIView):
@@ -114,14 +264,8 @@ class BasketView(APIView):
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
 
-        basket = Order.objects.filter(
-            user_id=request.user.id, state='basket').prefetch_related(
-            'ordered_items__product_info__product__category',
-            'ordered_items__product_info__product_parameters__parameter').annotate(
-            total_sum=Sum(F('ordered_items__quantity') * F('ordered_items__product_info__price'))).distinct()
-
-        serializer = OrderSerializer(basket, many=True)
-        return Response(serializer.data)
+        basket = Order.objects.filter(user_id=request.user.id, state='basket').values(*ORDER_FIELDS)
+        return Response(order_rows(list(basket)))
 
     def post(self, request, *args, **kwargs):
         """
@@ -148,8 +292,9 @@ class BasketView(APIView):
                     serializer = OrderItemSerializer(data=order_item)
                     if serializer.is_valid():
                         try:
-                            serializer.save()
+                            serializer.save(price=serializer.validated_data['product_info'].price)
                         except IntegrityError as error:
+                            Order.objects.filter(id=basket.id).update_totals()
                             return JsonResponse({'Status': False,
                                                  'Errors': str(error)})
                         else:
@@ -160,6 +305,7 @@ class BasketView(APIView):
                         JsonResponse({'Status': False,
                                       'Errors': serializer.errors})
 
+                Order.objects.filter(id=basket.id).update_totals()
                 return JsonResponse({'Status': True,
                                      'Создано объектов': objects_created})
         return JsonResponse({'Status': False,
@@ -188,8 +334,9 @@ class BasketView(APIView):
                 for order_item in items_dict:
                     if type(order_item['id']) == int and type(order_item['quantity']) == int:
                         objects_updated += OrderItem.objects.filter(order_id=basket.id, id=order_item['id']).update(
-                            quantity=order_item['quantity'])
+                            quantity=order_item['quantity'], updated_at=timezone.now())
 
+                Order.objects.filter(id=basket.id).update_totals()
                 return JsonResponse({'Status': True,
                                      'Обновлено объектов': objects_updated})
         return JsonResponse({'Status': False,
@@ -218,7 +365,46 @@ class BasketView(APIView):
 
             if objects_deleted:
                 deleted_count = OrderItem.objects.filter(query).delete()[0]
+                Order.objects.filter(id=basket.id).update_totals()
                 return JsonResponse({'Status': True,
                                      'Удалено объектов': deleted_count})
         return JsonResponse({'Status': False,
                              'Errors': 'Не указаны все необходимые аргументы'})
+
+
+class BasketBatchView(APIView):
+    """ Класс для пакетного изменения корзины пользователя. """
+
+    throttle_scope = 'user'
+
+    def post(self, request, *args, **kwargs):
+        """
+        Метод проверяет авторизацию пользователя, после чего применяет к корзине пакет операций operations:
+        [{"op": "upsert", "product_info": id, "quantity": n}, {"op": "delete", "product_info": id}, ...].
+        Операции передаются списком в JSON-теле запроса или JSON-строкой в поле operations.
+        Возвращает результат по каждой строке пакета. Если корзина одновременно изменена другим запросом
+        (добавлен тот же товар), пакет не применяется и возвращается ответ 409: запрос можно повторить.
+        """
+
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False,
+                                 'Error': 'Log in required'}, status=403)
+
+        operations = request.data.get('operations')
+        if not operations:
+            return JsonResponse({'Status': False,
+                                 'Errors': 'Не указаны все необходимые аргументы'})
+
+        try:
+            if isinstance(operations, str):
+                operations = load_json(operations)
+            results = apply_basket_operations(request.user.id, operations)
+        except ValueError as error:
+            return JsonResponse({'Status': False,
+                                 'Errors': str(error)}, status=400)
+        except IntegrityError:
+            return JsonResponse({'Status': False,
+                                 'Errors': 'Корзина изменена параллельным запросом, повторите запрос'}, status=409)
+
+        return JsonResponse({'Status': True,
+                             'Results': results})
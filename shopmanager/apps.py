@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ShopmanagerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shopmanager'
+
+    def ready(self):
+        from shopmanager.search import setup_full_text_search
+
+        post_migrate.connect(setup_full_text_search, sender=self)
@@ -0,0 +1,128 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from api_diplom_final.counters import increment, read_counters
+from shopmanager.models import ProductIndex
+from shopmanager.utils import chunked
+
+# Ключи версий кэша. Версия списка категорий, списка магазинов и каталога целиком хранится
+# в отдельном ключе, для каталога дополнительно ведутся версии по магазинам и категориям.
+# Ответы кэшируются под ключом, в который входят версии всех областей, от которых они зависят,
+# поэтому при изменении данных достаточно увеличить версию затронутых областей.
+VERSION_KEY = 'catalog:version:{}'
+RESPONSE_KEY = 'catalog:response:{}'
+STATS_KEYS = {'hits': 'catalog:stats:hits', 'misses': 'catalog:stats:misses'}
+
+
+def scope(name, object_id=None):
+    """ Функция возвращает название области кэша, например 'shop:1' или 'categories'. """
+
+    return name if object_id is None else f'{name}:{object_id}'
+
+
+def get_versions(scopes):
+    """
+    Функция возвращает текущие версии областей кэша одним запросом к кэшу.
+    Отсутствующие версии (например, вытесненные из Redis) создаются заново со значением от текущего
+    времени, чтобы не совпасть с версией, под которой уже могли быть сохранены ответы.
+    """
+
+    keys = [VERSION_KEY.format(name) for name in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(scopes):
+    """ Функция увеличивает версии областей кэша, делая недействительными зависящие от них ответы. """
+
+    for name in scopes:
+        key = VERSION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def catalog_scopes(shop_ids=(), category_ids=(), shops=False, categories=False):
+    """
+    Функция возвращает области кэша перечисленных магазинов и категорий (и выдачи каталога без фильтров),
+    а при shops/categories - области списков магазинов и категорий.
+    """
+
+    scopes = [scope('shop', shop_id) for shop_id in shop_ids] + [
+        scope('category', category_id) for category_id in category_ids]
+    if scopes:
+        scopes.append(scope('catalog'))
+    if shops:
+        scopes.append(scope('shops'))
+    if categories:
+        scopes.append(scope('categories'))
+    return scopes
+
+
+def invalidate_catalog(shop_ids=(), category_ids=(), shops=False, categories=False):
+    """
+    Функция делает недействительными кэшированные ответы каталога (см. catalog_scopes).
+    Внутри транзакции версии обновляются после ее фиксации, чтобы параллельный запрос
+    не сохранил в кэш данные, прочитанные до фиксации, под новой версией.
+    """
+
+    scopes = catalog_scopes(shop_ids, category_ids, shops, categories)
+    if scopes:
+        transaction.on_commit(lambda: bump_versions(scopes))
+
+
+def shop_category_ids(shop_ids):
+    """ Функция возвращает множество категорий, в которых у магазинов есть товары в каталоге. """
+
+    return set(ProductIndex.objects.filter(shop_id__in=shop_ids).values_list('category_id', flat=True).distinct())
+
+
+def product_category_ids(product_info_ids, chunk_size=500):
+    """ Функция возвращает множество категорий перечисленных позиций каталога. """
+
+    category_ids = set()
+    for ids in chunked(sorted(product_info_ids), chunk_size):
+        category_ids.update(ProductIndex.objects.filter(product_info_id__in=ids).values_list(
+            'category_id', flat=True).distinct())
+    return category_ids
+
+
+def cache_stats():
+    """ Функция возвращает счетчики попаданий и промахов кэша ответов. """
+
+    return read_counters(STATS_KEYS)
+
+
+def cached_response(request, scopes, get_response):
+    """
+    Функция реализует кэширование ответов со сквозным чтением: возвращает ответ из кэша,
+    если он сохранен для текущих версий областей scopes, иначе вызывает get_response
+    и сохраняет успешный ответ. Ключ учитывает полный адрес запроса, включая параметры.
+    Результат отмечается заголовком X-Cache (HIT или MISS).
+    """
+
+    versions = get_versions(scopes)
+    digest = hashlib.md5(f'{request.build_absolute_uri()}|{scopes}|{versions}'.encode()).hexdigest()
+    key = RESPONSE_KEY.format(digest)
+
+    data = cache.get(key)
+    if data is not None:
+        increment(STATS_KEYS['hits'])
+        return Response(data, headers={'X-Cache': 'HIT'})
+
+    increment(STATS_KEYS['misses'])
+    response = get_response()
+    if response.status_code == 200:
+        cache.set(key, response.data, settings.CATALOG_CACHE_TIMEOUT)
+    response['X-Cache'] = 'MISS'
+    return response
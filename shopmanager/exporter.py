@@ -0,0 +1,115 @@
+import csv
+import io
+
+from ujson import dumps as dump_json
+from yaml import dump as dump_yaml
+
+try:
+    from yaml import CSafeDumper as Dumper
+except ImportError:
+    from yaml import SafeDumper as Dumper
+
+from shopmanager.feeds import CSV_FIELDS, CSV_PARAMETER_PREFIX
+from shopmanager.models import Category, ProductInfo, ProductParameter, Parameter
+
+EXPORT_CONTENT_TYPES = {
+    'yaml': 'application/x-yaml; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class PriceListExporter:
+    """
+    Класс для выгрузки прайс-листа магазина в форматах, которые принимает PartnerUpdate.
+
+    Позиции читаются из БД порциями по chunk_size через values_list с пагинацией по id,
+    параметры порции загружаются одним запросом. Экземпляры моделей и сериализаторы DRF
+    не создаются, а результат отдается генератором строк, поэтому память не зависит
+    от количества товаров в магазине.
+    """
+
+    chunk_size = 2000
+
+    def __init__(self, shop, chunk_size=None):
+        self.shop = shop
+        if chunk_size:
+            self.chunk_size = chunk_size
+        self.processed = 0
+
+    def categories(self):
+        return [{'id': category_id, 'name': name}
+                for category_id, name in Category.objects.filter(shops=self.shop).order_by('id').values_list(
+                'id', 'name')]
+
+    def iter_goods(self):
+        """ Генератор возвращает товары магазина порциями в формате раздела goods. """
+
+        last_id = 0
+        while True:
+            rows = list(ProductInfo.objects.filter(shop_id=self.shop.id, id__gt=last_id).order_by('id').values_list(
+                'id', 'external_id', 'product__category_id', 'model', 'product__name',
+                'price', 'price_rrc', 'quantity')[:self.chunk_size])
+            if not rows:
+                return
+            last_id = rows[-1][0]
+
+            parameters = {}
+            for product_info_id, name, value in ProductParameter.objects.filter(
+                    product_info_id__in=[row[0] for row in rows]).order_by('id').values_list(
+                    'product_info_id', 'parameter__name', 'value'):
+                parameters.setdefault(product_info_id, {})[name] = value
+
+            goods = [{'id': external_id,
+                      'category': category_id,
+                      'model': model,
+                      'name': name,
+                      'price': price,
+                      'price_rrc': price_rrc,
+                      'quantity': quantity,
+                      'parameters': parameters.get(pk, {})}
+                     for pk, external_id, category_id, model, name, price, price_rrc, quantity in rows]
+            self.processed += len(goods)
+            yield goods
+
+    def export(self, feed_format):
+        """ Метод возвращает генератор строк прайс-листа в формате feed_format. """
+
+        return getattr(self, f'export_{feed_format}')()
+
+    def export_yaml(self):
+        yield dump_yaml({'shop': self.shop.name, 'categories': self.categories()},
+                        Dumper=Dumper, allow_unicode=True, sort_keys=False)
+        yield 'goods:\n'
+        for goods in self.iter_goods():
+            yield dump_yaml(goods, Dumper=Dumper, allow_unicode=True, sort_keys=False)
+
+    def export_jsonl(self):
+        yield dump_json({'shop': self.shop.name, 'categories': self.categories()}, ensure_ascii=False) + '\n'
+        for goods in self.iter_goods():
+            yield ''.join(dump_json(item, ensure_ascii=False) + '\n' for item in goods)
+
+    def export_csv(self):
+        category_names = {category['id']: category['name'] for category in self.categories()}
+        parameter_names = list(Parameter.objects.filter(
+            product_parameters__product_info__shop_id=self.shop.id).order_by('name').values_list(
+            'name', flat=True).distinct())
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(list(CSV_FIELDS) + [CSV_PARAMETER_PREFIX + name for name in parameter_names])
+        yield self.flush(buffer)
+
+        for goods in self.iter_goods():
+            for item in goods:
+                writer.writerow([self.shop.name, item['id'], item['category'], category_names.get(item['category'], ''),
+                                 item['model'], item['name'], item['price'], item['price_rrc'], item['quantity']] +
+                                [item['parameters'].get(name, '') for name in parameter_names])
+            yield self.flush(buffer)
+
+    @staticmethod
+    def flush(buffer):
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
@@ -0,0 +1,217 @@
+import csv
+import io
+from itertools import chain
+
+from ujson import loads as load_json
+from yaml import parse as parse_yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.events import MappingStartEvent, MappingEndEvent, SequenceStartEvent, SequenceEndEvent, StreamEndEvent
+from yaml.resolver import Resolver
+
+try:
+    from yaml import CLoader as EventLoader
+except ImportError:
+    from yaml import SafeLoader as EventLoader
+
+# Колонки CSV-файла, не являющиеся параметрами товара.
+CSV_FIELDS = ('shop', 'id', 'category', 'category_name', 'model', 'name', 'price', 'price_rrc', 'quantity')
+CSV_PARAMETER_PREFIX = 'param:'
+
+
+class FeedError(ValueError):
+    """ Исключение для прайс-листов с некорректной структурой. """
+
+
+class InvalidRow:
+    """
+    Класс строки прайс-листа, которую не удалось разобрать. Читатели возвращают её вместо товара,
+    а при проверке товаров она отклоняется как ошибка одной строки, не прерывая импорт.
+    """
+
+    def __init__(self, line, error):
+        self.line = line
+        self.error = error
+
+
+class _EventComposer(Composer, SafeConstructor, Resolver):
+    """
+    Класс собирает объекты Python из потока событий YAML.
+    События формирует yaml.parse (на C-парсере libyaml, если он доступен),
+    поэтому документ не строится в памяти целиком: значения собираются по одному узлу.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.current_event = None
+        Composer.__init__(self)
+        SafeConstructor.__init__(self)
+        Resolver.__init__(self)
+
+    def check_event(self, *choices):
+        event = self.peek_event()
+        if event is None:
+            return False
+        if not choices:
+            return True
+        return isinstance(event, choices)
+
+    def peek_event(self):
+        if self.current_event is None:
+            self.current_event = next(self.events, None)
+        return self.current_event
+
+    def get_event(self):
+        event = self.peek_event()
+        self.current_event = None
+        return event
+
+    def load_value(self):
+        """ Метод собирает и возвращает очередное значение (скаляр, список или словарь). """
+
+        node = self.compose_node(None, None)
+        self.anchors = {}
+        return self.construct_document(node)
+
+    def iterate_sequence(self):
+        """ Генератор возвращает элементы последовательности по одному. """
+
+        if not self.check_event(SequenceStartEvent):
+            yield from self.load_value() or []
+            return
+
+        self.get_event()
+        while not self.check_event(SequenceEndEvent):
+            yield self.load_value()
+        self.get_event()
+
+
+def read_yaml(stream):
+    """
+    Функция потоково читает прайс-лист в формате YAML.
+
+    Возвращает словарь с ключами shop и categories, а ключ goods содержит генератор товаров,
+    который читает раздел goods по одному элементу. Если раздел goods расположен в файле
+    раньше shop или categories, товары приходится прочитать в память целиком.
+    """
+
+    composer = _EventComposer(iter(parse_yaml(stream, Loader=EventLoader)))
+    while not composer.check_event(MappingStartEvent):
+        if composer.check_event(StreamEndEvent) or composer.peek_event() is None:
+            raise FeedError('Прайс-лист не содержит данных')
+        composer.get_event()
+    composer.get_event()
+
+    data = {'categories': []}
+    while not composer.check_event(MappingEndEvent):
+        key = composer.load_value()
+        if key == 'goods':
+            if 'shop' in data:
+                data['goods'] = composer.iterate_sequence()
+                return data
+            data['goods'] = list(composer.iterate_sequence())
+        else:
+            data[key] = composer.load_value()
+
+    if 'shop' not in data:
+        raise FeedError('В прайс-листе не указан магазин')
+    data.setdefault('goods', [])
+    return data
+
+
+def read_jsonl(stream):
+    """
+    Функция потоково читает прайс-лист в формате JSON-lines.
+
+    Первая строка содержит заголовок {"shop": ..., "categories": [...]},
+    каждая следующая строка - один товар в формате раздела goods YAML-файла.
+    Строки с некорректным JSON возвращаются как InvalidRow.
+    """
+
+    lines = ((number, line) for number, line in enumerate(_text_stream(stream), 1) if line.strip())
+    header = next(lines, None)
+    if header is None:
+        raise FeedError('Прайс-лист не содержит данных')
+    header = load_json(header[1])
+    if 'shop' not in header:
+        raise FeedError('В прайс-листе не указан магазин')
+
+    return {'shop': header['shop'],
+            'categories': header.get('categories') or [],
+            'goods': (_jsonl_item(number, line) for number, line in lines)}
+
+
+def _jsonl_item(number, line):
+    try:
+        return load_json(line)
+    except ValueError as error:
+        return InvalidRow(number, f'некорректный JSON ({error})')
+
+
+def read_csv(stream):
+    """
+    Функция потоково читает прайс-лист в формате CSV.
+
+    Обязательные колонки: shop, id, category, model, name, price, price_rrc, quantity;
+    колонка category_name позволяет создать категорию, если её ещё нет.
+    Колонки с префиксом "param:" считаются параметрами товара, пустые значения пропускаются.
+    Строки, в которых значений больше, чем колонок, возвращаются как InvalidRow.
+    Значения возвращаются строками, типы полей приводятся при проверке товара (clean_item).
+    """
+
+    reader = csv.DictReader(_text_stream(stream))
+    first = next(reader, None)
+    if first is None:
+        raise FeedError('Прайс-лист не содержит данных')
+    missing = set(CSV_FIELDS) - {'category_name'} - set(reader.fieldnames)
+    if missing:
+        raise FeedError(f'В прайс-листе отсутствуют колонки: {", ".join(sorted(missing))}')
+
+    return {'shop': first['shop'],
+            'categories': [],
+            'goods': (_csv_item(reader.line_num, row) for row in chain([first], reader))}
+
+
+def _csv_item(number, row):
+    if None in row:
+        return InvalidRow(number, f'лишние значения без колонок: {len(row[None])}')
+    item = {field: row[field] for field in CSV_FIELDS if row.get(field)}
+    item.pop('shop', None)
+    item['parameters'] = {name[len(CSV_PARAMETER_PREFIX):]: value for name, value in row.items()
+                          if name.startswith(CSV_PARAMETER_PREFIX) and value}
+    return item
+
+
+def _text_stream(stream):
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+
+FEED_READERS = {
+    'yaml': read_yaml,
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+def detect_format(url):
+    """ Функция определяет формат прайс-листа по расширению файла в ссылке. """
+
+    path = url.split('?', 1)[0].lower()
+    if path.endswith('.csv'):
+        return 'csv'
+    if path.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'yaml'
+
+
+def read_feed(stream, feed_format='yaml'):
+    """
+    Функция возвращает прайс-лист из файлового объекта stream в виде словаря
+    {'shop': ..., 'categories': [...], 'goods': <итератор товаров>}.
+    """
+
+    if feed_format not in FEED_READERS:
+        raise FeedError(f'Неизвестный формат прайс-листа: {feed_format}')
+    return FEED_READERS[feed_format](stream)
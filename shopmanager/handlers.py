@@ -0,0 +1,32 @@
+from eventmanager.registry import handler, PRICE_LIST_IMPORTED, SHOP_STATE_CHANGED
+from shopmanager.cache import bump_versions, catalog_scopes
+
+
+@handler(PRICE_LIST_IMPORTED)
+def invalidate_imported_catalog(payloads):
+    """
+    Обработчик делает недействительными кэшированные ответы магазинов и категорий, затронутых импортом,
+    а при создании магазина или категорий - списки магазинов и категорий.
+    События группы объединяются, поэтому версии каждой области увеличиваются один раз.
+    Импорт сам обновляет версии после фиксации (PriceListImporter.invalidate_cache), обработчик
+    повторяет это в процессе разбора очереди событий, если процесс импорта не успел их обновить.
+    """
+
+    bump_versions(set(catalog_scopes(
+        shop_ids={shop_id for payload in payloads for shop_id in payload['shop_ids']},
+        category_ids={category_id for payload in payloads for category_id in payload['category_ids']},
+        shops=any(payload['shops'] for payload in payloads),
+        categories=any(payload['categories'] for payload in payloads))))
+
+
+@handler(SHOP_STATE_CHANGED)
+def invalidate_shop_catalog(payloads):
+    """
+    Обработчик делает недействительными кэшированные ответы и список магазинов при изменении их статуса
+    (повторно после PartnerState, который обновляет версии после фиксации в своем процессе).
+    """
+
+    bump_versions(set(catalog_scopes(
+        shop_ids={shop_id for payload in payloads for shop_id in payload['shop_ids']},
+        category_ids={category_id for payload in payloads for category_id in payload['category_ids']},
+        shops=True)))
@@ -0,0 +1,450 @@
+from itertools import chain
+
+from django.db import transaction
+
+from shopmanager.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
+from ordermanager.models import Order, OrderItem
+from eventmanager.outbox import publish
+from eventmanager.registry import PRICE_LIST_IMPORTED
+from shopmanager.cache import invalidate_catalog, shop_category_ids, product_category_ids
+from shopmanager.feeds import InvalidRow
+from shopmanager.search import refresh_product_index
+from shopmanager.utils import chunked
+
+# Максимальное количество ошибок проверки товаров, которое сохраняется в отчете об импорте.
+MAX_REPORTED_ERRORS = 100
+
+INTEGER_FIELDS = ('id', 'category', 'price', 'price_rrc', 'quantity')
+STRING_FIELDS = {
+    'name': Product._meta.get_field('name').max_length,
+    'model': ProductInfo._meta.get_field('model').max_length,
+}
+PARAMETER_NAME_LENGTH = Parameter._meta.get_field('name').max_length
+PARAMETER_VALUE_LENGTH = ProductParameter._meta.get_field('value').max_length
+
+
+def clean_item(item):
+    """
+    Функция проверяет товар из прайс-листа и приводит значения полей к нужным типам.
+    При некорректных данных выбрасывается ValueError.
+    """
+
+    if isinstance(item, InvalidRow):
+        raise ValueError(f'Строка {item.line}: {item.error}')
+    if not isinstance(item, dict):
+        raise ValueError('Товар должен быть словарем')
+
+    cleaned = {}
+    for field in INTEGER_FIELDS:
+        if item.get(field) is None:
+            raise ValueError(f'Не указано поле {field}')
+        try:
+            value = int(item[field])
+        except (TypeError, ValueError):
+            raise ValueError(f'Поле {field} должно быть целым числом') from None
+        if value < 0:
+            raise ValueError(f'Поле {field} не может быть отрицательным')
+        cleaned[field] = value
+
+    for field, max_length in STRING_FIELDS.items():
+        value = str(item.get(field) or '')
+        if len(value) > max_length:
+            raise ValueError(f'Поле {field} длиннее {max_length} символов')
+        cleaned[field] = value
+    if not cleaned['name']:
+        raise ValueError('Не указано поле name')
+
+    if item.get('category_name'):
+        cleaned['category_name'] = str(item['category_name'])
+
+    parameters = item.get('parameters') or {}
+    if not isinstance(parameters, dict):
+        raise ValueError('Параметры товара должны быть словарем')
+    cleaned['parameters'] = {}
+    for name, value in parameters.items():
+        name, value = str(name), str(value)
+        if len(name) > PARAMETER_NAME_LENGTH or len(value) > PARAMETER_VALUE_LENGTH:
+            raise ValueError(f'Слишком длинный параметр {name[:PARAMETER_NAME_LENGTH]}')
+        cleaned['parameters'][name] = value
+
+    return cleaned
+
+
+def clean_goods(goods):
+    """
+    Функция проверяет порцию товаров и возвращает кортеж (корректные товары, ошибки).
+    """
+
+    cleaned = []
+    errors = []
+    for item in goods:
+        try:
+            cleaned.append(clean_item(item))
+        except (TypeError, ValueError) as error:
+            errors.append({'id': item.get('id') if isinstance(item, dict) else None, 'error': str(error)})
+    return cleaned, errors
+
+
+class PriceListImporter:
+    """
+    Класс для пакетного импорта прайс-листа поставщика.
+
+    Категории, продукты и параметры разрешаются пачками через словари соответствия,
+    а ProductInfo и ProductParameter создаются через bulk_create порциями по batch_size.
+    Количество запросов к БД зависит от количества порций, а не от количества товаров.
+    Раздел goods может быть итератором: товары читаются порциями, поэтому потребление памяти
+    определяется размером порции и кэша продуктов (cache_size), а не размером прайс-листа.
+    """
+
+    batch_size = 500
+    cache_size = 50000
+
+    def __init__(self, user_id, batch_size=None, progress=None):
+        self.user_id = user_id
+        if batch_size:
+            self.batch_size = batch_size
+        self.progress = progress
+        self.processed = 0
+        self.errors = []
+        self.shop = None
+        self.shop_created = False
+        self.affected_categories = set()
+        self.categories = set()
+        self.products = {}
+        self.parameters = {}
+        self.stats = {'categories': 0, 'products': 0, 'parameters': 0,
+                      'created': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'rejected': 0}
+
+    def run(self, data):
+        """
+        Метод импортирует прайс-лист (словарь в формате YAML-файла поставщика)
+        в одной транзакции и возвращает статистику изменений.
+        """
+
+        with transaction.atomic():
+            self.prepare(data['shop'], data.get('categories') or [])
+            self.start()
+            for goods, errors in self.clean_batches(data.get('goods') or []):
+                if errors:
+                    self.reject(errors)
+                if goods:
+                    self.import_batch(goods)
+                self.processed += len(goods) + len(errors)
+                if self.progress:
+                    self.progress(self.processed)
+            self.finish()
+            self.refresh_index()
+            self.invalidate_cache()
+        return self.stats
+
+    def clean_batches(self, goods):
+        """ Генератор возвращает проверенные порции товаров (см. clean_goods) в исходном порядке. """
+
+        for batch in chunked(goods, self.batch_size):
+            yield clean_goods(batch)
+
+    def reject(self, errors):
+        """ Метод учитывает товары, не прошедшие проверку. """
+
+        self.stats['rejected'] += len(errors)
+        self.errors.extend(errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+
+    def start(self):
+        """ Метод удаляет прежний прайс-лист магазина перед загрузкой нового. """
+
+        self.affected_categories.update(shop_category_ids([self.shop.id]))
+        self.delete_product_infos(ProductInfo.objects.filter(shop_id=self.shop.id))
+
+    def delete_product_infos(self, product_infos):
+        """
+        Метод удаляет позиции product_infos. Вместе с ними каскадно удаляются позиции корзин и заказов,
+        поэтому суммы и время изменения затронутых заказов пересчитываются в той же транзакции.
+        """
+
+        order_ids = list(OrderItem.objects.filter(product_info__in=product_infos).order_by().values_list(
+            'order_id', flat=True).distinct())
+        _, deleted = product_infos.delete()
+        self.stats['deleted'] += deleted.get(ProductInfo._meta.label, 0)
+        if order_ids:
+            Order.objects.filter(id__in=order_ids).update_totals()
+
+    def finish(self):
+        """ Метод вызывается после загрузки всех порций товаров. """
+
+    def refresh_index(self):
+        """ Метод перестраивает записи каталога ProductIndex магазина. """
+
+        refresh_product_index(shop_id=self.shop.id)
+        self.affected_categories.update(shop_category_ids([self.shop.id]))
+
+    def invalidate_cache(self, catalog_changed=True):
+        """
+        Метод делает недействительными кэшированные ответы магазина и категорий, товары которых изменились,
+        а при создании магазина или категорий - списки магазинов и категорий: после фиксации импорта
+        в текущем процессе и через событие об импорте прайс-листа, обработчик которого повторяет это
+        в процессе разбора очереди событий (на случай, если процесс импорта завершился до обновления версий).
+        """
+
+        scopes = {'shop_ids': [self.shop.id] if catalog_changed else [],
+                  'category_ids': sorted(self.affected_categories) if catalog_changed else [],
+                  'shops': self.shop_created, 'categories': self.stats['categories'] > 0}
+        invalidate_catalog(**scopes)
+        publish(PRICE_LIST_IMPORTED, **scopes)
+
+    def prepare(self, shop_name, categories):
+        """ Метод создает магазин и недостающие категории, после чего привязывает категории к магазину. """
+
+        self.shop, self.shop_created = Shop.objects.get_or_create(name=shop_name, user_id=self.user_id)
+        self.add_categories({category['id']: category['name'] for category in categories})
+
+    def add_categories(self, category_names):
+        """ Метод создает недостающие категории {id: name} и привязывает их к магазину. """
+
+        category_names = {category_id: name for category_id, name in category_names.items()
+                          if category_id not in self.categories}
+        if not category_names:
+            return
+
+        existing_ids = set(Category.objects.filter(id__in=category_names).values_list('id', flat=True))
+        new_categories = [Category(id=category_id, name=name) for category_id, name in category_names.items()
+                          if category_id not in existing_ids]
+        Category.objects.bulk_create(new_categories)
+        self.stats['categories'] += len(new_categories)
+
+        shop_category = Category.shops.through
+        shop_category.objects.bulk_create(
+            [shop_category(category_id=category_id, shop_id=self.shop.id) for category_id in category_names],
+            ignore_conflicts=True)
+        self.categories.update(category_names)
+
+    def import_batch(self, goods):
+        """ Метод импортирует порцию товаров из прайс-листа. """
+
+        self.resolve_dimensions(goods)
+        self.create_product_infos(goods)
+
+    def resolve_dimensions(self, goods):
+        """ Метод разрешает категории, продукты и параметры, на которые ссылается порция товаров. """
+
+        self.add_categories({item['category']: item['category_name'] for item in goods if 'category_name' in item})
+        if len(self.products) > self.cache_size:
+            self.products.clear()
+        self.resolve_products({(item['name'], item['category']) for item in goods})
+        self.resolve_parameters({name for item in goods for name in (item.get('parameters') or {})})
+
+    def create_product_infos(self, goods):
+        """
+        Метод создает ProductInfo и ProductParameter для новых товаров
+        и возвращает словарь {(product_id, external_id): id} созданных позиций.
+        """
+
+        if not goods:
+            return {}
+
+        product_infos = [ProductInfo(product_id=self.products[(item['name'], item['category'])],
+                                     shop_id=self.shop.id,
+                                     external_id=item['id'],
+                                     model=item['model'],
+                                     price=item['price'],
+                                     price_rrc=item['price_rrc'],
+                                     quantity=item['quantity']) for item in goods]
+        ProductInfo.objects.bulk_create(product_infos, batch_size=self.batch_size)
+        self.stats['created'] += len(product_infos)
+
+        product_info_ids = self.fetch_product_info_ids(product_infos)
+        product_parameters = [
+            ProductParameter(product_info_id=product_info_ids[(product_info.product_id, product_info.external_id)],
+                             parameter_id=self.parameters[name],
+                             value=value)
+            for product_info, item in zip(product_infos, goods)
+            for name, value in (item.get('parameters') or {}).items()]
+        ProductParameter.objects.bulk_create(product_parameters, batch_size=self.batch_size)
+        return product_info_ids
+
+    def fetch_product_info_ids(self, product_infos):
+        """
+        Метод возвращает словарь {(product_id, external_id): id} для только что созданных объектов.
+        На бэкендах, которые возвращают первичные ключи из bulk_create, запрос к БД не выполняется.
+        """
+
+        if all(product_info.pk for product_info in product_infos):
+            return {(product_info.product_id, product_info.external_id): product_info.pk
+                    for product_info in product_infos}
+
+        rows = ProductInfo.objects.filter(
+            shop_id=self.shop.id,
+            external_id__in={product_info.external_id for product_info in product_infos}).values_list(
+            'product_id', 'external_id', 'id')
+        return {(product_id, external_id): pk for product_id, external_id, pk in rows}
+
+    def resolve_products(self, keys):
+        """ Метод дополняет словарь продуктов {(name, category_id): id}, создавая недостающие продукты. """
+
+        missing = keys - self.products.keys()
+        if not missing:
+            return
+
+        self.load_products(missing)
+        missing = missing - self.products.keys()
+        if missing:
+            Product.objects.bulk_create([Product(name=name, category_id=category_id)
+                                         for name, category_id in missing], batch_size=self.batch_size)
+            self.stats['products'] += len(missing)
+            self.load_products(missing)
+
+    def load_products(self, keys):
+        rows = Product.objects.filter(
+            name__in={name for name, _ in keys},
+            category_id__in={category_id for _, category_id in keys}).order_by('id').values_list(
+            'name', 'category_id', 'id')
+        for name, category_id, pk in rows:
+            self.products.setdefault((name, category_id), pk)
+
+    def resolve_parameters(self, names):
+        """ Метод дополняет словарь параметров {name: id}, создавая недостающие параметры. """
+
+        missing = names - self.parameters.keys()
+        if not missing:
+            return
+
+        self.load_parameters(missing)
+        missing = missing - self.parameters.keys()
+        if missing:
+            Parameter.objects.bulk_create([Parameter(name=name) for name in missing], batch_size=self.batch_size)
+            self.stats['parameters'] += len(missing)
+            self.load_parameters(missing)
+
+    def load_parameters(self, names):
+        rows = Parameter.objects.filter(name__in=names).order_by('id').values_list('name', 'id')
+        for name, pk in rows:
+            self.parameters.setdefault(name, pk)
+
+
+class IncrementalPriceListImporter(PriceListImporter):
+    """
+    Класс для инкрементального обновления прайс-листа поставщика.
+
+    Товары сопоставляются с существующими позициями магазина по паре (shop, external_id).
+    Новые позиции создаются, у найденных изменяются только отличающиеся поля и параметры,
+    а позиции, отсутствующие в прайс-листе, удаляются вместе с позициями корзин и заказов (суммы
+    заказов пересчитываются, см. delete_product_infos). Позиции без изменений не затрагиваются,
+    поэтому связанные с ними товары в корзинах покупателей сохраняются.
+    """
+
+    fields = ('product_id', 'model', 'price', 'price_rrc', 'quantity')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.remaining = {}
+        self.stale = []
+        self.touched = set()
+
+    def start(self):
+        """ Метод запоминает идентификаторы текущих позиций магазина для поиска удаленных товаров. """
+
+        rows = ProductInfo.objects.filter(shop_id=self.shop.id).order_by('id').values_list('external_id', 'id')
+        for external_id, pk in rows:
+            if external_id in self.remaining:
+                self.stale.append(pk)
+            else:
+                self.remaining[external_id] = pk
+
+    def finish(self):
+        """ Метод удаляет позиции, которых не оказалось в прайс-листе. """
+
+        for ids in chunked(self.stale + list(self.remaining.values()), self.batch_size):
+            self.affected_categories.update(product_category_ids(ids))
+            self.delete_product_infos(ProductInfo.objects.filter(id__in=ids))
+
+    def refresh_index(self):
+        """ Метод обновляет записи каталога только у созданных и измененных позиций. """
+
+        self.affected_categories.update(product_category_ids(self.touched))
+        refresh_product_index(product_info_ids=self.touched)
+        self.affected_categories.update(product_category_ids(self.touched))
+
+    def invalidate_cache(self, catalog_changed=True):
+        """ Метод отмечает в событии изменения каталога магазина, только если каталог действительно изменился. """
+
+        super().invalidate_cache(catalog_changed=bool(self.touched or self.stats['deleted']))
+
+    def reject(self, errors):
+        """ Метод учитывает товары, не прошедшие проверку, и сохраняет соответствующие им позиции. """
+
+        super().reject(errors)
+        for error in errors:
+            try:
+                self.remaining.pop(int(error['id']), None)
+            except (TypeError, ValueError):
+                pass
+
+    def import_batch(self, goods):
+        """ Метод сравнивает порцию товаров с сохраненными позициями и применяет только изменения. """
+
+        self.resolve_dimensions(goods)
+
+        matched = {}
+        new_goods = []
+        for item in goods:
+            pk = self.remaining.pop(item['id'], None)
+            if pk is None:
+                new_goods.append(item)
+            else:
+                matched[pk] = item
+
+        self.touched.update(self.create_product_infos(new_goods).values())
+        if matched:
+            self.update_product_infos(matched)
+            self.update_product_parameters(matched)
+
+    def update_product_infos(self, matched):
+        """ Метод обновляет отличающиеся поля у найденных позиций одним bulk_update на порцию. """
+
+        changed = []
+        changed_fields = set()
+        for product_info in ProductInfo.objects.filter(id__in=matched).only('id', *self.fields):
+            item = matched[product_info.pk]
+            values = {'product_id': self.products[(item['name'], item['category'])],
+                      'model': item['model'],
+                      'price': item['price'],
+                      'price_rrc': item['price_rrc'],
+                      'quantity': item['quantity']}
+            fields = [field for field, value in values.items() if getattr(product_info, field) != value]
+            if fields:
+                for field in fields:
+                    setattr(product_info, field, values[field])
+                changed.append(product_info)
+                changed_fields.update(fields)
+
+        if changed:
+            ProductInfo.objects.bulk_update(changed, sorted(changed_fields), batch_size=self.batch_size)
+            self.touched.update(product_info.pk for product_info in changed)
+        self.stats['updated'] += len(changed)
+        self.stats['unchanged'] += len(matched) - len(changed)
+
+    def update_product_parameters(self, matched):
+        """ Метод синхронизирует параметры найденных позиций: добавляет, изменяет и удаляет отличающиеся. """
+
+        current = {}
+        for product_parameter in ProductParameter.objects.filter(product_info_id__in=matched).only(
+                'id', 'product_info_id', 'parameter_id', 'value'):
+            current[(product_parameter.product_info_id, product_parameter.parameter_id)] = product_parameter
+
+        created = []
+        updated = []
+        for pk, item in matched.items():
+            for name, value in (item.get('parameters') or {}).items():
+                key = (pk, self.parameters[name])
+                product_parameter = current.pop(key, None)
+                if product_parameter is None:
+                    created.append(ProductParameter(product_info_id=pk, parameter_id=key[1], value=value))
+                elif product_parameter.value != value:
+                    product_parameter.value = value
+                    updated.append(product_parameter)
+
+        ProductParameter.objects.bulk_create(created, batch_size=self.batch_size)
+        if updated:
+            ProductParameter.objects.bulk_update(updated, ['value'], batch_size=self.batch_size)
+        if current:
+            ProductParameter.objects.filter(id__in=[parameter.pk for parameter in current.values()]).delete()
+        self.touched.update(parameter.product_info_id for parameter in chain(created, updated, current.values()))
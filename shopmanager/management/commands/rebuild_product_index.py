@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from shopmanager.cache import invalidate_catalog, shop_category_ids
+from shopmanager.models import Shop
+from shopmanager.search import refresh_product_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает денормализованный каталог ProductIndex (весь или для одного магазина).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shop', type=int, help='Идентификатор магазина')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            shop_ids = [options['shop']] if options['shop'] else list(Shop.objects.values_list('id', flat=True))
+            category_ids = shop_category_ids(shop_ids)
+            refresh_product_index(shop_id=options['shop'])
+            invalidate_catalog(shop_ids=shop_ids, category_ids=category_ids | shop_category_ids(shop_ids))
+        self.stdout.write(self.style.SUCCESS('Каталог перестроен'))
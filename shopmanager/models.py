@@ -3,6 +3,19 @@ from django.db import models
 
 from usermanager.models import User, Contact
 
+JOB_STATE_CHOICES = (
+    ('pending', 'В очереди'),
+    ('running', 'Выполняется'),
+    ('done', 'Завершен'),
+    ('failed', 'Ошибка'),
+)
+
+FEED_FORMAT_CHOICES = (
+    ('yaml', 'YAML'),
+    ('csv', 'CSV'),
+    ('jsonl', 'JSON-lines'),
+)
+
 
 class Shop(models.Model):
     name = models.CharField(max_length=50, verbose_name='Название')
@@ -95,3 +108,108 @@ class ProductParameter(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['product_info', 'parameter'], name='unique_product_parameter'),
         ]
+
+
+class ProductIndex(models.Model):
+    """
+    Денормализованная запись каталога: одна строка на каждую ProductInfo.
+    Содержит все данные, необходимые для выдачи каталога, поэтому список товаров
+    читается из одной таблицы без соединений. Синхронизируется импортом прайс-листа
+    и изменением статуса магазина (см. shopmanager.search).
+    """
+
+    product_info = models.OneToOneField(ProductInfo, verbose_name='Информация о продукте', primary_key=True,
+                                        related_name='index', on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='product_index',
+                             on_delete=models.CASCADE)
+    shop_state = models.BooleanField(verbose_name='статус получения заказов')
+    category_id = models.PositiveIntegerField(verbose_name='Категория')
+    category_name = models.CharField(max_length=40, verbose_name='Название категории')
+    product_name = models.CharField(max_length=80, verbose_name='Название продукта')
+    model = models.CharField(max_length=80, verbose_name='Модель', blank=True)
+    quantity = models.PositiveIntegerField(verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена')
+    price_rrc = models.PositiveIntegerField(verbose_name='Рекомендуемая розничная цена')
+    parameters = models.JSONField(verbose_name='Параметры', default=list)
+
+    class Meta:
+        verbose_name = 'Запись каталога'
+        verbose_name_plural = "Поисковый индекс каталога"
+        ordering = ('product_info_id',)
+        indexes = [
+            models.Index(fields=['shop_state', 'category_id', 'product_info'], name='product_index_category'),
+            models.Index(fields=['shop_state', 'shop', 'product_info'], name='product_index_shop'),
+        ]
+
+
+class ProductFacet(models.Model):
+    """
+    Инвертированный индекс параметров товаров для фасетного поиска:
+    одна строка на каждый параметр позиции каталога. Числовые значения
+    дополнительно сохраняются в numeric_value для фильтрации по диапазону.
+    """
+
+    product_info = models.ForeignKey(ProductInfo, verbose_name='Информация о продукте', related_name='facets',
+                                     on_delete=models.CASCADE)
+    name = models.CharField(max_length=40, verbose_name='Параметр')
+    value = models.CharField(max_length=100, verbose_name='Значение')
+    numeric_value = models.FloatField(verbose_name='Числовое значение', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Значение фасета'
+        verbose_name_plural = "Фасетный индекс каталога"
+        indexes = [
+            models.Index(fields=['name', 'value', 'product_info'], name='product_facet_value'),
+            models.Index(fields=['name', 'numeric_value', 'product_info'], name='product_facet_numeric'),
+            models.Index(fields=['product_info', 'name', 'value'], name='product_facet_product'),
+        ]
+
+
+class ImportJob(models.Model):
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='import_jobs',
+                             on_delete=models.CASCADE)
+    url = models.URLField(verbose_name='Ссылка на прайс-лист')
+    incremental = models.BooleanField(verbose_name='Инкрементальное обновление', default=False)
+    feed_format = models.CharField(verbose_name='Формат прайс-листа', choices=FEED_FORMAT_CHOICES, max_length=5,
+                                   default='yaml')
+    task_id = models.CharField(verbose_name='Идентификатор задачи Celery', max_length=255, blank=True)
+    state = models.CharField(verbose_name='Статус', choices=JOB_STATE_CHOICES, max_length=15, default='pending')
+    processed = models.PositiveIntegerField(verbose_name='Обработано позиций', default=0)
+    errors = models.JSONField(verbose_name='Ошибки', default=list, blank=True)
+    result = models.JSONField(verbose_name='Результат', null=True, blank=True)
+    created_at = models.DateTimeField(verbose_name='Создан', auto_now_add=True)
+    started_at = models.DateTimeField(verbose_name='Запущен', null=True, blank=True)
+    finished_at = models.DateTimeField(verbose_name='Завершен', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Задача импорта'
+        verbose_name_plural = "Список задач импорта"
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'{self.url} ({self.state})'
+
+
+class ExportJob(models.Model):
+    user = models.ForeignKey(User, verbose_name='Пользователь', related_name='export_jobs',
+                             on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='export_jobs',
+                             on_delete=models.CASCADE)
+    feed_format = models.CharField(verbose_name='Формат прайс-листа', choices=FEED_FORMAT_CHOICES, max_length=5,
+                                   default='yaml')
+    task_id = models.CharField(verbose_name='Идентификатор задачи Celery', max_length=255, blank=True)
+    state = models.CharField(verbose_name='Статус', choices=JOB_STATE_CHOICES, max_length=15, default='pending')
+    processed = models.PositiveIntegerField(verbose_name='Выгружено позиций', default=0)
+    file = models.FileField(verbose_name='Файл', upload_to='exports/', blank=True)
+    errors = models.JSONField(verbose_name='Ошибки', default=list, blank=True)
+    created_at = models.DateTimeField(verbose_name='Создан', auto_now_add=True)
+    started_at = models.DateTimeField(verbose_name='Запущен', null=True, blank=True)
+    finished_at = models.DateTimeField(verbose_name='Завершен', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Задача экспорта'
+        verbose_name_plural = "Список задач экспорта"
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'{self.shop} ({self.state})'
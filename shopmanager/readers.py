@@ -0,0 +1,38 @@
+from shopmanager.models import ProductInfo, ProductParameter
+
+# Поля ProductIndex, из которых собирается запись каталога.
+CATALOG_FIELDS = ('product_info_id', 'model', 'product_name', 'category_name', 'shop_id',
+                  'quantity', 'price', 'price_rrc', 'parameters')
+
+
+def catalog_rows(rows):
+    """
+    Функция формирует записи каталога в формате ProductIndexSerializer (и ProductInfoSerializer)
+    из словарей ProductIndex.objects.values(*CATALOG_FIELDS) без создания экземпляров моделей и полей DRF.
+    """
+
+    return [{'id': row['product_info_id'], 'model': row['model'],
+             'product': {'name': row['product_name'], 'category': row['category_name']},
+             'shop': row['shop_id'], 'quantity': row['quantity'], 'price': row['price'],
+             'price_rrc': row['price_rrc'], 'product_parameters': row['parameters']}
+            for row in rows]
+
+
+def product_info_rows(product_info_ids):
+    """
+    Функция возвращает словарь {id: данные} позиций в формате ProductInfoSerializer.
+    Позиции и их параметры загружаются двумя запросами values_list.
+    """
+
+    parameters = {}
+    for product_info_id, name, value in ProductParameter.objects.filter(
+            product_info_id__in=product_info_ids).order_by('id').values_list(
+            'product_info_id', 'parameter__name', 'value'):
+        parameters.setdefault(product_info_id, []).append({'parameter': name, 'value': value})
+
+    return {pk: {'id': pk, 'model': model, 'product': {'name': name, 'category': category},
+                 'shop': shop_id, 'quantity': quantity, 'price': price, 'price_rrc': price_rrc,
+                 'product_parameters': parameters.get(pk, [])}
+            for pk, model, name, category, shop_id, quantity, price, price_rrc in ProductInfo.objects.filter(
+                id__in=product_info_ids).values_list('id', 'model', 'product__name', 'product__category__name',
+                                                     'shop_id', 'quantity', 'price', 'price_rrc')}
@@ -0,0 +1,223 @@
+import re
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Q, Count, Min, Max
+from django.db.models.expressions import RawSQL
+
+from shopmanager.models import ProductInfo, ProductParameter, ProductIndex, ProductFacet
+from shopmanager.utils import chunked
+
+INDEX_CHUNK_SIZE = 2000
+
+# Полнотекстовый индекс по названию продукта и модели.
+# SQLite: внешняя FTS5-таблица, синхронизируемая триггерами с ProductIndex.
+# PostgreSQL: GIN-индекс по выражению to_tsvector, которое используется в запросе поиска.
+FTS_TABLE = 'shopmanager_productindex_fts'
+SQLITE_FTS_SETUP = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"product_name, model, content='shopmanager_productindex', content_rowid='product_info_id')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON shopmanager_productindex BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, product_name, model) "
+    f"VALUES (new.product_info_id, new.product_name, new.model); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON shopmanager_productindex BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, product_name, model) "
+    f"VALUES ('delete', old.product_info_id, old.product_name, old.model); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF product_name, model "
+    f"ON shopmanager_productindex BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, product_name, model) "
+    f"VALUES ('delete', old.product_info_id, old.product_name, old.model); "
+    f"INSERT INTO {FTS_TABLE}(rowid, product_name, model) "
+    f"VALUES (new.product_info_id, new.product_name, new.model); END",
+)
+POSTGRES_TSVECTOR = "to_tsvector('russian', product_name || ' ' || model)"
+POSTGRES_FTS_SETUP = (
+    f"CREATE INDEX IF NOT EXISTS shopmanager_productindex_fts ON shopmanager_productindex "
+    f"USING GIN ({POSTGRES_TSVECTOR})",
+)
+
+FACET_PATTERN = re.compile(r'^(?P<name>.+?)(?P<operator>>=|<=|=|>|<)(?P<value>.+)$')
+FACET_LOOKUPS = {'>=': 'gte', '<=': 'lte', '>': 'gt', '<': 'lt'}
+
+
+class SearchError(ValueError):
+    """ Исключение для некорректных параметров поиска. """
+
+
+def setup_full_text_search(using=None, **kwargs):
+    """
+    Функция создает полнотекстовый индекс каталога для текущей СУБД.
+    Подключается к сигналу post_migrate приложения shopmanager.
+    """
+
+    db = connections[using or 'default']
+    statements = {'sqlite': SQLITE_FTS_SETUP, 'postgresql': POSTGRES_FTS_SETUP}.get(db.vendor, ())
+    with db.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+        if db.vendor == 'sqlite' and statements:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def to_number(value):
+    try:
+        return float(str(value).replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def build_index_rows(product_infos):
+    """
+    Функция формирует записи ProductIndex и ProductFacet для порции ProductInfo (queryset),
+    загружая параметры всей порции одним запросом.
+    """
+
+    rows = list(product_infos.values_list(
+        'id', 'shop_id', 'shop__state', 'product__category_id', 'product__category__name', 'product__name',
+        'model', 'quantity', 'price', 'price_rrc'))
+
+    parameters = {}
+    facets = []
+    for product_info_id, name, value in ProductParameter.objects.filter(
+            product_info_id__in=[row[0] for row in rows]).order_by('id').values_list(
+            'product_info_id', 'parameter__name', 'value'):
+        parameters.setdefault(product_info_id, []).append({'parameter': name, 'value': value})
+        facets.append(ProductFacet(product_info_id=product_info_id, name=name, value=value,
+                                   numeric_value=to_number(value)))
+
+    index_rows = [ProductIndex(product_info_id=pk, shop_id=shop_id, shop_state=shop_state,
+                               category_id=category_id, category_name=category_name, product_name=product_name,
+                               model=model, quantity=quantity, price=price, price_rrc=price_rrc,
+                               parameters=parameters.get(pk, []))
+                  for pk, shop_id, shop_state, category_id, category_name, product_name, model, quantity, price,
+                  price_rrc in rows]
+    return index_rows, facets
+
+
+def refresh_product_index(shop_id=None, product_info_ids=None, chunk_size=INDEX_CHUNK_SIZE):
+    """
+    Функция перестраивает записи каталога ProductIndex и фасетного индекса ProductFacet.
+
+    Без аргументов перестраивается весь каталог, при указании shop_id - каталог магазина,
+    при указании product_info_ids - только записи перечисленных позиций.
+    Позиции обрабатываются порциями по chunk_size с постоянным количеством запросов на порцию.
+    """
+
+    if product_info_ids is not None:
+        for ids in chunked(sorted(product_info_ids), chunk_size):
+            ProductIndex.objects.filter(product_info_id__in=ids).delete()
+            ProductFacet.objects.filter(product_info_id__in=ids).delete()
+            save_index_rows(*build_index_rows(ProductInfo.objects.filter(id__in=ids)))
+        return
+
+    product_infos = ProductInfo.objects.all()
+    if shop_id is not None:
+        product_infos = product_infos.filter(shop_id=shop_id)
+        ProductIndex.objects.filter(shop_id=shop_id).delete()
+        ProductFacet.objects.filter(product_info__shop_id=shop_id).delete()
+    else:
+        ProductIndex.objects.all().delete()
+        ProductFacet.objects.all().delete()
+
+    last_id = 0
+    while True:
+        index_rows, facets = build_index_rows(product_infos.filter(id__gt=last_id).order_by('id')[:chunk_size])
+        if not index_rows:
+            return
+        save_index_rows(index_rows, facets)
+        last_id = index_rows[-1].product_info_id
+
+
+def save_index_rows(index_rows, facets):
+    ProductIndex.objects.bulk_create(index_rows)
+    ProductFacet.objects.bulk_create(facets)
+
+
+def set_shop_state(shop_ids, state):
+    """ Функция обновляет статус магазинов в записях каталога одним запросом. """
+
+    return ProductIndex.objects.filter(shop_id__in=shop_ids).exclude(shop_state=state).update(shop_state=state)
+
+
+def parse_facet(expression):
+    """
+    Функция разбирает фильтр по параметру вида "Цвет=черный" или "Диагональ (дюйм)>=6"
+    и возвращает кортеж (название, оператор, значение).
+    """
+
+    match = FACET_PATTERN.match(expression)
+    if not match:
+        raise SearchError(f'Некорректный фильтр по параметру: {expression}')
+    name, operator, value = match.group('name').strip(), match.group('operator'), match.group('value').strip()
+    if operator != '=' and to_number(value) is None:
+        raise SearchError(f'Для сравнения требуется числовое значение: {expression}')
+    return name, operator, value
+
+
+def full_text_filter(queryset, text):
+    """ Функция ограничивает queryset записей каталога результатами полнотекстового поиска. """
+
+    terms = re.findall(r'\w+', text)
+    if not terms:
+        return queryset
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.filter(product_info_id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,)))
+
+    if connection.vendor == 'postgresql':
+        return queryset.extra(where=[f"{POSTGRES_TSVECTOR} @@ plainto_tsquery('russian', %s)"], params=[text])
+
+    for term in terms:
+        queryset = queryset.filter(Q(product_name__icontains=term) | Q(model__icontains=term))
+    return queryset
+
+
+def search_products(queryset, text=None, facets=(), price_min=None, price_max=None):
+    """
+    Функция применяет к queryset записей каталога полнотекстовый поиск,
+    фильтры по параметрам (фасетам) и по диапазону цен.
+    """
+
+    if text:
+        queryset = full_text_filter(queryset, text)
+
+    for name, operator, value in facets:
+        if operator == '=':
+            condition = {'name': name, 'value': value}
+        else:
+            condition = {'name': name, f'numeric_value__{FACET_LOOKUPS[operator]}': to_number(value)}
+        queryset = queryset.filter(
+            product_info_id__in=ProductFacet.objects.filter(**condition).values('product_info_id'))
+
+    if price_min is not None:
+        queryset = queryset.filter(price__gte=price_min)
+    if price_max is not None:
+        queryset = queryset.filter(price__lte=price_max)
+
+    return queryset
+
+
+def facet_counts(queryset, limit=20, scan_limit=None):
+    """
+    Функция возвращает количество товаров по значениям параметров и диапазон цен
+    для отфильтрованного queryset записей каталога. Подсчет выполняется по первым scan_limit
+    (по умолчанию FACET_SCAN_LIMIT) найденным товарам одним сгруппированным запросом по фасетному индексу
+    и одним запросом диапазона цен, поэтому его время не растет с количеством найденных товаров.
+    Если найдено не меньше scan_limit товаров, значения приблизительны (признак partial).
+    """
+
+    scan_limit = scan_limit or settings.FACET_SCAN_LIMIT
+    ids = queryset.order_by().values('product_info_id')[:scan_limit]
+    counts = {}
+    for name, value, count in ProductFacet.objects.filter(product_info_id__in=ids).values_list(
+            'name', 'value').annotate(count=Count('id')).order_by('name', '-count', 'value'):
+        values = counts.setdefault(name, [])
+        if len(values) < limit:
+            values.append({'value': value, 'count': count})
+
+    scanned = ProductIndex.objects.filter(product_info_id__in=ids).aggregate(
+        min=Min('price'), max=Max('price'), count=Count('product_info_id'))
+    return {'parameters': counts, 'price': {'min': scanned['min'], 'max': scanned['max']},
+            'partial': scanned['count'] >= scan_limit}
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
-from shopmanager.models import Category, Shop, ProductInfo, Product, ProductParameter
+from shopmanager.models import Category, Shop, ProductInfo, Product, ProductParameter, ImportJob, ExportJob, \
+    ProductIndex
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -41,3 +42,35 @@ class ProductInfoSerializer(serializers.ModelSerializer):
         model = ProductInfo
         fields = ('id', 'model', 'product', 'shop', 'quantity', 'price', 'price_rrc', 'product_parameters',)
         read_only_fields = ('id',)
+
+
+class ProductIndexSerializer(serializers.ModelSerializer):
+    """ Сериализатор записей каталога, формирующий ответ в том же формате, что и ProductInfoSerializer. """
+
+    id = serializers.IntegerField(source='product_info_id')
+    product = serializers.SerializerMethodField()
+    shop = serializers.IntegerField(source='shop_id')
+    product_parameters = serializers.JSONField(source='parameters')
+
+    class Meta:
+        model = ProductIndex
+        fields = ('id', 'model', 'product', 'shop', 'quantity', 'price', 'price_rrc', 'product_parameters',)
+        read_only_fields = fields
+
+    def get_product(self, obj):
+        return {'name': obj.product_name, 'category': obj.category_name}
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = ('id', 'url', 'incremental', 'feed_format', 'state', 'processed', 'errors', 'result',
+                  'created_at', 'started_at', 'finished_at',)
+        read_only_fields = fields
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExportJob
+        fields = ('id', 'feed_format', 'state', 'processed', 'errors', 'created_at', 'started_at', 'finished_at',)
+        read_only_fields = fields
@@ -0,0 +1,88 @@
+import os
+
+from requests import get
+
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from shopmanager.feeds import read_feed
+from shopmanager.exporter import PriceListExporter
+from shopmanager.importer import PriceListImporter, IncrementalPriceListImporter
+from shopmanager.models import ImportJob, ExportJob
+
+DOWNLOAD_TIMEOUT = 60
+
+
+@shared_task(bind=True)
+def do_import(self, job_id):
+    """
+    Задача загружает прайс-лист поставщика по ссылке из ImportJob и импортирует его.
+    Ответ читается потоково, товары передаются импортеру порциями по мере разбора.
+    Прогресс публикуется в result backend Celery (состояние PROGRESS),
+    итоговый статус и сводка изменений сохраняются в ImportJob.
+    """
+
+    job = ImportJob.objects.get(id=job_id)
+    ImportJob.objects.filter(id=job.id).update(state='running', started_at=timezone.now())
+
+    def progress(processed):
+        if not self.request.is_eager:
+            self.update_state(state='PROGRESS', meta={'processed': processed})
+
+    importer_class = IncrementalPriceListImporter if job.incremental else PriceListImporter
+    importer = importer_class(job.user_id, progress=progress)
+    try:
+        with get(job.url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            result = importer.run(read_feed(response.raw, job.feed_format))
+    except Exception as error:
+        ImportJob.objects.filter(id=job.id).update(state='failed',
+                                                   processed=importer.processed,
+                                                   errors=importer.errors + [{'id': None,
+                                                                            'error': f'{type(error).__name__}: {error}'}],
+                                                   finished_at=timezone.now())
+        raise
+
+    ImportJob.objects.filter(id=job.id).update(state='done',
+                                               processed=importer.processed,
+                                               errors=importer.errors,
+                                               result=result,
+                                               finished_at=timezone.now())
+    return result
+
+
+@shared_task(bind=True)
+def do_export(self, job_id):
+    """
+    Задача выгружает прайс-лист магазина из ExportJob в файл в каталоге MEDIA_ROOT/exports.
+    Файл записывается потоково, порциями по PriceListExporter.chunk_size позиций.
+    """
+
+    job = ExportJob.objects.select_related('shop').get(id=job_id)
+    ExportJob.objects.filter(id=job.id).update(state='running', started_at=timezone.now())
+
+    exporter = PriceListExporter(job.shop)
+    name = f'{ExportJob.file.field.upload_to}shop-{job.shop_id}-{job.id}.{job.feed_format}'
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            for chunk in exporter.export(job.feed_format):
+                file.write(chunk)
+                if not self.request.is_eager:
+                    self.update_state(state='PROGRESS', meta={'processed': exporter.processed})
+    except Exception as error:
+        ExportJob.objects.filter(id=job.id).update(state='failed',
+                                                   processed=exporter.processed,
+                                                   errors=[{'id': None,
+                                                            'error': f'{type(error).__name__}: {error}'}],
+                                                   finished_at=timezone.now())
+        raise
+
+    ExportJob.objects.filter(id=job.id).update(state='done',
+                                               processed=exporter.processed,
+                                               file=name,
+                                               finished_at=timezone.now())
+    return name
@@ -0,0 +1,852 @@
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+from unittest.mock import patch
+
+import yaml
+from kombu.exceptions import OperationalError
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from api_diplom_final.middleware import QueryBudgetExceeded
+from api_diplom_final.pagination import ProductCursorPagination
+from api_diplom_final.renderers import FastJSONRenderer, available_backends
+from api_diplom_final.testing import make_price_list, QueryCountMixin, ShopUserMixin
+from shopmanager.feeds import read_feed, detect_format, FeedError, InvalidRow
+from shopmanager.exporter import PriceListExporter
+from shopmanager.importer import PriceListImporter, IncrementalPriceListImporter, clean_item
+from shopmanager.models import Shop, Product, ProductInfo, Parameter, ProductParameter, ImportJob, ProductIndex
+from shopmanager.serializers import ProductInfoSerializer
+from shopmanager.tasks import do_import, do_export
+from shopmanager.views import CategoryView
+from usermanager.models import User
+
+
+class ShopManagerAPITests(ShopUserMixin, APITestCase):
+    """
+    Класс для тестирования импорта товаров из приложения shopmanager.
+    """
+
+    partner_update_url = reverse('shopmanager:partner-update')
+    price_list_url = 'http://example.com/shop.yaml'
+
+    def count_import_queries(self, goods_count):
+        with CaptureQueriesContext(connection) as context:
+            PriceListImporter(self.user.id).run(make_price_list(goods_count))
+        return len(context.captured_queries)
+
+    def test_importer_creates_objects(self):
+        """
+        Проверка корректной работы PriceListImporter,
+        а именно создания магазина, категорий, продуктов, информации о продуктах и их параметров.
+        """
+
+        stats = PriceListImporter(self.user.id).run(make_price_list(10))
+
+        shop = Shop.objects.get(user_id=self.user.id)
+        assert stats['created'] == 10
+        assert ProductInfo.objects.filter(shop_id=shop.id).count() == 10
+        assert ProductParameter.objects.filter(product_info__shop_id=shop.id).count() == 20
+        assert set(shop.categories.values_list('id', flat=True)) == {224, 15}
+        assert Product.objects.count() == 10
+
+    def test_importer_replaces_previous_price_list(self):
+        """
+        Проверка повторного импорта: старые позиции магазина удаляются,
+        уже существующие продукты и параметры не дублируются.
+        """
+
+        PriceListImporter(self.user.id).run(make_price_list(10))
+        stats = PriceListImporter(self.user.id).run(make_price_list(5))
+
+        assert stats['products'] == 0
+        assert stats['parameters'] == 0
+        assert ProductInfo.objects.count() == 5
+        assert Product.objects.count() == 10
+
+    def test_importer_query_count_does_not_depend_on_goods_count(self):
+        """
+        Проверка того, что количество запросов к БД при импорте одной порции
+        не зависит от количества товаров в прайс-листе.
+        """
+
+        PriceListImporter(self.user.id).run(make_price_list(0))
+        small = self.count_import_queries(5)
+        Product.objects.all().delete()
+        Parameter.objects.all().delete()
+        large = self.count_import_queries(60)
+
+        assert small == large
+
+    def test_incremental_importer_applies_only_changes(self):
+        """
+        Проверка корректной работы IncrementalPriceListImporter:
+        неизмененные позиции сохраняют идентификаторы, измененные обновляются,
+        отсутствующие в прайс-листе удаляются, а новые создаются.
+        """
+
+        PriceListImporter(self.user.id).run(make_price_list(5))
+        ids = dict(ProductInfo.objects.values_list('external_id', 'id'))
+
+        data = make_price_list(6)
+        data['goods'].pop(0)
+        data['goods'][0]['price'] = 5000
+        data['goods'][1]['parameters']['Цвет'] = 'белый'
+        stats = IncrementalPriceListImporter(self.user.id).run(data)
+
+        assert (stats['created'], stats['updated'], stats['unchanged'], stats['deleted']) == (1, 1, 3, 1)
+        assert dict(ProductInfo.objects.filter(external_id__in=[2, 3, 4, 5]).values_list('external_id', 'id')) == {
+            external_id: ids[external_id] for external_id in [2, 3, 4, 5]}
+        assert ProductInfo.objects.get(external_id=2).price == 5000
+        assert ProductParameter.objects.get(product_info__external_id=3, parameter__name='Цвет').value == 'белый'
+        assert not ProductInfo.objects.filter(external_id=1).exists()
+        assert ProductParameter.objects.filter(product_info__external_id=6).count() == 2
+
+    def post_price_list(self, data, **params):
+        """
+        Метод отправляет прайс-лист в PartnerUpdate, выполняя задачу импорта синхронно
+        (поэтому бюджет запросов к БД к такому запросу не применяется).
+        """
+
+        stream = yaml.dump(data, allow_unicode=True).encode()
+        with patch('shopmanager.tasks.get') as get, override_settings(QUERY_BUDGET=None), \
+                patch.object(do_import, 'apply_async', side_effect=lambda args, **kwargs: do_import.apply(args)):
+            get.return_value.__enter__.return_value.raw = BytesIO(stream)
+            return self.client.post(self.partner_update_url, {'user_register_url': self.price_list_url, **params})
+
+    def test_importer_rejects_invalid_items_in_batches(self):
+        """
+        Проверка того, что некорректные товары отклоняются в своей порции,
+        а остальные товары всех порций импортируются.
+        """
+
+        data = make_price_list(10)
+        data['goods'][3]['price'] = -1
+        data['goods'][7].pop('name')
+        importer = PriceListImporter(self.user.id, batch_size=3)
+        stats = importer.run(data)
+
+        assert (stats['created'], stats['rejected']) == (8, 2)
+        assert {error['id'] for error in importer.errors} == {4, 8}
+        assert importer.processed == 10
+        assert sorted(ProductInfo.objects.values_list('external_id', flat=True)) == [1, 2, 3, 5, 6, 7, 9, 10]
+
+    def test_incremental_importer_keeps_rejected_items(self):
+        """
+        Проверка того, что инкрементальный импорт не удаляет позиции, товары которых не прошли проверку.
+        """
+
+        PriceListImporter(self.user.id).run(make_price_list(3))
+        data = make_price_list(3)
+        data['goods'][0]['quantity'] = 'много'
+        stats = IncrementalPriceListImporter(self.user.id).run(data)
+
+        assert (stats['rejected'], stats['deleted'], stats['unchanged']) == (1, 0, 2)
+        assert ProductInfo.objects.count() == 3
+
+    def test_partner_update(self):
+        """
+        Проверка корректной работы контроллеров PartnerUpdate и PartnerUpdateStatus:
+        импорт ставится в очередь, а по идентификатору задачи доступны её статус и сводка изменений.
+        """
+
+        response = self.post_price_list(make_price_list(3))
+
+        assert response.status_code == 202
+        assert response.json()['Status'] is True
+        assert ProductInfo.objects.filter(shop__user_id=self.user.id).count() == 3
+
+        status_url = reverse('shopmanager:partner-update-status', args=[response.json()['Job']])
+        response = self.client.get(status_url)
+
+        assert response.status_code == 200
+        assert response.data['state'] == 'done'
+        assert response.data['processed'] == 3
+        assert response.data['result']['created'] == 3
+        assert response.data['rows_per_second'] is not None
+
+    def test_partner_update_incremental(self):
+        """
+        Проверка корректной работы контроллера PartnerUpdate с параметром incremental.
+        """
+
+        self.post_price_list(make_price_list(3))
+        response = self.post_price_list(make_price_list(4), incremental='true')
+
+        job = ImportJob.objects.get(id=response.json()['Job'])
+        assert job.incremental is True
+        assert (job.result['created'], job.result['unchanged']) == (1, 3)
+
+    def test_importer_accepts_streamed_csv(self):
+        """
+        Проверка импорта прайс-листа в формате CSV: товары передаются импортеру итератором,
+        а категории создаются по колонке category_name.
+        """
+
+        stream = BytesIO('shop,id,category,category_name,model,name,price,price_rrc,quantity,param:Цвет\n'
+                         'TestShop,1,7,Телефоны,m1,Телефон 1,100,120,5,черный\n'
+                         'TestShop,2,7,Телефоны,m2,Телефон 2,200,220,5,\n'.encode())
+        stats = PriceListImporter(self.user.id, batch_size=1).run(read_feed(stream, 'csv'))
+
+        shop = Shop.objects.get(user_id=self.user.id)
+        assert (stats['created'], stats['categories']) == (2, 1)
+        assert list(shop.categories.values_list('name', flat=True)) == ['Телефоны']
+        assert ProductParameter.objects.filter(product_info__shop_id=shop.id).count() == 1
+
+    def test_importer_rejects_malformed_rows(self):
+        """
+        Проверка того, что некорректные строки CSV и JSON-lines отклоняются по одной,
+        а остальные товары прайс-листа импортируются.
+        """
+
+        stream = BytesIO('shop,id,category,category_name,model,name,price,price_rrc,quantity\n'
+                         'TestShop,1,7,Телефоны,m1,Телефон 1,100,120,5\n'
+                         'TestShop,2,7,Телефоны,m2,Телефон 2,abc,220,5\n'
+                         'TestShop,3,7,Телефоны,m3,Телефон 3,300,320,\n'.encode())
+        importer = PriceListImporter(self.user.id)
+        stats = importer.run(read_feed(stream, 'csv'))
+
+        assert (stats['created'], stats['rejected']) == (1, 2)
+        assert [error['id'] for error in importer.errors] == ['2', '3']
+
+        stream = BytesIO('{"shop": "TestShop", "categories": [{"id": 7, "name": "Телефоны"}]}\n'
+                         '{"id": 4, "category": 7, "model": "m4", "name": "Телефон 4", '
+                         '"price": 1, "price_rrc": 2, "quantity": 3}\n'
+                         '{"id": 5, "category": 7\n'.encode())
+        importer = PriceListImporter(self.user.id)
+        stats = importer.run(read_feed(stream, 'jsonl'))
+
+        assert (stats['created'], stats['rejected']) == (1, 1)
+        assert importer.errors[0]['error'].startswith('Строка 3:')
+
+    def test_partner_update_failed_job(self):
+        """
+        Проверка статуса задачи импорта в случае, когда прайс-лист не удалось обработать.
+        """
+
+        response = self.post_price_list({'goods': []})
+
+        job = ImportJob.objects.get(id=response.json()['Job'])
+        assert job.state == 'failed'
+        assert job.errors
+
+    def test_partner_update_broker_unavailable(self):
+        """
+        Проверка того, что при недоступном брокере задача импорта отмечается как завершенная с ошибкой,
+        а клиент получает ответ 503.
+        """
+
+        with patch.object(do_import, 'apply_async', side_effect=OperationalError('broker is down')), \
+                self.assertLogs('api_diplom_final.celery', 'ERROR'):
+            response = self.client.post(self.partner_update_url, {'user_register_url': self.price_list_url})
+
+        assert response.status_code == 503
+        job = ImportJob.objects.get(id=response.json()['Job'])
+        assert (job.state, job.task_id) == ('failed', '')
+
+    def test_partner_update_status_other_user(self):
+        """
+        Проверка того, что статус задачи импорта недоступен другим пользователям.
+        """
+
+        other = User.objects.create(email='other@gmail.com', type='shop', is_active=True)
+        job = ImportJob.objects.create(user_id=other.id, url=self.price_list_url)
+
+        response = self.client.get(reverse('shopmanager:partner-update-status', args=[job.id]))
+
+        assert response.status_code == 404
+
+    def test_partner_update_buyer_forbidden(self):
+        """
+        Проверка корректной работы контроллера PartnerUpdate в случае,
+        когда запрос выполнен пользователем с типом 'buyer'.
+        """
+
+        self.user.type = 'buyer'
+        self.user.save()
+
+        response = self.client.post(self.partner_update_url, {'user_register_url': self.price_list_url})
+
+        assert response.status_code == 403
+        assert response.json()['Status'] is False
+
+
+class PartnerExportTests(ShopUserMixin, APITestCase):
+    """
+    Класс для тестирования выгрузки прайс-листа поставщика.
+    """
+
+    partner_export_url = reverse('shopmanager:partner-export')
+    goods_count = 7
+
+    def export(self, feed_format):
+        response = self.client.get(self.partner_export_url, {'feed_format': feed_format})
+        assert response.status_code == 200
+        return b''.join(response.streaming_content)
+
+    def assert_round_trip(self, content, feed_format):
+        feed = read_feed(BytesIO(content), feed_format)
+        goods = [clean_item(item) for item in feed['goods']]
+
+        assert feed['shop'] == self.price_list['shop']
+        assert [item['id'] for item in goods] == [item['id'] for item in self.price_list['goods']]
+        assert [item['price'] for item in goods] == [item['price'] for item in self.price_list['goods']]
+        assert goods[0]['parameters'] == {'Цвет': 'черный', 'Диагональ (дюйм)': '6.5'}
+
+    def test_export_yaml(self):
+        """
+        Проверка выгрузки прайс-листа в формате YAML: результат читается тем же парсером,
+        что используется при импорте.
+        """
+
+        content = self.export('yaml')
+        self.assert_round_trip(content, 'yaml')
+        assert yaml.safe_load(content)['categories'] == sorted(self.price_list['categories'], key=lambda c: c['id'])
+
+    def test_export_csv_and_jsonl(self):
+        """
+        Проверка выгрузки прайс-листа в форматах CSV и JSON-lines.
+        """
+
+        self.assert_round_trip(self.export('csv'), 'csv')
+        self.assert_round_trip(self.export('jsonl'), 'jsonl')
+
+    def test_export_query_count_does_not_depend_on_goods_count(self):
+        """
+        Проверка того, что количество запросов при выгрузке зависит от количества порций, а не позиций.
+        """
+
+        shop = Shop.objects.get(user_id=self.user.id)
+        with CaptureQueriesContext(connection) as context:
+            list(PriceListExporter(shop, chunk_size=3).export('yaml'))
+
+        # Категории, по два запроса на каждую из трех порций и завершающий пустой запрос.
+        assert len(context.captured_queries) == 1 + 3 * 2 + 1
+
+    def test_export_unknown_format(self):
+        """
+        Проверка выгрузки прайс-листа в неизвестном формате.
+        """
+
+        response = self.client.get(self.partner_export_url, {'feed_format': 'xml'})
+
+        assert response.json()['Status'] is False
+
+    def test_export_job(self):
+        """
+        Проверка выгрузки прайс-листа в файл задачей Celery и получения файла по идентификатору задачи.
+        """
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), \
+                patch.object(do_export, 'apply_async', side_effect=lambda args, **kwargs: do_export.apply(args)):
+            response = self.client.post(self.partner_export_url, {'feed_format': 'csv'})
+            assert response.status_code == 202
+
+            status_url = reverse('shopmanager:partner-export-status', args=[response.json()['Job']])
+            response = self.client.get(status_url)
+            assert response.data['state'] == 'done'
+            assert response.data['processed'] == 7
+
+            response = self.client.get(status_url, {'download': 1})
+            assert response.status_code == 200
+            self.assert_round_trip(b''.join(response.streaming_content), 'csv')
+            response.close()
+
+
+class ProductCatalogTests(ShopUserMixin, APITestCase):
+    """
+    Класс для тестирования каталога товаров, построенного на денормализованной таблице ProductIndex.
+    """
+
+    products_url = reverse('shopmanager:products-list')
+    partner_state_url = reverse('shopmanager:partner-state')
+
+    goods_count = 6
+
+    def test_catalog_matches_product_info_serializer(self):
+        """
+        Проверка того, что каталог возвращает данные в том же формате, что и ProductInfoSerializer.
+        """
+
+        response = self.client.get(self.products_url)
+
+        product_infos = ProductInfo.objects.order_by('id')[:5]
+        assert response.status_code == 200
+        assert response.json()['results'] == ProductInfoSerializer(product_infos, many=True).data
+
+    def test_fast_json_renderer_matches_json_renderer(self):
+        """
+        Проверка того, что быстрый JSON-рендерер формирует тот же ответ, что и JSONRenderer,
+        для каждой доступной библиотеки, в том числе для дат, Decimal и нестроковых ключей.
+        """
+
+        data = {'results': ProductInfoSerializer(ProductInfo.objects.order_by('id'), many=True).data,
+                'moment': timezone.now(), 'amount': Decimal('10.50'), 'ids': {1: 'Тест/1'}, 'tags': ('a', 'b')}
+        expected = JSONRenderer().render(data)
+
+        assert available_backends()
+        for backend in available_backends():
+            with patch.object(FastJSONRenderer, 'backend', backend):
+                assert FastJSONRenderer().render(data) == expected
+
+        indented = FastJSONRenderer().render(data, 'application/json; indent=2')
+        assert indented == JSONRenderer().render(data, 'application/json; indent=2')
+
+        response = self.client.get(self.products_url, HTTP_ACCEPT='application/json')
+        assert response['Content-Type'] == 'application/json'
+
+    def test_catalog_filters(self):
+        """
+        Проверка фильтрации каталога по магазину и категории.
+        """
+
+        shop = Shop.objects.get(user_id=self.user.id)
+
+        assert len(self.search(category_id=15)['results']) == 3
+        assert len(self.search(shop_id=shop.id)['results']) == 6
+        assert len(self.search(shop_id=shop.id + 1)['results']) == 0
+
+    def test_catalog_query_count(self):
+        """
+        Проверка того, что выдача страницы каталога не зависит от количества товаров
+        и выполняется без дополнительных запросов на каждую позицию.
+        """
+
+        self.client.get(self.products_url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.products_url)
+        small = len(context.captured_queries)
+
+        PriceListImporter(self.user.id).run(make_price_list(40))
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.products_url)
+
+        assert len(context.captured_queries) == small
+
+    def test_catalog_cursor_pagination(self):
+        """
+        Проверка постраничной выдачи каталога по курсору: страницы не пересекаются,
+        последняя страница не содержит ссылки на следующую, размер страницы ограничен MAX_PAGE_SIZE.
+        """
+
+        first = self.client.get(self.products_url, {'page_size': 4}).json()
+        second = self.client.get(first['next']).json()
+
+        ids = [item['id'] for item in first['results'] + second['results']]
+        assert 'count' not in first
+        assert ids == list(ProductInfo.objects.order_by('id').values_list('id', flat=True))
+        assert second['next'] is None
+        assert second['previous'] is not None
+
+        cache.clear()
+        with patch.object(ProductCursorPagination, 'max_page_size', 2):
+            assert len(self.client.get(self.products_url, {'page_size': 4}).json()['results']) == 2
+
+    def test_catalog_cursor_query_count(self):
+        """
+        Проверка того, что получение дальней страницы каталога выполняется тем же количеством запросов,
+        что и первой, и без подсчета общего количества товаров.
+        """
+
+        PriceListImporter(self.user.id).run(make_price_list(40))
+        self.client.get(self.products_url, {'page_size': 1})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.products_url, {'page_size': 5})
+        first_page = len(context.captured_queries)
+
+        while response.json()['next']:
+            url = response.json()['next']
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url)
+
+        assert len(context.captured_queries) == first_page
+        assert not any('COUNT(' in query['sql'] for query in context.captured_queries)
+
+    def test_partner_state_updates_catalog(self):
+        """
+        Проверка того, что отключение приема заказов магазином скрывает его товары из каталога.
+        """
+
+        assert len(self.search()['results']) == 6
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.partner_state_url, {'state': 'off'})
+
+        assert response.json()['Status'] is True
+        assert ProductIndex.objects.filter(shop_state=True).count() == 0
+        assert self.search()['results'] == []
+
+    def test_incremental_import_updates_catalog(self):
+        """
+        Проверка того, что инкрементальный импорт обновляет записи каталога измененных позиций.
+        """
+
+        data = make_price_list(5)
+        data['goods'][0]['price'] = 1
+        data['goods'][1]['parameters']['Цвет'] = 'белый'
+        IncrementalPriceListImporter(self.user.id).run(data)
+
+        assert ProductIndex.objects.count() == 5
+        assert ProductIndex.objects.get(product_info__external_id=1).price == 1
+        assert {'parameter': 'Цвет', 'value': 'белый'} in ProductIndex.objects.get(
+            product_info__external_id=2).parameters
+
+
+    def import_searchable_catalog(self):
+        data = make_price_list(4)
+        data['goods'][0].update(name='Смартфон Apple iPhone XS Max', model='apple/iphone/xs-max')
+        data['goods'][1].update(name='Смартфон Samsung Galaxy', model='samsung/galaxy')
+        data['goods'][1]['parameters'] = {'Цвет': 'белый', 'Диагональ (дюйм)': 5.8}
+        data['goods'][2]['parameters'] = {'Цвет': 'белый', 'Диагональ (дюйм)': 6.1}
+        PriceListImporter(self.user.id).run(data)
+
+    def search(self, **params):
+        response = self.client.get(self.products_url, {'page_size': 100, **params})
+        assert response.status_code == 200
+        return response.json()
+
+    def test_full_text_search(self):
+        """
+        Проверка полнотекстового поиска по названию продукта и модели, в том числе по префиксу слова.
+        """
+
+        self.import_searchable_catalog()
+
+        assert [item['product']['name'] for item in self.search(q='iphone')['results']] == [
+            'Смартфон Apple iPhone XS Max']
+        assert len(self.search(q='смартф')['results']) == 2
+        assert len(self.search(q='galaxy смартфон')['results']) == 1
+        assert len(self.search(q='nokia')['results']) == 0
+
+    def test_facet_and_price_filters(self):
+        """
+        Проверка фильтров по значениям параметров, числовым диапазонам параметров и цене.
+        """
+
+        self.import_searchable_catalog()
+
+        assert len(self.search(facet='Цвет=белый')['results']) == 2
+        assert len(self.search(facet=['Цвет=белый', 'Диагональ (дюйм)>=6'])['results']) == 1
+        assert len(self.search(facet='Диагональ (дюйм)<6')['results']) == 1
+        assert len(self.search(price_min=1001, price_max=1002)['results']) == 2
+
+    def test_facet_counts(self):
+        """
+        Проверка того, что ответ поиска с параметром facets=1 содержит количество товаров по значениям
+        параметров и диапазон цен, а без него фасеты не считаются.
+        """
+
+        self.import_searchable_catalog()
+
+        facets = self.search(q='смартфон', facets=1)['facets']
+
+        assert facets['parameters']['Цвет'] == [{'value': 'белый', 'count': 1}, {'value': 'черный', 'count': 1}]
+        assert facets['price'] == {'min': 1000, 'max': 1001}
+        assert facets['partial'] is False
+        assert 'facets' not in self.search(q='смартфон')
+        assert 'facets' not in self.search()
+
+    @override_settings(FACET_SCAN_LIMIT=2)
+    def test_facet_counts_scan_limit(self):
+        """
+        Проверка того, что фасеты считаются не более чем по FACET_SCAN_LIMIT найденным товарам
+        и ответ отмечается как приблизительный.
+        """
+
+        self.import_searchable_catalog()
+
+        facets = self.search(facets=1)['facets']
+
+        assert sum(value['count'] for value in facets['parameters']['Цвет']) == 2
+        assert facets['partial'] is True
+
+    def test_invalid_facet(self):
+        """
+        Проверка ответа на некорректный фильтр по параметру.
+        """
+
+        response = self.client.get(self.products_url, {'facet': 'Диагональ>=много'})
+
+        assert response.status_code == 400
+        assert response.json()['Status'] is False
+
+
+class CatalogCacheTests(ShopUserMixin, APITestCase):
+    """
+    Класс для тестирования кэширования каталога, категорий и магазинов с инвалидацией по версиям.
+    """
+
+    products_url = reverse('shopmanager:products-list')
+    categories_url = reverse('shopmanager:categories')
+    shops_url = reverse('shopmanager:shops')
+    partner_state_url = reverse('shopmanager:partner-state')
+    cache_stats_url = reverse('shopmanager:cache-stats')
+
+    goods_count = 6
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        assert response.status_code == 200
+        return response
+
+    def test_repeated_request_served_from_cache(self):
+        """
+        Проверка того, что повторный запрос каталога отдается из кэша без запросов к таблицам каталога.
+        """
+
+        first = self.get(self.products_url)
+        with CaptureQueriesContext(connection) as context:
+            second = self.get(self.products_url)
+
+        assert first['X-Cache'] == 'MISS'
+        assert second['X-Cache'] == 'HIT'
+        assert second.json() == first.json()
+        assert not any('shopmanager_productindex' in query['sql'] for query in context.captured_queries)
+
+    def test_incremental_import_invalidates_affected_keys(self):
+        """
+        Проверка того, что импорт делает недействительными только ответы затронутых магазина и категорий.
+        """
+
+        for params in ({}, {'category_id': 224}, {'category_id': 15}):
+            self.get(self.products_url, params)
+
+        data = make_price_list(6)
+        data['goods'][0]['price'] = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            IncrementalPriceListImporter(self.user.id).run(data)
+
+        assert self.get(self.products_url)['X-Cache'] == 'MISS'
+        assert self.get(self.products_url, {'category_id': 224})['X-Cache'] == 'MISS'
+        assert self.get(self.products_url, {'category_id': 15})['X-Cache'] == 'HIT'
+        assert self.get(self.products_url).json()['results'][0]['price'] == 1
+
+    def test_invalidation_does_not_wait_for_event_relay(self):
+        """
+        Проверка того, что импорт и изменение статуса магазина делают недействительными ответы
+        в своем процессе сразу после фиксации, до обработки событий из очереди.
+        """
+
+        self.get(self.products_url)
+        self.get(self.shops_url)
+
+        data = make_price_list(6)
+        data['goods'][0]['price'] = 1
+        with patch('eventmanager.outbox.schedule_relay'):
+            with self.captureOnCommitCallbacks(execute=True):
+                IncrementalPriceListImporter(self.user.id).run(data)
+            assert self.get(self.products_url).json()['results'][0]['price'] == 1
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(self.partner_state_url, {'state': 'off'})
+            assert self.get(self.shops_url).json()['results'] == []
+
+    def test_partner_state_invalidates_shop_list(self):
+        """
+        Проверка того, что изменение статуса магазина обновляет кэшированный список магазинов,
+        а список категорий остается в кэше.
+        """
+
+        assert len(self.get(self.shops_url).json()['results']) == 1
+        self.get(self.categories_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.partner_state_url, {'state': 'off'})
+
+        assert self.get(self.shops_url).json()['results'] == []
+        assert self.get(self.categories_url)['X-Cache'] == 'HIT'
+
+    def test_new_categories_invalidate_category_list(self):
+        """
+        Проверка того, что создание категорий при импорте обновляет кэшированный список категорий.
+        """
+
+        assert len(self.get(self.categories_url).json()['results']) == 2
+
+        data = make_price_list(1, shop_name='OtherShop')
+        data['categories'].append({'id': 3, 'name': 'Ноутбуки'})
+        other = User.objects.create(email='other@gmail.com', type='shop', is_active=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            PriceListImporter(other.id).run(data)
+
+        assert len(self.get(self.categories_url).json()['results']) == 3
+
+    def test_cache_stats(self):
+        """
+        Проверка счетчиков попаданий и промахов кэша и доступа к ним только для администраторов.
+        """
+
+        self.get(self.products_url)
+        self.get(self.products_url)
+
+        assert self.client.get(self.cache_stats_url).status_code == 403
+        self.user.is_staff = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        assert self.get(self.cache_stats_url).json() == {'hits': 1, 'misses': 1}
+
+
+class PriceListFeedTests(SimpleTestCase):
+    """
+    Класс для тестирования потокового чтения прайс-листов.
+    """
+
+    def test_yaml_goods_are_streamed(self):
+        """
+        Проверка того, что раздел goods YAML-файла читается генератором,
+        если разделы shop и categories расположены перед ним.
+        """
+
+        data = make_price_list(3)
+        stream = yaml.dump({'shop': data['shop'], 'categories': data['categories']}, allow_unicode=True)
+        stream += yaml.dump({'goods': data['goods']}, allow_unicode=True)
+        feed = read_feed(BytesIO(stream.encode()))
+
+        assert feed['shop'] == 'TestShop'
+        assert feed['categories'] == data['categories']
+        assert not isinstance(feed['goods'], list)
+        assert list(feed['goods']) == data['goods']
+
+    def test_yaml_goods_before_shop(self):
+        """
+        Проверка чтения YAML-файла, в котором раздел goods расположен раньше раздела shop.
+        """
+
+        data = make_price_list(2)
+        feed = read_feed(BytesIO(yaml.dump(data, allow_unicode=True, sort_keys=True).encode()))
+
+        assert feed['shop'] == 'TestShop'
+        assert list(feed['goods']) == data['goods']
+
+    def test_jsonl_feed(self):
+        """
+        Проверка чтения прайс-листа в формате JSON-lines.
+        """
+
+        stream = BytesIO('{"shop": "TestShop", "categories": [{"id": 1, "name": "Телефоны"}]}\n'
+                         '{"id": 1, "category": 1, "model": "m", "name": "Телефон", "price": 1, '
+                         '"price_rrc": 2, "quantity": 3, "parameters": {}}\n'.encode())
+        feed = read_feed(stream, 'jsonl')
+
+        assert feed['shop'] == 'TestShop'
+        assert [item['name'] for item in feed['goods']] == ['Телефон']
+
+    def test_csv_row_longer_than_header(self):
+        """
+        Проверка того, что строка CSV-файла со значениями сверх заголовка возвращается как некорректная
+        с номером строки, а остальные строки читаются.
+        """
+
+        stream = BytesIO('shop,id,category,model,name,price,price_rrc,quantity\n'
+                         'TestShop,1,1,m,Телефон,1,2,3,лишнее,еще\n'
+                         'TestShop,2,1,m,Чехол,1,2,3\n'.encode())
+        invalid, item = read_feed(stream, 'csv')['goods']
+
+        assert isinstance(invalid, InvalidRow)
+        assert invalid.line == 2
+        assert item['name'] == 'Чехол'
+
+    def test_feed_without_shop(self):
+        """
+        Проверка того, что прайс-лист без раздела shop не принимается.
+        """
+
+        with self.assertRaises(FeedError):
+            read_feed(BytesIO(b'goods: []\n'))
+
+    def test_detect_format(self):
+        """
+        Проверка определения формата прайс-листа по ссылке.
+        """
+
+        assert detect_format('http://example.com/shop.csv') == 'csv'
+        assert detect_format('http://example.com/shop.jsonl?token=1') == 'jsonl'
+        assert detect_format('http://example.com/shop.yaml') == 'yaml'
+
+
+class CatalogQueryCountTests(QueryCountMixin, ShopUserMixin, APITestCase):
+    """
+    Класс для проверки того, что количество запросов к эндпоинтам shopmanager не зависит от объема каталога.
+    """
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(do_import, 'apply_async')
+        patcher.start().return_value.id = 'task-id'
+        self.addCleanup(patcher.stop)
+        self.client.get(reverse('shopmanager:shops'))
+
+    def grow(self, size):
+        other = User.objects.create(email=f'shop{size}@gmail.com', type='shop', is_active=True)
+        PriceListImporter(other.id).run(make_price_list(size, shop_name=f'Shop {size}'))
+        PriceListImporter(self.user.id).run(make_price_list(size))
+
+    def requests(self, size):
+        products_url = reverse('shopmanager:products-list')
+        product_info = ProductInfo.objects.filter(shop__user_id=self.user.id).first()
+        job = ImportJob.objects.create(user=self.user, url='http://example.com/shop.yaml', state='done')
+        return {
+            'categories': lambda: self.client.get(reverse('shopmanager:categories')),
+            'shops': lambda: self.client.get(reverse('shopmanager:shops')),
+            'products': lambda: self.client.get(products_url, {'page_size': 100}),
+            'products search': lambda: self.client.get(products_url, {
+                'q': 'Товар', 'facet': 'Цвет=черный', 'price_min': 1000, 'page_size': 100}),
+            'product': lambda: self.client.get(reverse('shopmanager:products-detail', args=[product_info.id])),
+            'partner state': lambda: self.client.get(reverse('shopmanager:partner-state')),
+            'partner state update': lambda: self.client.post(reverse('shopmanager:partner-state'),
+                                                             {'state': 'true'}),
+            'partner update': lambda: self.client.post(reverse('shopmanager:partner-update'),
+                                                       {'user_register_url': 'http://example.com/shop.yaml'}),
+            'partner update status': lambda: self.client.get(
+                reverse('shopmanager:partner-update-status', args=[job.id])),
+        }
+
+
+class QueryBudgetMiddlewareTests(APITestCase):
+    """
+    Класс для тестирования подсчета запросов к БД и бюджета запросов QueryBudgetMiddleware.
+    """
+
+    categories_url = reverse('shopmanager:categories')
+
+    def setUp(self):
+        cache.clear()
+        return super().setUp()
+
+    def test_query_count_header(self):
+        """
+        Проверка того, что количество запросов к БД возвращается в заголовке X-Query-Count.
+        """
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.categories_url)
+
+        assert response['X-Query-Count'] == str(len(context.captured_queries))
+
+    @override_settings(QUERY_BUDGET=0)
+    def test_budget_exceeded(self):
+        """
+        Проверка того, что превышение бюджета записывается в лог, а в строгом режиме завершается ошибкой.
+        Бюджет представления (атрибут query_budget) заменяет общий.
+        """
+
+        with self.assertLogs('api_diplom_final.middleware', 'WARNING') as logs:
+            assert self.client.get(self.categories_url).status_code == 200
+        assert f'GET {self.categories_url}' in logs.output[0]
+
+        cache.clear()
+        with override_settings(QUERY_BUDGET_STRICT=True):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(self.categories_url)
+
+            cache.clear()
+            with patch.object(CategoryView, 'query_budget', 10, create=True):
+                assert self.client.get(self.categories_url).status_code == 200
+
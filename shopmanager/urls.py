@@ -1,7 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from shopmanager.views import CategoryView, ShopView, ProductInfoViewSet, PartnerState, PartnerUpdate
+from shopmanager.views import CategoryView, ShopView, ProductInfoViewSet, PartnerState, PartnerUpdate, \
+    PartnerUpdateStatus, PartnerExport, PartnerExportStatus, CacheStats
 
 
 app_name = 'shopmanager'
@@ -12,6 +13,10 @@ urlpatterns = [
     path('categories', CategoryView.as_view(), name='categories'),
     path('shops', ShopView.as_view(), name='shops'),
     path('partner/update', PartnerUpdate.as_view(), name='partner-update'),
+    path('partner/update/<int:job_id>', PartnerUpdateStatus.as_view(), name='partner-update-status'),
+    path('partner/export', PartnerExport.as_view(), name='partner-export'),
+    path('partner/export/<int:job_id>', PartnerExportStatus.as_view(), name='partner-export-status'),
     path('partner/state', PartnerState.as_view(), name='partner-state'),
+    path('cache/stats', CacheStats.as_view(), name='cache-stats'),
     path('', include(router.urls)),
 ]
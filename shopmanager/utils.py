@@ -0,0 +1,12 @@
+from itertools import islice
+
+
+def chunked(iterable, size):
+    """ Генератор разбивает последовательность на списки длиной не более size. """
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -1,20 +1,33 @@
+import os
 from distutils.util import strtobool
-from yaml import load as load_yaml, Loader
-from requests import get
+from celery.result import AsyncResult
 
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
+from django.db import transaction
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, FileResponse
+from django.utils import timezone
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.viewsets import ReadOnlyModelViewSet
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from drf_spectacular.utils import extend_schema
 
-from shopmanager.models import Shop, Category, Product, ProductInfo, Parameter, ProductParameter
-from shopmanager.serializers import CategorySerializer, ShopSerializer, ProductInfoSerializer
+from api_diplom_final.celery import enqueue
+from api_diplom_final.pagination import ProductCursorPagination
+from eventmanager.outbox import publish
+from eventmanager.registry import SHOP_STATE_CHANGED
+from shopmanager.cache import cached_response, invalidate_catalog, shop_category_ids, scope, cache_stats
+from shopmanager.exporter import PriceListExporter, EXPORT_CONTENT_TYPES
+from shopmanager.feeds import FEED_READERS, detect_format
+from shopmanager.models import Shop, Category, ImportJob, ExportJob, ProductIndex
+from shopmanager.readers import CATALOG_FIELDS, catalog_rows
+from shopmanager.search import set_shop_state, search_products, parse_facet, facet_counts, SearchError
+from shopmanager.serializers import CategorySerializer, ShopSerializer, ImportJobSerializer, ExportJobSerializer, \
+    ProductIndexSerializer
+from shopmanager.tasks import do_import, do_export
 
 
 class CategoryView(ListAPIView):
@@ -24,10 +37,9 @@ class CategoryView(ListAPIView):
 
     @extend_schema(request=CategorySerializer, responses={200: CategorySerializer})
     def get(self, request):
-        """ Метод возвращает список категорий. """
+        """ Метод возвращает список категорий (ответ кэшируется до изменения списка категорий). """
 
-        category_list = super().get(request)
-        return category_list
+        return cached_response(request, [scope('categories')], lambda: super(CategoryView, self).get(request))
 
 
 class ShopView(ListAPIView):
@@ -35,23 +47,34 @@ class ShopView(ListAPIView):
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
 
+    def get(self, request, *args, **kwargs):
+        """ Метод возвращает список магазинов (ответ кэшируется до изменения списка или статуса магазинов). """
+
+        return cached_response(request, [scope('shops')], lambda: super(ShopView, self).get(request, *args, **kwargs))
+
 
-class ProductInfoViewSet(ModelViewSet):
-    """ Класс для поиска товаров. """
+class ProductInfoViewSet(ReadOnlyModelViewSet):
+    """
+    Класс для поиска товаров.
+    Каталог читается из денормализованной таблицы ProductIndex одним запросом по индексу, без соединений,
+    и выдается постранично по курсору (параметры cursor и page_size).
+    """
 
     throttle_scope = 'anon'
-    serializer_class = ProductInfoSerializer
+    serializer_class = ProductIndexSerializer
+    pagination_class = ProductCursorPagination
     permission_classes = [IsAuthenticated]
-    ordering = ('product')
 
-    @extend_schema(request=ProductInfoSerializer, responses={200: ProductInfoSerializer})
-    def get(self):
+    def get_queryset(self):
         """
         Метод принимает в качестве аргументов параметры для поиска
         и возвращает соответствующие им товары.
+        Параметры: shop_id, category_id, q (полнотекстовый поиск по названию и модели),
+        facet (фильтр по параметру вида "Цвет=черный" или "Диагональ (дюйм)>=6", можно указать несколько),
+        price_min и price_max (диапазон цен).
         """
 
-        query = Q(shop__state=True)
+        query = Q(shop_state=True)
         shop_id = self.request.query_params.get('shop_id')
         category_id = self.request.query_params.get('category_id')
 
@@ -59,15 +82,52 @@ class ProductInfoViewSet(ModelViewSet):
             query = query & Q(shop_id=shop_id)
 
         if category_id:
-            query = query & Q(product__category_id=category_id)
-
-        queryset = ProductInfo.objects.filter(
-            query).select_related(
-            'shop', 'product__category').prefetch_related(
-            'product_parameters__parameter').distinct()
+            query = query & Q(category_id=category_id)
+
+        queryset = ProductIndex.objects.filter(query).order_by('product_info_id')
+
+        try:
+            facets = [parse_facet(facet) for facet in self.request.query_params.getlist('facet')]
+            price_min = self.request.query_params.get('price_min')
+            price_max = self.request.query_params.get('price_max')
+            queryset = search_products(queryset,
+                                       text=self.request.query_params.get('q'),
+                                       facets=facets,
+                                       price_min=int(price_min) if price_min else None,
+                                       price_max=int(price_max) if price_max else None)
+        except ValueError as error:
+            raise SearchError(str(error))
 
         return queryset
 
+    def handle_exception(self, exc):
+        if isinstance(exc, SearchError):
+            return Response({'Status': False, 'Errors': str(exc)}, status=400)
+        return super().handle_exception(exc)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Метод возвращает страницу каталога. Только при указании параметра facets=1 ответ дополнительно
+        содержит количество товаров по значениям параметров и диапазон цен (два дополнительных запроса
+        к БД по первым FACET_SCAN_LIMIT найденным товарам, см. facet_counts). Ответ кэшируется
+        с версиями магазина и категории из фильтров (без фильтров - с версией всего каталога).
+        """
+
+        return cached_response(request, self.cache_scopes(), lambda: self.build_list(request, *args, **kwargs))
+
+    def cache_scopes(self):
+        scopes = [scope(name, self.request.query_params[f'{name}_id']) for name in ('shop', 'category')
+                  if self.request.query_params.get(f'{name}_id')]
+        return scopes or [scope('catalog')]
+
+    def build_list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()).values(*CATALOG_FIELDS))
+        response = self.get_paginated_response(catalog_rows(page))
+        with_facets = request.query_params.get('facets', '').lower() in ('1', 'true', 'yes')
+        if with_facets and isinstance(response.data, dict):
+            response.data['facets'] = facet_counts(self.filter_queryset(self.get_queryset()))
+        return response
+
 
 class PartnerUpdate(APIView):
     """ Класс для обновления прайса от поставщика. """
@@ -77,7 +137,11 @@ class PartnerUpdate(APIView):
     def post(self, request, *args, **kwargs):
         """
         Метод post проверяет авторизацию пользователя, его тип (требуется тип 'shop'),
-        после чего создает обновленный прайс-лист.
+        после чего ставит в очередь Celery задачу импорта прайс-листа и возвращает её идентификатор.
+        При указании параметра incremental прайс-лист обновляется инкрементально:
+        изменяются только отличающиеся позиции.
+        Параметр feed_format (yaml, csv или jsonl) задает формат прайс-листа,
+        по умолчанию формат определяется по расширению файла в ссылке.
         """
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False,
@@ -96,36 +160,177 @@ class PartnerUpdate(APIView):
                 return JsonResponse({'Status': False,
                                      'Error': str(e)})
             else:
-                stream = get(url).content
-                data = load_yaml(stream, Loader=Loader)
-                shop, _ = Shop.objects.get_or_create(name=data['shop'], user_id=request.user.id)
-                for category in data['categories']:
-                    category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                    category_object.shops.add(shop.id)
-                    category_object.save()
-                ProductInfo.objects.filter(shop_id=shop.id).delete()
-                for item in data['goods']:
-                    product, _ = Product.objects.get_or_create(name=item['name'], category_id=item['category'])
-
-                    product_info = ProductInfo.objects.create(product_id=product.id,
-                                                              external_id=item['id'],
-                                                              model=item['model'],
-                                                              price=item['price'],
-                                                              price_rrc=item['price_rrc'],
-                                                              quantity=item['quantity'],
-                                                              shop_id=shop.id)
-                    for name, value in item['parameters'].items():
-                        parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                        ProductParameter.objects.create(product_info_id=product_info.id,
-                                                        parameter_id=parameter_object.id,
-                                                        value=value)
+                try:
+                    incremental = strtobool(request.data.get('incremental', 'false'))
+                except ValueError as error:
+                    return JsonResponse({'Status': False,
+                                         'Errors': str(error)})
 
-                return JsonResponse({'Status': True})
+                feed_format = request.data.get('feed_format') or detect_format(url)
+                if feed_format not in FEED_READERS:
+                    return JsonResponse({'Status': False,
+                                         'Errors': f'Неизвестный формат прайс-листа: {feed_format}'})
+
+                job = ImportJob.objects.create(user_id=request.user.id, url=url, incremental=incremental,
+                                               feed_format=feed_format)
+                return start_job(job, do_import)
 
         return JsonResponse({'Status': False,
                              'Errors': 'Не указаны все необходимые аргументы'})
 
 
+class PartnerUpdateStatus(APIView):
+    """ Класс для получения статуса задачи импорта прайс-листа. """
+
+    throttle_scope = 'user'
+
+    def get(self, request, job_id, *args, **kwargs):
+        """
+        Метод проверяет авторизацию пользователя, его тип (требуется тип 'shop'),
+        после чего возвращает статус задачи импорта: количество обработанных позиций,
+        скорость обработки, ошибки и итоговую сводку изменений.
+        """
+
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Только для магазинов'}, status=403)
+
+        job = ImportJob.objects.filter(id=job_id, user_id=request.user.id).first()
+        if not job:
+            return JsonResponse({'Status': False, 'Errors': 'Задача не найдена'}, status=404)
+
+        return Response(job_status(job, ImportJobSerializer))
+
+
+class PartnerExport(APIView):
+    """ Класс для выгрузки прайс-листа поставщика. """
+
+    throttle_scope = 'user'
+
+    def get(self, request, *args, **kwargs):
+        """
+        Метод проверяет авторизацию пользователя, его тип (требуется тип 'shop'),
+        после чего потоково отдает прайс-лист магазина в формате, указанном в параметре feed_format
+        (yaml, csv или jsonl; по умолчанию yaml).
+        """
+
+        error_response, shop, feed_format = self.check_request(request, request.query_params)
+        if error_response:
+            return error_response
+
+        response = StreamingHttpResponse(PriceListExporter(shop).export(feed_format),
+                                         content_type=EXPORT_CONTENT_TYPES[feed_format])
+        response['Content-Disposition'] = f'attachment; filename="shop-{shop.id}.{feed_format}"'
+        return response
+
+    def post(self, request, *args, **kwargs):
+        """
+        Метод проверяет авторизацию пользователя, его тип (требуется тип 'shop'),
+        после чего ставит в очередь Celery задачу выгрузки прайс-листа в файл
+        и возвращает её идентификатор.
+        """
+
+        error_response, shop, feed_format = self.check_request(request, request.data)
+        if error_response:
+            return error_response
+
+        job = ExportJob.objects.create(user_id=request.user.id, shop_id=shop.id, feed_format=feed_format)
+        return start_job(job, do_export)
+
+    @staticmethod
+    def check_request(request, params):
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403), None, None
+
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Только для магазинов'}, status=403), None, None
+
+        shop = Shop.objects.filter(user_id=request.user.id).first()
+        if not shop:
+            return JsonResponse({'Status': False, 'Errors': 'Магазин не найден'}, status=404), None, None
+
+        feed_format = params.get('feed_format') or 'yaml'
+        if feed_format not in EXPORT_CONTENT_TYPES:
+            return JsonResponse({'Status': False,
+                                 'Errors': f'Неизвестный формат прайс-листа: {feed_format}'}), None, None
+
+        return None, shop, feed_format
+
+
+class PartnerExportStatus(APIView):
+    """ Класс для получения статуса задачи выгрузки прайс-листа и готового файла. """
+
+    throttle_scope = 'user'
+
+    def get(self, request, job_id, *args, **kwargs):
+        """
+        Метод проверяет авторизацию пользователя, его тип (требуется тип 'shop'),
+        после чего возвращает статус задачи выгрузки.
+        При указании параметра download возвращает готовый файл.
+        """
+
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        if request.user.type != 'shop':
+            return JsonResponse({'Status': False, 'Error': 'Только для магазинов'}, status=403)
+
+        job = ExportJob.objects.filter(id=job_id, user_id=request.user.id).first()
+        if not job:
+            return JsonResponse({'Status': False, 'Errors': 'Задача не найдена'}, status=404)
+
+        if request.query_params.get('download'):
+            if job.state != 'done':
+                return JsonResponse({'Status': False, 'Errors': 'Выгрузка еще не завершена'}, status=409)
+            return FileResponse(job.file.open('rb'), as_attachment=True,
+                                filename=os.path.basename(job.file.name),
+                                content_type=EXPORT_CONTENT_TYPES[job.feed_format])
+
+        return Response(job_status(job, ExportJobSerializer))
+
+
+def start_job(job, task):
+    """
+    Функция ставит в очередь Celery задачу task для фоновой задачи job (ImportJob или ExportJob)
+    и возвращает ответ с идентификатором job. Если брокер недоступен, job отмечается как завершенная
+    с ошибкой, а клиент получает ответ 503 и может повторить запрос.
+    """
+
+    jobs = type(job).objects.filter(id=job.id)
+    task_id = enqueue(task, job.id)
+    if task_id is None:
+        error = 'Очередь задач недоступна, повторите запрос позже'
+        jobs.update(state='failed', errors=[{'id': None, 'error': error}], finished_at=timezone.now())
+        return JsonResponse({'Status': False, 'Errors': error, 'Job': job.id}, status=503)
+
+    jobs.update(task_id=task_id)
+    return JsonResponse({'Status': True, 'Job': job.id}, status=202)
+
+
+def job_status(job, serializer_class):
+    """
+    Функция возвращает данные о фоновой задаче (ImportJob или ExportJob).
+    Для выполняющейся задачи количество обработанных позиций берется из result backend Celery,
+    также вычисляется скорость обработки в позициях в секунду.
+    """
+
+    data = serializer_class(job).data
+    if job.state == 'running' and job.task_id:
+        task = AsyncResult(job.task_id)
+        if task.state == 'PROGRESS':
+            data['processed'] = task.info.get('processed', 0)
+
+    data['rows_per_second'] = None
+    if job.started_at:
+        elapsed = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+        if elapsed > 0:
+            data['rows_per_second'] = round(data['processed'] / elapsed, 1)
+
+    return data
+
+
 class PartnerState(APIView):
     """ Класс для работы со статусом поставщика. """
 
@@ -166,7 +371,14 @@ class PartnerState(APIView):
         state = request.data.get('state')
         if state:
             try:
-                Shop.objects.filter(user_id=request.user.id).update(state=strtobool(state))
+                state = strtobool(state)
+                with transaction.atomic():
+                    shop_ids = list(Shop.objects.filter(user_id=request.user.id).values_list('id', flat=True))
+                    Shop.objects.filter(id__in=shop_ids).update(state=state)
+                    set_shop_state(shop_ids, state)
+                    category_ids = sorted(shop_category_ids(shop_ids))
+                    invalidate_catalog(shop_ids=shop_ids, category_ids=category_ids, shops=True)
+                    publish(SHOP_STATE_CHANGED, shop_ids=shop_ids, category_ids=category_ids, state=bool(state))
                 return JsonResponse({'Status': True})
             except ValueError as error:
                 return JsonResponse({'Status': False,
@@ -174,3 +386,14 @@ class PartnerState(APIView):
 
         return JsonResponse({'Status': False,
                              'Errors': 'Не указаны все необходимые аргументы'})
+
+
+class CacheStats(APIView):
+    """ Класс для просмотра счетчиков попаданий и промахов кэша каталога (для администраторов). """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """ Метод возвращает количество попаданий и промахов кэша ответов каталога. """
+
+        return Response(cache_stats())
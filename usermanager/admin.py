@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from usermanager.models import OutgoingEmail
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    """ Класс админки очереди исходящих писем. """
+
+    list_display = ('id', 'email', 'title', 'created_at', 'sent_at', 'attempts')
+    list_filter = ('sent_at',)
+    readonly_fields = ('created_at', 'next_attempt_at', 'sent_at', 'attempts', 'error')
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UsermanagerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'usermanager'
+
+    def ready(self):
+        import usermanager.signals  # noqa: F401
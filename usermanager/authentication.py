@@ -0,0 +1,116 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from usermanager.models import User
+
+TOKEN_KEY = 'auth:token:{}'
+
+
+class LocalTokenCache:
+    """
+    Ограниченный по размеру и времени жизни записей LRU-кэш процесса.
+    Записи хранятся не дольше TOKEN_CACHE_LOCAL_TTL, поэтому изменения, сделанные в других процессах,
+    становятся видны в пределах этого времени.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = LocalTokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_LOCAL_TTL)
+# Хеш пароля и время последнего входа не нужны для обработки запросов и в кэш не попадают:
+# у кэшированного пользователя эти поля отложены и при обращении загружаются из БД.
+USER_FIELDS = [field.attname for field in User._meta.concrete_fields if field.name not in ('password', 'last_login')]
+
+
+def token_cache_key(key):
+    """ Функция возвращает ключ общего кэша для токена (сам токен в ключ не попадает). """
+
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_tokens(keys):
+    """
+    Функция удаляет токены keys из кэша процесса и общего кэша после фиксации текущей транзакции,
+    чтобы параллельный запрос не сохранил в кэш данные, прочитанные до фиксации изменений.
+    """
+
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: delete_tokens(keys))
+
+
+def delete_tokens(keys):
+    local_tokens.delete_many(keys)
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+def invalidate_user_tokens(user_id):
+    """ Функция удаляет из кэшей токены пользователя. """
+
+    invalidate_tokens(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену с кэшированием пользователя.
+
+    Данные пользователя ищутся сначала в LRU-кэше процесса, затем в общем кэше (Redis при CACHE_REDIS_URL),
+    и только при промахе - в БД запросом TokenAuthentication. Для каждого запроса из сохраненных значений
+    создается новый экземпляр User, поэтому изменения request.user в представлениях не попадают в кэш.
+    Кэшируются только активные пользователи и без хеша пароля; записи удаляются после фиксации транзакции
+    при выходе (удалении токена), а также при сохранении пользователя (смена пароля, в том числе сброс,
+    и изменение is_active).
+    """
+
+    def authenticate_credentials(self, key):
+        values = local_tokens.get(key)
+        if values is None:
+            values = cache.get(token_cache_key(key))
+            if values is None:
+                user, _ = super().authenticate_credentials(key)
+                values = tuple(getattr(user, field) for field in USER_FIELDS)
+                cache.set(token_cache_key(key), values, settings.TOKEN_CACHE_TIMEOUT)
+            local_tokens.set(key, values)
+
+        user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+        return user, Token(key=key, user=user)
@@ -143,3 +143,27 @@ class ConfirmEmailToken(models.Model):
 
     def __str__(self):
         return "Password reset token for user {user}".format(user=self.user)
+
+
+class OutgoingEmail(models.Model):
+    """
+    Исходящее письмо (транзакционная очередь). Письма сохраняются в одной транзакции с изменениями,
+    которые их вызвали, и отправляются задачей drain_email_outbox.
+    """
+
+    title = models.CharField(max_length=255, verbose_name='Заголовок')
+    message = models.TextField(verbose_name='Текст')
+    email = models.EmailField(verbose_name='Адрес')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    next_attempt_at = models.DateTimeField(auto_now_add=True, verbose_name='Следующая попытка')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Отправлено')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+
+    class Meta:
+        verbose_name = 'Исходящее письмо'
+        verbose_name_plural = 'Очередь исходящих писем'
+        indexes = [models.Index(fields=['sent_at', 'next_attempt_at'], name='outgoing_email_pending')]
+
+    def __str__(self):
+        return f'{self.email}: {self.title}'
@@ -0,0 +1,28 @@
+from django.db import transaction
+
+from api_diplom_final.celery import enqueue
+from usermanager.models import OutgoingEmail
+from usermanager.tasks import drain_email_outbox
+
+
+def enqueue_emails(payloads):
+    """
+    Функция сохраняет письма payloads (см. api_diplom_final.mail.email_payload) в очередь исходящих писем
+    одним запросом. Письма сохраняются в текущей транзакции, а после ее фиксации запускается задача отправки;
+    если задачу не удалось поставить в очередь, письма отправит периодическая задача relay_outboxes.
+    """
+
+    if not payloads:
+        return
+    OutgoingEmail.objects.bulk_create([OutgoingEmail(**payload) for payload in payloads])
+    transaction.on_commit(schedule_drain)
+
+
+def enqueue_email(title, message, email):
+    """ Функция сохраняет одно письмо в очередь исходящих писем. """
+
+    enqueue_emails([{'title': title, 'message': message, 'email': email}])
+
+
+def schedule_drain():
+    enqueue(drain_email_outbox)
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django_rest_passwordreset.signals import reset_password_token_created
+from rest_framework.authtoken.models import Token
+
+from usermanager.authentication import invalidate_tokens, invalidate_user_tokens
+from usermanager.models import User
+from usermanager.outbox import enqueue_email
+
+
+@receiver(reset_password_token_created)
+def password_reset_token_created(sender, instance, reset_password_token, **kwargs):
+    """ Функция сохраняет в очередь исходящих писем письмо с токеном для сброса пароля. """
+
+    user = reset_password_token.user
+    enqueue_email(f'Сброс пароля пользователя: {user.email}', f'Токен: {reset_password_token.key}', user.email)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    """
+    Функция удаляет из кэша аутентификации токены измененного пользователя
+    (смена пароля, в том числе через сброс, изменение is_active и других данных).
+    """
+
+    if not created:
+        invalidate_user_tokens(instance.id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """ Функция удаляет токен из кэша аутентификации при выходе пользователя или удалении токена. """
+
+    invalidate_tokens([instance.key])
@@ -0,0 +1,48 @@
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from api_diplom_final.mail import deliver, retry_countdown, count
+from api_diplom_final.outbox import relay_batch, relay_all
+from usermanager.models import OutgoingEmail
+
+
+def pending_emails():
+    return OutgoingEmail.objects.filter(sent_at__isnull=True, attempts__lt=settings.EMAIL_MAX_RETRIES + 1,
+                                        next_attempt_at__lte=timezone.now())
+
+
+def deliver_outbox_emails(emails):
+    """
+    Функция отправляет письма из очереди и возвращает словарь {id письма: ошибка} для неотправленных.
+    Неотправленные письма учитываются в счетчиках доставки как повторяемые (retried),
+    а письма, исчерпавшие EMAIL_MAX_RETRIES повторов, - как отброшенные (dropped).
+    """
+
+    failed = deliver([{'id': email.id, 'title': email.title, 'message': email.message, 'email': email.email}
+                      for email in emails])
+    errors = {payload['id']: error for payload, error in failed}
+    dropped = sum(1 for email in emails if email.id in errors and email.attempts >= settings.EMAIL_MAX_RETRIES)
+    count('retried', len(errors) - dropped)
+    count('dropped', dropped)
+    return errors
+
+
+def drain_outbox(limit):
+    """
+    Функция отправляет до limit писем из очереди исходящих писем и возвращает количество отправленных.
+    Для неотправленных писем назначается следующая попытка с экспоненциальной задержкой,
+    после EMAIL_MAX_RETRIES повторов письмо остается в очереди с последней ошибкой.
+    """
+
+    return relay_batch(pending_emails(), limit, deliver_outbox_emails, 'sent_at', retry_countdown)
+
+
+@shared_task(ignore_result=True)
+def drain_email_outbox():
+    """
+    Задача разбирает очередь исходящих писем группами по EMAIL_OUTBOX_BATCH_SIZE,
+    пока в ней есть письма, готовые к отправке.
+    """
+
+    return relay_all(pending_emails, settings.EMAIL_OUTBOX_BATCH_SIZE, deliver_outbox_emails, 'sent_at', retry_countdown)
@@ -1,10 +1,34 @@
+import os
+import subprocess
+import sys
+import time
 from copy import deepcopy
-
+from smtplib import SMTPRecipientsRefused
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django_rest_passwordreset.models import ResetPasswordToken
 from rest_framework.test import APITestCase
 from rest_framework.authtoken.models import Token
+from redis import Redis, RedisError
 
-from usermanager.models import User
+from api_diplom_final.mail import deliver, email_payload, email_stats
+from api_diplom_final.throttling import CacheBucketStore, RedisBucketStore, TOKEN_BUCKET_SCRIPT, refill
+from rest_framework.throttling import SimpleRateThrottle
+from usermanager.authentication import LocalTokenCache, local_tokens, token_cache_key
+from usermanager.models import User, Contact, OutgoingEmail
+from usermanager.outbox import enqueue_emails
+from usermanager.tasks import drain_email_outbox, drain_outbox
 
 
 class UserManagerAPITests(APITestCase):
@@ -146,6 +170,24 @@ class UserManagerAPITests(APITestCase):
         assert response.status_code == 200
         assert 'Errors' not in response.data
 
+    def test_contact_get_method_pagination(self):
+        """ Проверка постраничной выдачи контактов по курсору у контроллера ContactView. """
+
+        url_contact = reverse('usermanager:user-contact')
+
+        self.create_test_user()
+        user = User.objects.get(email=self.data['email'])
+        for number in range(3):
+            Contact.objects.create(user=user, city='Москва', street='Ленина', house=str(number), phone='123')
+        token = Token.objects.get_or_create(user_id=user.id)[0].key
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+        first = self.client.get(url_contact, {'page_size': 2}).json()
+        second = self.client.get(first['next']).json()
+
+        assert [contact['house'] for contact in first['results'] + second['results']] == ['0', '1', '2']
+        assert second['next'] is None
+
     def test_contact_get_method_unauthorized(self):
         """ Проверка корректной работы метода get у контроллера ContactView в случае,
         когда запрос был выполнен неавторизованным пользователем.
@@ -259,3 +301,356 @@ class UserManagerAPITests(APITestCase):
 
         assert response.status_code == 400
         assert response.data['Status'] is False
+
+
+class EmailDeliveryTests(TestCase):
+    """
+    Класс для тестирования пакетной отправки писем (локальный почтовый бэкенд locmem).
+    """
+
+    def setUp(self):
+        cache.clear()
+        return super().setUp()
+
+    def payloads(self, count):
+        return [email_payload('Заголовок', f'Письмо {number}', f'user{number}@gmail.com') for number in range(count)]
+
+    @override_settings(EMAIL_BATCH_SIZE=2)
+    def test_deliver_reuses_connection(self):
+        """ Проверка того, что письма отправляются через одно соединение на каждые EMAIL_BATCH_SIZE писем. """
+
+        with patch('api_diplom_final.mail.get_connection', side_effect=get_connection) as connections:
+            failed = deliver(self.payloads(5))
+
+        assert failed == []
+        assert connections.call_count == 3
+        assert [message.to for message in mail.outbox] == [[f'user{number}@gmail.com'] for number in range(5)]
+        assert email_stats() == {'batches': 3, 'sent': 5, 'failed': 0, 'retried': 0, 'dropped': 0}
+
+    def test_deliver_reports_original_errors(self):
+        """
+        Проверка того, что ошибка отправки одного письма не прерывает отправку остальных
+        и возвращается исходной, а при ошибке соединения неотправленной считается вся группа.
+        """
+
+        send_messages = EmailBackend.send_messages
+
+        def refuse_second(backend, messages):
+            if messages[0].to == ['user1@gmail.com']:
+                raise SMTPRecipientsRefused({'user1@gmail.com': (550, b'User unknown')})
+            return send_messages(backend, messages)
+
+        payloads = self.payloads(3)
+        with patch.object(EmailBackend, 'send_messages', refuse_second):
+            failed = deliver(payloads)
+        assert [(payload, type(error)) for payload, error in failed] == [(payloads[1], SMTPRecipientsRefused)]
+        assert len(mail.outbox) == 2
+
+        with patch.object(EmailBackend, 'open', side_effect=ConnectionRefusedError):
+            failed = deliver(payloads)
+        assert [type(error) for _, error in failed] == [ConnectionRefusedError] * 3
+
+
+class EmailOutboxTests(APITestCase):
+    """
+    Класс для тестирования очереди исходящих писем.
+    """
+
+    def setUp(self):
+        cache.clear()
+        patcher = patch('usermanager.outbox.drain_email_outbox')
+        self.drain_email_outbox = patcher.start()
+        self.addCleanup(patcher.stop)
+        return super().setUp()
+
+    def test_register_enqueues_email(self):
+        """
+        Проверка того, что регистрация не отправляет письмо в запросе,
+        а сохраняет его в очередь и запускает задачу отправки после фиксации транзакции.
+        """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('usermanager:user-register'), UserManagerAPITests.data)
+
+        assert response.status_code == 201
+        assert mail.outbox == []
+        assert list(OutgoingEmail.objects.values_list('email', 'sent_at')) == [('test@gmail.com', None)]
+        self.drain_email_outbox.apply_async.assert_called_once_with((), retry=False, ignore_result=True)
+
+        assert drain_email_outbox.run() == 1
+        assert mail.outbox[0].to == ['test@gmail.com']
+        assert OutgoingEmail.objects.get().sent_at is not None
+        assert drain_email_outbox.run() == 0
+
+    def test_password_reset_enqueues_email(self):
+        """ Проверка того, что письмо со сбросом пароля сохраняется в очередь исходящих писем. """
+
+        User.objects.create_user(email='reset@gmail.com', password='TestPassword123', is_active=True)
+        response = self.client.post(reverse('usermanager:password-reset'), {'email': 'reset@gmail.com'})
+
+        assert response.status_code == 200
+        email = OutgoingEmail.objects.get()
+        assert email.email == 'reset@gmail.com'
+        assert email.message == f'Токен: {ResetPasswordToken.objects.get().key}'
+
+    @override_settings(EMAIL_MAX_RETRIES=1, EMAIL_RETRY_BACKOFF=60)
+    def test_drain_outbox_backoff(self):
+        """
+        Проверка того, что неотправленное письмо откладывается с экспоненциальной задержкой,
+        а после исчерпания попыток остается в очереди с последней ошибкой и учитывается как отброшенное.
+        """
+
+        enqueue_emails([email_payload('Заголовок', 'Письмо', f'user{number}@gmail.com') for number in range(2)])
+        failed = OutgoingEmail.objects.get(email='user1@gmail.com')
+        send_messages = EmailBackend.send_messages
+
+        def refuse(backend, messages):
+            if messages[0].to == [failed.email]:
+                raise SMTPRecipientsRefused({failed.email: (550, b'User unknown')})
+            return send_messages(backend, messages)
+
+        with patch.object(EmailBackend, 'send_messages', refuse):
+            assert drain_outbox(10) == 1
+            failed.refresh_from_db()
+            assert failed.attempts == 1 and failed.sent_at is None
+            assert 'SMTPRecipientsRefused' in failed.error
+            assert drain_outbox(10) == 0
+
+            OutgoingEmail.objects.filter(id=failed.id).update(next_attempt_at=timezone.now())
+            drain_outbox(10)
+            failed.refresh_from_db()
+            assert failed.attempts == 2
+            assert (failed.next_attempt_at - timezone.now()).total_seconds() > 100
+
+            OutgoingEmail.objects.filter(id=failed.id).update(next_attempt_at=timezone.now())
+            assert drain_outbox(10) == 0
+            assert OutgoingEmail.objects.get(id=failed.id).attempts == 2
+
+        assert len(mail.outbox) == 1
+        assert email_stats() == {'batches': 2, 'sent': 1, 'failed': 2, 'retried': 1, 'dropped': 1}
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    """
+    Класс для тестирования кэширования аутентификации по токену.
+    """
+
+    details_url = reverse('usermanager:user-details')
+
+    def setUp(self):
+        cache.clear()
+        local_tokens.clear()
+        self.user = User.objects.create_user(email='cached@gmail.com', password='TestPassword123', is_active=True)
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        return super().setUp()
+
+    def auth_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.details_url)
+        return response, [query for query in context.captured_queries if 'authtoken_token' in query['sql']]
+
+    def test_warm_requests_skip_auth_query(self):
+        """
+        Проверка того, что повторные запросы аутентифицируются без запроса к БД,
+        в том числе из общего кэша после очистки кэша процесса.
+        """
+
+        response, queries = self.auth_queries()
+        assert response.status_code == 200 and len(queries) == 1
+
+        response, queries = self.auth_queries()
+        assert response.status_code == 200 and queries == []
+        assert response.data['email'] == 'cached@gmail.com'
+
+        local_tokens.clear()
+        response, queries = self.auth_queries()
+        assert response.status_code == 200 and queries == []
+
+    def test_logout_invalidates_token(self):
+        """ Проверка того, что после выхода токен не принимается, несмотря на кэш. """
+
+        assert self.client.get(self.details_url).status_code == 200
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('usermanager:user-logout'))
+        assert response.data['Status'] is True
+        assert self.client.get(self.details_url).status_code == 401
+
+    def test_user_changes_invalidate_token(self):
+        """
+        Проверка того, что изменения пользователя (is_active, пароль) сбрасывают кэш аутентификации
+        после фиксации транзакции, а хеш пароля в кэш не попадает.
+        """
+
+        self.client.get(self.details_url)
+        assert self.user.password not in cache.get(token_cache_key(self.token.key))
+        self.user.first_name = 'Изменено'
+        self.user.set_password('NewPassword123')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.save()
+        assert local_tokens.get(self.token.key) is not None
+        callbacks[0]()
+        response, queries = self.auth_queries()
+        assert response.data['first_name'] == 'Изменено' and len(queries) == 1
+
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        assert self.client.get(self.details_url).status_code == 401
+
+
+class LocalTokenCacheTests(SimpleTestCase):
+    """
+    Класс для тестирования LRU-кэша процесса.
+    """
+
+    def test_size_and_ttl(self):
+        """ Проверка вытеснения давно не использованных записей и истечения срока хранения. """
+
+        local = LocalTokenCache(size=2, ttl=60)
+        local.set('a', 1)
+        local.set('b', 2)
+        assert local.get('a') == 1
+        local.set('c', 3)
+        assert (local.get('a'), local.get('b'), local.get('c')) == (1, None, 3)
+
+        with patch('usermanager.authentication.time.monotonic', return_value=time.monotonic() + 61):
+            assert local.get('a') is None
+
+
+    def test_production_requires_shared_cache(self):
+        """
+        Проверка того, что в профиле production без CACHE_REDIS_URL проект не запускается:
+        кэш процесса не позволяет отозвать токен в других процессах.
+        """
+
+        env = dict(os.environ, API_PROFILE='production')
+        env.pop('CACHE_REDIS_URL', None)
+        result = subprocess.run([sys.executable, 'manage.py', 'check'], cwd=settings.BASE_DIR, env=env,
+                                capture_output=True, text=True)
+        assert result.returncode != 0
+        assert 'CACHE_REDIS_URL' in result.stderr
+
+
+class TokenBucketThrottleTests(APITestCase):
+    """
+    Класс для тестирования ограничения частоты запросов по алгоритму token bucket.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        return super().setUp()
+
+    def test_refill(self):
+        """ Проверка списания маркеров, времени ожидания и равномерного пополнения корзины. """
+
+        state, allowed, wait = refill(None, 2, 0.5, 100.0)
+        assert (state, allowed, wait) == ((1, 100.0), True, 0.0)
+        state, allowed, _ = refill(state, 2, 0.5, 100.0)
+        assert allowed is True
+        state, allowed, wait = refill(state, 2, 0.5, 100.0)
+        assert allowed is False and wait == 2.0
+        state, allowed, _ = refill(state, 2, 0.5, 102.0)
+        assert allowed is True
+        assert refill(state, 2, 0.5, 1000.0)[0] == (1, 1000.0)
+
+    def test_cache_store_keeps_constant_state(self):
+        """ Проверка того, что состояние корзины в кэше не растет с количеством запросов. """
+
+        store = CacheBucketStore()
+        results = [store.consume('throttle:test', 3, 3 / 60)[0] for _ in range(5)]
+        assert results == [True, True, True, False, False]
+        tokens, _ = cache.get('throttle:test')
+        assert tokens < 1
+
+    def test_register_scope_rate(self):
+        """ Проверка того, что ставка задается по throttle_scope и превышение возвращает 429 с Retry-After. """
+
+        url = reverse('usermanager:user-register')
+        with patch.dict(SimpleRateThrottle.THROTTLE_RATES, {'register': '2/min'}):
+            statuses = [self.client.post(url, {}).status_code for _ in range(3)]
+            response = self.client.post(url, {})
+
+        assert statuses[:2] == [401, 401] and statuses[2] == 429
+        assert 0 < int(response['Retry-After']) <= 30
+
+
+def redis_test_client():
+    """
+    Функция возвращает клиент Redis для проверки Lua-скрипта корзин: сервер из THROTTLE_TEST_REDIS_URL
+    (по умолчанию локальный, БД 15) или fakeredis с поддержкой Lua. Если ни один недоступен, возвращает None.
+    """
+
+    url = os.environ.get('THROTTLE_TEST_REDIS_URL', 'redis://127.0.0.1:6379/15')
+    try:
+        client = Redis.from_url(url, socket_timeout=0.5)
+        client.ping()
+        return client
+    except RedisError:
+        pass
+    try:
+        import fakeredis
+
+        client = fakeredis.FakeRedis()
+        client.eval('return 1', 0)
+        return client
+    except Exception:
+        return None
+
+
+REDIS_CLIENT = redis_test_client()
+
+
+@skipUnless(REDIS_CLIENT, 'Нет доступного Redis или fakeredis с поддержкой Lua')
+class RedisBucketStoreTests(SimpleTestCase):
+    """
+    Класс для тестирования Lua-скрипта корзин RedisBucketStore на Redis (или fakeredis).
+    """
+
+    key = 'throttle:test:redis-bucket'
+
+    def setUp(self):
+        self.store = RedisBucketStore('redis://127.0.0.1:6379/15')
+        self.store.client = REDIS_CLIENT
+        self.store.script = REDIS_CLIENT.register_script(TOKEN_BUCKET_SCRIPT)
+        REDIS_CLIENT.delete(self.key)
+        self.addCleanup(REDIS_CLIENT.delete, self.key)
+        self.now = 1_000_000.0
+        patcher = patch('api_diplom_final.throttling.time')
+        patcher.start().time.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+        return super().setUp()
+
+    def consume(self):
+        return self.store.consume(self.key, 3, 0.5)
+
+    def test_burst_exhaustion(self):
+        """ Проверка того, что корзина пропускает не более capacity запросов подряд и сообщает время ожидания. """
+
+        assert [self.consume() for _ in range(3)] == [(True, 0.0)] * 3
+        allowed, wait = self.consume()
+        assert allowed is False and wait == 2.0
+
+    def test_refill(self):
+        """ Проверка равномерного пополнения корзины со временем, но не сверх capacity. """
+
+        for _ in range(4):
+            self.consume()
+        self.now += 1
+        allowed, wait = self.consume()
+        assert allowed is False and wait == 1.0
+        self.now += 1
+        assert self.consume() == (True, 0.0)
+
+        self.now += 3600
+        assert [self.consume()[0] for _ in range(4)] == [True, True, True, False]
+
+    def test_key_ttl(self):
+        """ Проверка того, что ключ корзины удаляется, когда корзина наполнилась бы целиком. """
+
+        self.consume()
+        assert 2000 < REDIS_CLIENT.pttl(self.key) <= 3000
+        self.consume()
+        self.consume()
+        assert 6000 < REDIS_CLIENT.pttl(self.key) <= 7000
@@ -1,7 +1,8 @@
 from django.urls import path
 from django_rest_passwordreset.views import reset_password_request_token, reset_password_confirm
 
-from usermanager.views import RegisterAccount, LoginAccount, AccountDetails, ContactView, ConfirmAccount
+from usermanager.views import RegisterAccount, LoginAccount, LogoutAccount, AccountDetails, ContactView, \
+    ConfirmAccount
 
 
 app_name = 'usermanager'
@@ -12,6 +13,7 @@ urlpatterns = [
     path('user/details', AccountDetails.as_view(), name='user-details'),
     path('user/contact', ContactView.as_view(), name='user-contact'),
     path('user/login', LoginAccount.as_view(), name='user-login'),
+    path('user/logout', LogoutAccount.as_view(), name='user-logout'),
     path('user/password_reset', reset_password_request_token, name='password-reset'),
     path('user/password_reset/confirm', reset_password_confirm, name='password-reset-confirm'),
 ]
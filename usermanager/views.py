@@ -1,12 +1,14 @@
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
 from django.db.models import Q
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from api_diplom_final.celery import send_email
+from api_diplom_final.pagination import KeysetPagination
 from usermanager.models import Contact, ConfirmEmailToken
+from usermanager.outbox import enqueue_email
 from usermanager.serializers import UserSerializer, ContactSerializer
 
 
@@ -37,16 +39,18 @@ class RegisterAccount(APIView):
                 request.data.update({})
                 user_serializer = UserSerializer(data=request.data)
                 if user_serializer.is_valid():
-                    user = user_serializer.save()
-                    user.set_password(request.data['password'])
-                    user.save()
-
-                    # Отправка письма с подтверждением почты.
-                    token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user.id)
-                    title = f'Подтверждение регистрации пользователя: {token.user.email}'
-                    message = f'Токен: {token.key}'
-                    email = token.user.email
-                    send_email(title, message, email)
+                    with transaction.atomic():
+                        user = user_serializer.save()
+                        user.set_password(request.data['password'])
+                        user.save()
+
+                        # Письмо с подтверждением почты сохраняется в очередь исходящих писем
+                        # и отправляется задачей Celery после фиксации транзакции.
+                        token, _ = ConfirmEmailToken.objects.get_or_create(user_id=user.id)
+                        title = f'Подтверждение регистрации пользователя: {token.user.email}'
+                        message = f'Токен: {token.key}'
+                        email = token.user.email
+                        enqueue_email(title, message, email)
 
                     return Response({'Status': True}, status=201)
                 else:
@@ -130,6 +134,25 @@ class LoginAccount(APIView):
                          'Errors': 'Не указаны все необходимые аргументы'}, status=401)
 
 
+class LogoutAccount(APIView):
+    """
+    Класс для выхода пользователей.
+    """
+
+    throttle_scope = 'user'
+
+    def post(self, request, *args, **kwargs):
+        """
+        Метод удаляет токен пользователя, после чего токен перестает приниматься при аутентификации.
+        """
+        if not request.user.is_authenticated:
+            return Response({'Status': False,
+                             'Error': 'Log in required'}, status=403)
+
+        Token.objects.filter(user_id=request.user.id).delete()
+        return Response({'Status': True})
+
+
 class ContactView(APIView):
     """ Класс для работы с контактами покупателей. """
 
@@ -138,15 +161,17 @@ class ContactView(APIView):
     def get(self, request, *args, **kwargs):
         """
         Метод проверяет авторизацию,
-        после чего выдает информацию о контактных данных покупателя.
+        после чего выдает информацию о контактных данных покупателя постранично (параметры cursor и page_size).
         """
 
         if not request.user.is_authenticated:
             return Response({'Status': False, 'Error': 'Log in required'}, status=403)
         contact = Contact.objects.filter(
             user_id=request.user.id)
-        serializer = ContactSerializer(contact, many=True)
-        return Response(serializer.data)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(contact, request, view=self)
+        serializer = ContactSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request, *args, **kwargs):
         """